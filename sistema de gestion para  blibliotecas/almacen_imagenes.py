@@ -0,0 +1,83 @@
+import hashlib
+import os
+import re
+import shutil
+import threading
+
+from miniaturas import CARPETA_DATOS, reducir
+
+CARPETA_IMAGENES = os.path.join(CARPETA_DATOS, "imagenes")
+# Lados en píxeles de las versiones que se generan al guardar (lista, foto de usuario, portada)
+RESOLUCIONES = (48, 120, 150)
+TAMANO_BLOQUE_HASH = 1024 * 1024
+
+# Referencia guardada en la base: hash del contenido más la extensión original
+PATRON_REFERENCIA = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]{1,5}$")
+
+
+# ALMACÉN DE IMÁGENES
+class AlmacenImagenes:
+    """Guarda portadas y fotos en disco con el hash de su contenido como nombre
+
+    La misma imagen elegida para varios libros se guarda una sola vez, y
+    la base solo guarda la referencia (p. ej. "3f2a...9c.jpg"), no la
+    imagen. Al guardar se generan también las versiones de RESOLUCIONES.
+    """
+
+    def __init__(self, carpeta=CARPETA_IMAGENES, resoluciones=RESOLUCIONES):
+        self.carpeta = carpeta
+        self.resoluciones = resoluciones
+
+    def _ruta(self, referencia, lado=None):
+        if not PATRON_REFERENCIA.match(referencia or ""):
+            raise ValueError(f"Referencia de imagen inválida: {referencia!r}")
+        nombre = referencia if lado is None else f"{referencia.split('.')[0]}_{lado}.png"
+        return os.path.join(self.carpeta, referencia[:2], nombre)
+
+    @staticmethod
+    def _escribir(destino, escribir):
+        # Se escribe aparte y se renombra: nadie ve un archivo a medias
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        temporal = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+        escribir(temporal)
+        os.replace(temporal, destino)
+
+    def guardar(self, ruta):
+        """Copia la imagen al almacén si no estaba y devuelve su referencia"""
+        sha = hashlib.sha256()
+        with open(ruta, "rb") as archivo:
+            for bloque in iter(lambda: archivo.read(TAMANO_BLOQUE_HASH), b""):
+                sha.update(bloque)
+        extension = os.path.splitext(ruta)[1].lower().lstrip(".") or "img"
+        referencia = f"{sha.hexdigest()}.{extension}"
+
+        original = self._ruta(referencia)
+        if not os.path.exists(original):
+            self._escribir(original, lambda temporal: shutil.copyfile(ruta, temporal))
+        for lado in self.resoluciones:
+            if not os.path.exists(self._ruta(referencia, lado)):
+                self._generar(referencia, lado)
+        return referencia
+
+    def _generar(self, referencia, lado):
+        from PIL import Image
+
+        # Se abre el original cada vez: draft() solo puede achicar una vez por apertura
+        with Image.open(self._ruta(referencia)) as imagen:
+            version = reducir(imagen, (lado, lado))
+        self._escribir(self._ruta(referencia, lado), lambda temporal: version.save(temporal, "PNG"))
+        return version
+
+    def ruta_original(self, referencia):
+        return self._ruta(referencia)
+
+    def abrir(self, referencia, lado):
+        """Imagen PIL de la versión de ese lado; si falta (p. ej. un lado nuevo) se genera"""
+        from PIL import Image
+
+        try:
+            with Image.open(self._ruta(referencia, lado)) as version:
+                version.load()
+                return version
+        except FileNotFoundError:
+            return self._generar(referencia, lado)
@@ -0,0 +1,390 @@
+"""API HTTP/JSON local con las operaciones de la biblioteca
+
+Uso:
+    python api.py                                # http://127.0.0.1:8080, base de CONFIG_BD
+    python api.py --host 0.0.0.0 --puerto 8080   # para los otros puestos de la red local
+    python api.py --motor sqlite                 # sin servidor MySQL
+
+Un solo proceso atiende a todos los mostradores y kioscos: comparten el
+pool de conexiones y la caché de consultas. Las conexiones HTTP se
+atienden con asyncio; las operaciones, que bloquean esperando a la base,
+corren en un pool de hilos del tamaño del pool de conexiones.
+
+Rutas (los cuerpos son JSON; las listas aceptan ?posicion=&limite=&buscar=):
+    GET    /salud                      GET    /metricas (formato Prometheus)
+    GET    /libros                     POST   /libros
+    GET    /libros/<id>                DELETE /libros/<id>
+    GET    /usuarios                   POST   /usuarios
+    GET    /autores                    POST   /autores
+    DELETE /autores/<id>
+    GET    /prestamos                  POST   /prestamos
+    POST   /prestamos/<id>/devolucion
+    POST   /prestamos/lote             POST   /devoluciones/lote
+    GET    /exportaciones/<tabla>.<csv|xlsx|pdf>
+    GET    /estadisticas (?mes=AAAA-MM, por defecto el actual)
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import estadisticas
+import servicio
+from base_datos import DatabaseConnection
+from cache_consultas import CacheConsultas
+from cola_exportaciones import FORMATOS
+from metricas import METRICAS
+
+HOST = "127.0.0.1"
+PUERTO = 8080
+# Segundos que se mantiene abierta una conexión sin pedidos (keep-alive)
+SEGUNDOS_INACTIVIDAD = 30
+# Tamaño máximo del cuerpo de un pedido y de una línea de encabezado
+TAMANO_MAXIMO_CUERPO = 1024 * 1024
+TAMANO_MAXIMO_LINEA = 8 * 1024
+# Bytes por escritura al enviar un archivo exportado
+TAMANO_BLOQUE_ARCHIVO = 64 * 1024
+
+# Nombres de las columnas de cada lista (las de consultas.LISTAS) y de un libro por id
+COLUMNAS = {
+    "libros": ("id", "titulo", "autor", "genero", "año_publicacion", "portada"),
+    "usuarios": ("id", "nombre", "email", "telefono", "foto"),
+    "prestamos": ("id", "libro", "usuario", "fecha_prestamo", "devuelto"),
+    "autores": ("id", "nombre", "nacionalidad", "fecha_nacimiento"),
+}
+COLUMNAS_LIBRO = ("id", "titulo", "autor", "genero", "año_publicacion", "isbn", "portada")
+# Extensión pedida en la URL → formato de exportación
+EXTENSIONES = {extension.lstrip("."): formato for formato, (_, extension) in FORMATOS.items()}
+TIPOS_ARCHIVO = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf",
+}
+MOTIVOS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+registro = logging.getLogger("biblioteca.api")
+
+
+class ErrorHTTP(Exception):
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+        self.mensaje = mensaje
+
+
+class Respuesta:
+    """Cuerpo JSON, texto o archivo (que se envía por partes y se borra al terminar)"""
+
+    def __init__(self, estado=200, datos=None, texto=None, tipo=None, archivo=None, nombre_descarga=None):
+        self.estado = estado
+        self.datos = datos
+        self.texto = texto
+        self.tipo = tipo
+        self.archivo = archivo
+        self.nombre_descarga = nombre_descarga
+
+
+def _valor_json(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (bytes, bytearray)):
+        return valor.decode("utf-8", "replace")
+    raise TypeError(f"No se puede convertir a JSON: {type(valor).__name__}")
+
+
+def _fila(columnas, fila):
+    return dict(zip(columnas, fila))
+
+
+def _resultado(respuesta, estado_error=400, estado_ok=200):
+    """(success, result) del servicio → Respuesta; los fallos llevan {"error": mensaje}"""
+    success, result = respuesta
+    if not success:
+        return Respuesta(estado_error, {"error": str(result)})
+    return Respuesta(estado_ok, {"mensaje": result} if isinstance(result, str) else result)
+
+
+def _lote(respuesta):
+    success, resultados = respuesta
+    if not success:
+        return Respuesta(400, {"error": resultados})
+    return Respuesta(200, {"resultados": [
+        {"libro_id": libro_id, "ok": ok, "mensaje": mensaje, "prestamo_id": prestamo_id}
+        for libro_id, ok, mensaje, prestamo_id in resultados]})
+
+
+# OPERACIONES (corren en el pool de hilos)
+def listar(bd, tabla, parametros):
+    success, result = servicio.listar(bd, tabla, parametros.get("posicion", 0),
+                                      parametros.get("limite", servicio.LIMITE_LISTA), parametros.get("buscar"))
+    if not success:
+        return Respuesta(400, {"error": result})
+    total, filas = result
+    return Respuesta(200, {"total": total, "filas": [_fila(COLUMNAS[tabla], fila) for fila in filas]})
+
+
+def obtener_libro(bd, libro_id):
+    success, result = servicio.obtener_libro(bd, libro_id)
+    if not success:
+        return Respuesta(404 if result == "Libro no encontrado" else 400, {"error": result})
+    return Respuesta(200, _fila(COLUMNAS_LIBRO, result))
+
+
+def exportar(bd, tabla, extension):
+    formato = EXTENSIONES.get(extension)
+    if formato is None:
+        raise ErrorHTTP(404, f"Formato desconocido: {extension}")
+    descriptor, nombre_archivo = tempfile.mkstemp(suffix=f".{extension}", prefix=f"{tabla}_")
+    os.close(descriptor)
+    success, mensaje = servicio.exportar(bd, tabla, formato, nombre_archivo)
+    if not success:
+        os.remove(nombre_archivo)
+        return Respuesta(400 if mensaje.startswith(("Tabla", "Formato")) else 500, {"error": mensaje})
+    return Respuesta(200, archivo=nombre_archivo, tipo=TIPOS_ARCHIVO[extension],
+                     nombre_descarga=f"{tabla}.{extension}")
+
+
+def obtener_estadisticas(bd, parametros):
+    success, datos = estadisticas.resumen(bd, parametros.get("mes"))
+    if not success:
+        return Respuesta(400, {"error": datos})
+    return Respuesta(200, dict(
+        datos,
+        libros=[_fila(("titulo", "prestamos"), fila) for fila in datos["libros"]],
+        generos=[_fila(("genero", "prestamos"), fila) for fila in datos["generos"]],
+        usuarios=[_fila(("nombre", "prestamos_activos", "prestamos_total"), fila) for fila in datos["usuarios"]],
+        diario=[_fila(("fecha", "prestamos", "devoluciones"), fila) for fila in datos["diario"]]))
+
+
+def _campos(cuerpo, *nombres):
+    return [cuerpo.get(nombre) for nombre in nombres]
+
+
+# (método, ruta, operación(bd, coincidencia, parámetros de la URL, cuerpo JSON))
+RUTAS = [
+    ("GET", r"/salud", lambda bd, m, q, c: Respuesta(200, {"ok": bd.conectado, "motor": bd.motor.nombre})),
+    ("GET", r"/metricas", lambda bd, m, q, c: Respuesta(200, texto=METRICAS.a_prometheus(),
+                                                         tipo="text/plain; version=0.0.4; charset=utf-8")),
+    ("GET", r"/(libros|usuarios|autores|prestamos)", lambda bd, m, q, c: listar(bd, m[1], q)),
+    ("GET", r"/libros/(\d+)", lambda bd, m, q, c: obtener_libro(bd, m[1])),
+    ("POST", r"/libros", lambda bd, m, q, c: _resultado(servicio.guardar_libro(
+        bd, *_campos(c, "titulo", "autor", "genero", "año_publicacion", "isbn")), estado_ok=201)),
+    ("DELETE", r"/libros/(\d+)", lambda bd, m, q, c: _resultado(servicio.eliminar_libro(bd, m[1]))),
+    ("POST", r"/usuarios", lambda bd, m, q, c: _resultado(servicio.guardar_usuario(
+        bd, *_campos(c, "nombre", "email", "telefono")), estado_ok=201)),
+    ("POST", r"/autores", lambda bd, m, q, c: _resultado(servicio.guardar_autor(
+        bd, *_campos(c, "nombre", "nacionalidad", "fecha_nacimiento")), estado_ok=201)),
+    ("DELETE", r"/autores/(\d+)", lambda bd, m, q, c: _resultado(servicio.eliminar_autor(bd, m[1]))),
+    ("POST", r"/prestamos", lambda bd, m, q, c: _resultado(servicio.realizar_prestamo(
+        bd, *_campos(c, "libro_id", "usuario_id")), estado_ok=201)),
+    ("POST", r"/prestamos/(\d+)/devolucion", lambda bd, m, q, c: _resultado(servicio.devolver_libro(bd, m[1]))),
+    ("POST", r"/prestamos/lote", lambda bd, m, q, c: _lote(servicio.prestar_lote(
+        bd, *_campos(c, "usuario_id", "libro_ids")))),
+    ("POST", r"/devoluciones/lote", lambda bd, m, q, c: _lote(servicio.devolver_lote(bd, c.get("libro_ids")))),
+    ("GET", r"/exportaciones/(\w+)\.(\w+)", lambda bd, m, q, c: exportar(bd, m[1], m[2])),
+    ("GET", r"/estadisticas", lambda bd, m, q, c: obtener_estadisticas(bd, q)),
+]
+RUTAS = [(metodo, re.compile(f"^{patron}/?$"), operacion) for metodo, patron, operacion in RUTAS]
+
+
+# SERVIDOR
+class ServidorAPI:
+    """Atiende pedidos HTTP/1.1 (con keep-alive) y ejecuta las operaciones en hilos"""
+
+    def __init__(self, bd, host=HOST, puerto=PUERTO, hilos=None):
+        self.bd = bd
+        self.host = host
+        self.puerto = puerto
+        self.executor = ThreadPoolExecutor(max_workers=hilos or bd.tamano_pool, thread_name_prefix="api")
+        self.servidor = None
+
+    async def iniciar(self):
+        self.servidor = await asyncio.start_server(self._atender, self.host, self.puerto,
+                                                   limit=TAMANO_MAXIMO_LINEA)
+        return self.servidor
+
+    async def servir(self):
+        async with await self.iniciar():
+            await self.servidor.serve_forever()
+
+    def cerrar(self):
+        if self.servidor is not None:
+            self.servidor.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _ejecutar(self, operacion, coincidencia, parametros, cuerpo):
+        if not self.bd.conectado and not self.bd.connect():
+            raise ErrorHTTP(503, "No hay conexión con la base de datos")
+        return operacion(self.bd, coincidencia, parametros, cuerpo)
+
+    async def _atender(self, lector, escritor):
+        try:
+            while True:
+                try:
+                    pedido = await asyncio.wait_for(self._leer_pedido(lector), SEGUNDOS_INACTIVIDAD)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except ErrorHTTP as error:
+                    await self._responder(escritor, Respuesta(error.estado, {"error": error.mensaje}), False)
+                    break
+                if pedido is None:
+                    break
+                metodo, ruta, parametros, cuerpo, seguir = pedido
+                respuesta = await self._despachar(metodo, ruta, parametros, cuerpo)
+                await self._responder(escritor, respuesta, seguir)
+                if not seguir:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            escritor.close()
+
+    async def _leer_pedido(self, lector):
+        """(método, ruta, parámetros de la URL, cuerpo JSON, mantener la conexión) o None si se cerró"""
+        try:
+            linea = await lector.readline()
+        except ValueError:
+            raise ErrorHTTP(400, "Línea de pedido demasiado larga")
+        if not linea:
+            return None
+        partes = linea.decode("latin-1").split()
+        if len(partes) != 3:
+            raise ErrorHTTP(400, "Pedido mal formado")
+        metodo, destino, version = partes
+
+        encabezados = {}
+        while True:
+            try:
+                linea = await lector.readline()
+            except ValueError:
+                raise ErrorHTTP(400, "Encabezado demasiado largo")
+            if linea in (b"\r\n", b"\n", b""):
+                break
+            nombre, _, valor = linea.decode("latin-1").partition(":")
+            encabezados[nombre.strip().lower()] = valor.strip()
+
+        try:
+            largo = int(encabezados.get("content-length", 0))
+        except ValueError:
+            raise ErrorHTTP(400, "Content-Length inválido")
+        if largo > TAMANO_MAXIMO_CUERPO:
+            raise ErrorHTTP(413, "Cuerpo demasiado grande")
+        cuerpo = {}
+        if largo:
+            datos = await lector.readexactly(largo)
+            try:
+                cuerpo = json.loads(datos.decode("utf-8"))
+            except (UnicodeDecodeError, ValueError):
+                raise ErrorHTTP(400, "El cuerpo debe ser JSON")
+            if not isinstance(cuerpo, dict):
+                raise ErrorHTTP(400, "El cuerpo debe ser un objeto JSON")
+
+        url = urlsplit(destino)
+        parametros = {clave: valores[-1] for clave, valores in parse_qs(url.query).items()}
+        conexion = encabezados.get("connection", "").lower()
+        seguir = conexion != "close" if version == "HTTP/1.1" else conexion == "keep-alive"
+        return metodo.upper(), unquote(url.path), parametros, cuerpo, seguir
+
+    async def _despachar(self, metodo, ruta, parametros, cuerpo):
+        encontrada = False
+        for metodo_ruta, patron, operacion in RUTAS:
+            coincidencia = patron.match(ruta)
+            if coincidencia is None:
+                continue
+            encontrada = True
+            if metodo_ruta != metodo:
+                continue
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self.executor, self._ejecutar, operacion, coincidencia,
+                                                  parametros, cuerpo)
+            except ErrorHTTP as error:
+                return Respuesta(error.estado, {"error": error.mensaje})
+            except Exception:
+                registro.exception("Error atendiendo %s %s", metodo, ruta)
+                return Respuesta(500, {"error": "Error interno del servidor"})
+        if encontrada:
+            return Respuesta(405, {"error": f"Método {metodo} no permitido en {ruta}"})
+        return Respuesta(404, {"error": f"Ruta desconocida: {ruta}"})
+
+    async def _responder(self, escritor, respuesta, seguir):
+        encabezados = {"Connection": "keep-alive" if seguir else "close"}
+        if respuesta.archivo is not None:
+            try:
+                encabezados["Content-Type"] = respuesta.tipo
+                encabezados["Content-Length"] = str(os.path.getsize(respuesta.archivo))
+                encabezados["Content-Disposition"] = f'attachment; filename="{respuesta.nombre_descarga}"'
+                self._escribir_inicio(escritor, respuesta.estado, encabezados)
+                with open(respuesta.archivo, "rb") as archivo:
+                    while True:
+                        bloque = archivo.read(TAMANO_BLOQUE_ARCHIVO)
+                        if not bloque:
+                            break
+                        escritor.write(bloque)
+                        # Respeta el ritmo del cliente en lugar de acumular el archivo en memoria
+                        await escritor.drain()
+            finally:
+                os.remove(respuesta.archivo)
+            return
+
+        if respuesta.texto is not None:
+            cuerpo = respuesta.texto.encode("utf-8")
+            encabezados["Content-Type"] = respuesta.tipo
+        else:
+            cuerpo = json.dumps(respuesta.datos, default=_valor_json, ensure_ascii=False).encode("utf-8")
+            encabezados["Content-Type"] = "application/json; charset=utf-8"
+        encabezados["Content-Length"] = str(len(cuerpo))
+        self._escribir_inicio(escritor, respuesta.estado, encabezados)
+        escritor.write(cuerpo)
+        await escritor.drain()
+
+    @staticmethod
+    def _escribir_inicio(escritor, estado, encabezados):
+        lineas = [f"HTTP/1.1 {estado} {MOTIVOS.get(estado, '')}"]
+        lineas += [f"{nombre}: {valor}" for nombre, valor in encabezados.items()]
+        escritor.write(("\r\n".join(lineas) + "\r\n\r\n").encode("latin-1", "replace"))
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="API HTTP/JSON del sistema de biblioteca")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    parser.add_argument("--motor", choices=("mysql", "sqlite"), help="por defecto, el de CONFIG_BD")
+    parser.add_argument("--archivo", help="base SQLite")
+    opciones = parser.parse_args(argumentos)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    config = {}
+    if opciones.motor:
+        config["motor"] = opciones.motor
+    if opciones.archivo:
+        config["archivo"] = opciones.archivo
+    bd = DatabaseConnection(notificar_error=registro.error, cache=CacheConsultas(), migrar=True, **config)
+    if not bd.connect():
+        return 1
+
+    servidor = ServidorAPI(bd, opciones.host, opciones.puerto)
+    registro.info("API de la biblioteca en http://%s:%s", opciones.host, opciones.puerto)
+    try:
+        asyncio.run(servidor.servir())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.cerrar()
+        METRICAS.volcar()
+        bd.disconnect()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,344 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+
+import migraciones
+from consultas import LECTURA, PROCEDIMIENTO, tipo_consulta
+from metricas import METRICAS
+
+
+# CONFIGURACIÓN DE CONEXIÓN
+CONFIG_BD = {
+    # Motor de almacenamiento: "mysql" (servidor) o "sqlite" (archivo local, sin servidor;
+    # "archivo" indica la ruta, por defecto ~/.biblioteca_personal/biblioteca_personal.db)
+    "motor": "mysql",
+    "host": "localhost",
+    "database": "biblioteca_personal",
+    "user": "root",
+    "password": "",
+    "autocommit": True,
+}
+
+TAMANO_POOL = 5
+# Segundos que espera un hilo por una conexión libre antes de fallar
+TIEMPO_ESPERA_POOL = 30
+# Conexiones ociosas más tiempo que esto se verifican con ping antes de usarse
+SEGUNDOS_VERIFICACION = 60
+# Filas que se piden al servidor por vez al recorrer consultas grandes
+TAMANO_LOTE = 2000
+# Error del servidor cuando la base configurada no existe
+ER_BASE_INEXISTENTE = 1049
+# Claves de CONFIG_BD que no son parámetros de mysql.connector
+CLAVES_PROPIAS = ("motor", "archivo")
+
+
+# MOTORES DE ALMACENAMIENTO
+class MotorMySQL:
+    """Servidor MySQL a través de mysql.connector"""
+
+    nombre = "mysql"
+    fulltext = True
+
+    def __init__(self, config):
+        self.config = {clave: valor for clave, valor in config.items() if clave not in CLAVES_PROPIAS}
+
+    def conectar(self, crear_base=False):
+        try:
+            return mysql.connector.connect(**self.config)
+        except mysql.connector.Error as error:
+            if not crear_base or error.errno != ER_BASE_INEXISTENTE:
+                raise
+        self._crear_base_datos()
+        return mysql.connector.connect(**self.config)
+
+    def _crear_base_datos(self):
+        """Crea la base configurada (la primera vez que se abre la aplicación)"""
+        config = dict(self.config)
+        nombre = config.pop("database")
+        conexion = mysql.connector.connect(**config)
+        try:
+            cursor = conexion.cursor()
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{nombre}`")
+            cursor.close()
+        finally:
+            conexion.close()
+
+    def migrar(self, conexion):
+        return migraciones.migrar(conexion)
+
+
+def crear_motor(config):
+    """Motor indicado en config["motor"]; SQLite se importa solo si se usa"""
+    if config.get("motor", "mysql") == "sqlite":
+        from motor_sqlite import MotorSQLite
+        return MotorSQLite(config)
+    return MotorMySQL(config)
+
+
+# POOL DE CONEXIONES
+class DatabaseConnection:
+    def __init__(self, tamano_pool=TAMANO_POOL, notificar_error=None, cache=None, migrar=False,
+                 metricas=METRICAS, **config):
+        self.config = dict(CONFIG_BD, **config)
+        self.motor = crear_motor(self.config)
+        self.tamano_pool = tamano_pool
+        self.notificar_error = notificar_error
+        # Opcional: CacheConsultas para responder lecturas repetidas sin ir al servidor
+        self.cache = cache
+        # Crear la base si no existe y llevar su esquema a la última versión al conectar
+        self.migrar = migrar
+        # Tiempos, filas y errores de cada sentencia (pestaña Diagnóstico y volcado de métricas)
+        self.metricas = metricas
+        self.pool = None
+        self._creadas = 0
+        self._lock = threading.Lock()
+        # Cursores preparados de cada conexión: {id(conexion): {consulta: cursor}}
+        self._preparadas = {}
+
+    @property
+    def conectado(self):
+        return self.pool is not None
+
+    def connect(self, notificar=True):
+        """Inicializa el pool abriendo la primera conexión
+
+        notificar=False no avisa los errores (reintentos en segundo plano,
+        como los del sincronizador de la cola de escrituras).
+        """
+        with self._lock:
+            if self.pool is not None:
+                return True
+            try:
+                conexion = self.motor.conectar(crear_base=self.migrar)
+            except mysql.connector.Error as error:
+                if notificar and self.notificar_error:
+                    self.notificar_error(f"Error conectando a la base de datos: {error}")
+                return False
+
+            if self.migrar:
+                # Con el lock tomado: nadie usa la base hasta que el esquema está al día
+                ok, mensaje = self.motor.migrar(conexion)
+                if not ok and notificar and self.notificar_error:
+                    self.notificar_error(mensaje)
+            self.pool = queue.LifoQueue()
+            self._creadas = 1
+            self.pool.put((conexion, time.monotonic()))
+            return True
+
+    def disconnect(self):
+        """Cierra todas las conexiones ociosas del pool"""
+        with self._lock:
+            pool, self.pool = self.pool, None
+            self._creadas = 0
+        if pool is None:
+            return
+        while True:
+            try:
+                conexion, _ = pool.get_nowait()
+            except queue.Empty:
+                break
+            self._preparadas.pop(id(conexion), None)
+            try:
+                conexion.close()
+            except mysql.connector.Error:
+                pass
+
+    def _crear_conexion(self):
+        return self.motor.conectar()
+
+    def _obtener_conexion(self):
+        """Saca una conexión del pool, creando una nueva si hay cupo"""
+        pool = self.pool
+        if pool is None:
+            raise mysql.connector.InterfaceError("No hay conexión con la base de datos")
+
+        try:
+            conexion, ultimo_uso = pool.get_nowait()
+        except queue.Empty:
+            conexion = None
+            with self._lock:
+                if self._creadas < self.tamano_pool:
+                    self._creadas += 1
+                    crear = True
+                else:
+                    crear = False
+            if crear:
+                try:
+                    return self._crear_conexion()
+                except mysql.connector.Error:
+                    with self._lock:
+                        self._creadas -= 1
+                    raise
+            try:
+                conexion, ultimo_uso = pool.get(timeout=TIEMPO_ESPERA_POOL)
+            except queue.Empty:
+                raise mysql.connector.PoolError("Tiempo de espera agotado para obtener una conexión")
+
+        # Verificar que la conexión siga viva si estuvo ociosa (las que se caen
+        # en uso las descarta conexion() y las lecturas se reintentan)
+        if time.monotonic() - ultimo_uso > SEGUNDOS_VERIFICACION:
+            # Si reconecta, las sentencias preparadas del servidor se pierden
+            self._preparadas.pop(id(conexion), None)
+            try:
+                conexion.ping(reconnect=True, attempts=2, delay=1)
+            except BaseException:
+                # Libera el cupo: si no, tras una caída del servidor el pool quedaría agotado
+                self._devolver_conexion(conexion, descartar=True)
+                raise
+        return conexion
+
+    def _devolver_conexion(self, conexion, descartar=False):
+        pool = self.pool
+        if pool is None or descartar:
+            self._preparadas.pop(id(conexion), None)
+            try:
+                conexion.close()
+            except mysql.connector.Error:
+                pass
+            with self._lock:
+                if pool is not None and pool is self.pool:
+                    self._creadas -= 1
+            return
+        pool.put((conexion, time.monotonic()))
+
+    @contextmanager
+    def conexion(self):
+        """Presta una conexión del pool durante el bloque with"""
+        conexion = self._obtener_conexion()
+        descartar = False
+        try:
+            yield conexion
+        except (mysql.connector.InterfaceError, mysql.connector.OperationalError):
+            descartar = True
+            raise
+        finally:
+            self._devolver_conexion(conexion, descartar)
+
+    def _preparada(self, conexion, consulta):
+        """Cursor preparado de la consulta en esa conexión; se prepara una sola vez"""
+        cursores = self._preparadas.setdefault(id(conexion), {})
+        cursor = cursores.get(consulta)
+        if cursor is None:
+            cursor = cursores[consulta] = conexion.cursor(prepared=True)
+        return cursor
+
+    def _ejecutar(self, query, parameters):
+        inicio = time.perf_counter()
+        try:
+            resultado, filas = self._ejecutar_en_conexion(query, parameters)
+        except mysql.connector.Error as error:
+            self._medir(query, parameters, inicio, 0, error)
+            raise
+        self._medir(query, parameters, inicio, filas)
+        return resultado
+
+    def _ejecutar_en_conexion(self, query, parameters):
+        """Devuelve ((success, result), filas leídas o modificadas)"""
+        tipo = tipo_consulta(query)
+        with self.conexion() as conexion:
+            if tipo == LECTURA and getattr(query, "preparada", False):
+                try:
+                    cursor = self._preparada(conexion, query)
+                    cursor.execute(query, parameters or ())
+                    filas = cursor.fetchall()
+                    return (True, filas), len(filas)
+                except mysql.connector.Error:
+                    # El cursor pudo quedar a medias: se prepara de nuevo la próxima vez
+                    self._preparadas.get(id(conexion), {}).pop(query, None)
+                    raise
+
+            cursor = conexion.cursor(buffered=True)
+            try:
+                if parameters:
+                    cursor.execute(query, parameters)
+                else:
+                    cursor.execute(query)
+
+                if tipo == LECTURA:
+                    filas = cursor.fetchall()
+                    return (True, filas), len(filas)
+                else:
+                    conexion.commit()
+
+                    if tipo == PROCEDIMIENTO:
+                        result = cursor.fetchall()
+                        cursor.nextset()
+                        return (True, result), len(result)
+                    else:
+                        return (True, "Operación exitosa"), max(0, cursor.rowcount)
+            finally:
+                cursor.close()
+
+    def _medir(self, query, parametros, inicio, filas, error=None):
+        segundos = time.perf_counter() - inicio
+        registrar_tiempo = getattr(query, "registrar_tiempo", None)
+        if registrar_tiempo is not None:
+            registrar_tiempo(segundos)
+        self.metricas.registrar_consulta(query, segundos, filas, error, parametros)
+
+    def execute_query(self, query, parameters=None):
+        if self.cache is not None:
+            return self.cache.consultar(query, parameters, self._consultar)
+        return self._consultar(query, parameters)
+
+    def invalidar(self, *tablas):
+        """Avisa a la caché que esas tablas cambiaron por fuera de execute_query"""
+        if self.cache is not None:
+            self.cache.invalidar_tablas(tablas)
+
+    def _consultar(self, query, parameters):
+        try:
+            try:
+                return self._ejecutar(query, parameters)
+            except (mysql.connector.InterfaceError, mysql.connector.OperationalError):
+                # La conexión se cayó y se descartó; solo las lecturas se
+                # reintentan, una escritura pudo haberse aplicado ya
+                if self.pool is None or tipo_consulta(query) != LECTURA:
+                    raise
+                return self._ejecutar(query, parameters)
+        except mysql.connector.Error as error:
+            return False, str(error)
+
+    def iterar_consulta(self, query, parameters=None, tamano_lote=TAMANO_LOTE):
+        """Recorre un SELECT grande por lotes sin cargarlo entero en memoria
+
+        Usa un cursor sin buffer: el servidor envía las filas a medida que
+        se leen. La conexión queda ocupada hasta que el recorrido termina;
+        si se abandona a medias se descarta en lugar de volver al pool.
+        En las métricas cuenta solo el tiempo de espera de la base, no el
+        de quien consume las filas.
+        """
+        conexion = self._obtener_conexion()
+        agotado = False
+        segundos = 0.0
+        total = 0
+        error = None
+        try:
+            cursor = conexion.cursor()
+            try:
+                inicio = time.perf_counter()
+                if parameters:
+                    cursor.execute(query, parameters)
+                else:
+                    cursor.execute(query)
+                while True:
+                    filas = cursor.fetchmany(tamano_lote)
+                    segundos += time.perf_counter() - inicio
+                    if not filas:
+                        break
+                    total += len(filas)
+                    yield from filas
+                    inicio = time.perf_counter()
+                agotado = True
+            except mysql.connector.Error as e:
+                error = e
+                raise
+            finally:
+                if agotado:
+                    cursor.close()
+        finally:
+            self._devolver_conexion(conexion, descartar=not agotado)
+            self.metricas.registrar_consulta(query, segundos, total, error, parameters)
@@ -0,0 +1,552 @@
+"""Pruebas de rendimiento sin interfaz: listas, búsquedas, préstamos, estadísticas y exportaciones
+
+Uso:
+    python benchmark.py --escala 10k
+    python benchmark.py --escala 1M --guardar linea_base.json
+    python benchmark.py --escala 1M --comparar linea_base.json
+
+Por defecto usa una base SQLite temporal (no hace falta servidor); con
+--motor mysql usa una base MySQL aparte (--base, nunca la de la aplicación).
+Los datos sintéticos se generan una vez por escala y se reutilizan.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import mysql.connector
+
+import busqueda
+import consultas
+import estadisticas
+import prestamos_lote
+from base_datos import CONFIG_BD, DatabaseConnection
+from cola_exportaciones import EXPORTACIONES, FORMATOS
+from exportaciones import OPENPYXL_DISPONIBLE, REPORTLAB_DISPONIBLE
+from paginacion import ConsultaPaginada, TablaLocal
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Libros (y préstamos) de cada escala; usuarios y autores son proporcionales
+ESCALAS = {"10k": 10_000, "1M": 1_000_000, "10M": 10_000_000}
+USUARIOS_POR_LIBRO = 1 / 10
+AUTORES_POR_LIBRO = 1 / 100
+# Uno de cada tantos libros queda con un préstamo activo (no disponible)
+CADA_PRESTADO = 20
+# Filas por INSERT de varias filas al generar los datos
+TAMANO_LOTE_GENERACION = 10_000
+
+REPETICIONES = 5
+# Operaciones por repetición en las pruebas de una fila (búsqueda por id, préstamo)
+OPERACIONES = 200
+LIBROS_POR_LOTE = 30
+# Un escenario retrocede si tarda más que la línea base por este factor...
+TOLERANCIA = 0.25
+# ...y la diferencia supera este ruido mínimo en segundos
+RUIDO_MINIMO = 0.002
+
+# Lo que ve el usuario al abrir una pestaña: la ventana de ListaVirtual (20 visibles + 2 márgenes de 200)
+FILAS_VENTANA = 420
+BASE_PROTEGIDA = CONFIG_BD["database"]
+
+PALABRAS = ("sombra", "río", "ciudad", "noche", "jardín", "memoria", "viento", "casa", "tiempo", "mar",
+            "amor", "guerra", "silencio", "camino", "fuego", "luz", "sueño", "tierra", "isla", "espejo")
+GENEROS = ("Novela", "Cuento", "Poesía", "Ensayo", "Historia", "Ciencia", "Infantil", "Biografía")
+NACIONALIDADES = ("Argentina", "Chilena", "Colombiana", "Mexicana", "Peruana", "Española", "Uruguaya")
+
+
+# DATOS SINTÉTICOS
+def tamaños(libros):
+    return {
+        "libros": libros,
+        "usuarios": max(10, int(libros * USUARIOS_POR_LIBRO)),
+        "autores": max(10, int(libros * AUTORES_POR_LIBRO)),
+        "prestamos": libros,
+    }
+
+
+def _insertar(bd, query, filas, al_avanzar=None):
+    """Inserta las filas por lotes, cada lote en una transacción"""
+    lote = []
+    total = 0
+    with bd.conexion() as conexion:
+        cursor = conexion.cursor()
+        try:
+            for fila in filas:
+                lote.append(fila)
+                if len(lote) == TAMANO_LOTE_GENERACION:
+                    conexion.start_transaction()
+                    cursor.executemany(query, lote)
+                    conexion.commit()
+                    total += len(lote)
+                    lote = []
+                    if al_avanzar:
+                        al_avanzar(total)
+            if lote:
+                conexion.start_transaction()
+                cursor.executemany(query, lote)
+                conexion.commit()
+                total += len(lote)
+        finally:
+            cursor.close()
+    return total
+
+
+def generar_datos(bd, libros, semilla=1, al_avanzar=None):
+    """Llena la base con datos sintéticos de la escala pedida (borra los anteriores)
+
+    Los ids son explícitos y la generación es determinista: dos corridas
+    con la misma escala y semilla producen la misma base.
+    """
+    azar = random.Random(semilla)
+    cantidades = tamaños(libros)
+    for tabla in ("reseñas", "prestamos", "libros", "usuarios", "autores"):
+        bd.execute_query(f"DELETE FROM {tabla}")
+
+    def autores():
+        for n in range(1, cantidades["autores"] + 1):
+            yield (n, f"{azar.choice(PALABRAS).capitalize()} {azar.choice(PALABRAS).capitalize()} {n}",
+                   azar.choice(NACIONALIDADES), date(1900, 1, 1) + timedelta(days=azar.randrange(36500)))
+
+    def libros_():
+        for n in range(1, libros + 1):
+            titulo = f"{azar.choice(PALABRAS).capitalize()} de {azar.choice(PALABRAS)} {n}"
+            autor = f"Autor {azar.randrange(1, cantidades['autores'] + 1)}"
+            yield (n, titulo, autor, azar.choice(GENEROS), azar.randrange(1900, 2025),
+                   f"978-{n:010d}", n % CADA_PRESTADO != 0)
+
+    def usuarios():
+        for n in range(1, cantidades["usuarios"] + 1):
+            yield (n, f"{azar.choice(PALABRAS).capitalize()} {n}", f"usuario{n}@ejemplo.com",
+                   f"555-{n % 10000:04d}")
+
+    hoy = date.today()
+
+    def prestamos():
+        # Los libros no disponibles tienen su préstamo activo; el resto es historial devuelto
+        for n in range(1, cantidades["prestamos"] + 1):
+            usuario = azar.randrange(1, cantidades["usuarios"] + 1)
+            if n % CADA_PRESTADO == 0:
+                yield (n, n, usuario, hoy - timedelta(days=azar.randrange(30)), None, False)
+            else:
+                prestado = hoy - timedelta(days=azar.randrange(30, 1825))
+                yield (n, azar.randrange(1, libros + 1), usuario, prestado,
+                       prestado + timedelta(days=azar.randrange(1, 30)), True)
+
+    avanzar = (lambda tabla: (lambda n: al_avanzar(tabla, n))) if al_avanzar else (lambda tabla: None)
+    _insertar(bd, "INSERT INTO autores (id, nombre, nacionalidad, fecha_nacimiento) VALUES (%s, %s, %s, %s)",
+              autores(), avanzar("autores"))
+    _insertar(bd, """INSERT INTO libros (id, titulo, autor, genero, año_publicacion, isbn, disponible)
+                     VALUES (%s, %s, %s, %s, %s, %s, %s)""", libros_(), avanzar("libros"))
+    _insertar(bd, "INSERT INTO usuarios (id, nombre, email, telefono) VALUES (%s, %s, %s, %s)",
+              usuarios(), avanzar("usuarios"))
+    _insertar(bd, """INSERT INTO prestamos (id, libro_id, usuario_id, fecha_prestamo, fecha_devolucion, devuelto)
+                     VALUES (%s, %s, %s, %s, %s, %s)""", prestamos(), avanzar("prestamos"))
+    bd.invalidar("autores", "libros", "usuarios", "prestamos", "reseñas")
+    # Los préstamos se cargaron sin los procedimientos: se resumen de una vez
+    estadisticas.reconstruir(bd)
+    return cantidades
+
+
+def datos_listos(bd, libros):
+    """True si la base ya tiene los datos de esa escala (se evita regenerarlos)"""
+    for tabla, cantidad in tamaños(libros).items():
+        ok, resultado = bd.execute_query(f"SELECT COUNT(*) FROM {tabla}")
+        if not ok or resultado[0][0] < cantidad:
+            return False
+    return True
+
+
+# MEDICIÓN
+class Escenario:
+    """Una ruta crítica: preparar() una vez, correr() varias veces y devolver las filas u operaciones"""
+
+    def __init__(self, nombre, correr, preparar=None, unidad="filas"):
+        self.nombre = nombre
+        self.correr = correr
+        self.preparar = preparar
+        self.unidad = unidad
+
+
+def medir(escenario, repeticiones=REPETICIONES, memoria=True):
+    """Tiempos de las repeticiones (más una de calentamiento) y el pico de memoria de una corrida aparte"""
+    if escenario.preparar:
+        escenario.preparar()
+    escenario.correr()
+    tiempos = []
+    cantidad = 0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        cantidad = escenario.correr()
+        tiempos.append(time.perf_counter() - inicio)
+
+    pico = None
+    if memoria:
+        # Aparte: tracemalloc hace más lentas las asignaciones y falsearía los tiempos
+        tracemalloc.start()
+        try:
+            escenario.correr()
+            pico = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    mediana = statistics.median(tiempos)
+    return {
+        "segundos": mediana,
+        "minimo": min(tiempos),
+        "maximo": max(tiempos),
+        "cantidad": cantidad,
+        "unidad": escenario.unidad,
+        "por_segundo": cantidad / mediana if mediana > 0 else None,
+        "memoria_pico_kb": pico // 1024 if pico is not None else None,
+    }
+
+
+# ESCENARIOS
+def _sincronico(bd):
+    """ejecutar_en_bd de la interfaz, pero en el mismo hilo: la prueba mide todo el recorrido"""
+    def ejecutar_en_bd(trabajo, al_terminar=None, clave=None, al_fallar=None):
+        resultado = trabajo(bd)
+        if resultado is not None:
+            if al_terminar:
+                al_terminar(resultado)
+        elif al_fallar:
+            al_fallar(None)
+    return ejecutar_en_bd
+
+
+def _abrir_tk():
+    """Ventana oculta para medir los Treeview; None si no hay pantalla"""
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception:
+        return None
+    root.withdraw()
+    return root
+
+
+def escenarios_listas(bd, root):
+    escenarios = []
+    for tabla, argumentos in consultas.LISTAS.items():
+        consulta = ConsultaPaginada(**argumentos)
+
+        def abrir(consulta=consulta):
+            # Lo que hace ListaVirtual.recargar al abrir la pestaña: contar y traer la primera ventana
+            ok, conteo = bd.execute_query(*consulta.contar())
+            ok, filas = bd.execute_query(*consulta.desde_posicion(0, FILAS_VENTANA))
+            return len(filas) if ok else 0
+
+        def saltar(consulta=consulta):
+            # Arrastrar la barra hasta la mitad de la lista
+            ok, conteo = bd.execute_query(*consulta.contar())
+            ok, filas = bd.execute_query(*consulta.desde_posicion(conteo[0][0] // 2, FILAS_VENTANA))
+            return len(filas) if ok else 0
+
+        def desplazar(consulta=consulta):
+            # Rueda del mouse: páginas siguientes por clave desde la primera ventana
+            ok, filas = bd.execute_query(*consulta.desde_posicion(0, 200))
+            total = len(filas) if ok else 0
+            for _ in range(10):
+                if not ok or not filas:
+                    break
+                ok, filas = bd.execute_query(*consulta.siguientes(filas[-1], 200))
+                total += len(filas) if ok else 0
+            return total
+
+        escenarios += [Escenario(f"lista_{tabla}_abrir", abrir),
+                       Escenario(f"lista_{tabla}_saltar_mitad", saltar),
+                       Escenario(f"lista_{tabla}_desplazar", desplazar)]
+        escenarios += escenarios_orden_local(bd, tabla, consulta)
+
+        if root is not None:
+            escenarios.append(_escenario_treeview(bd, root, tabla, argumentos))
+    return escenarios
+
+
+def escenarios_orden_local(bd, tabla, consulta):
+    """Carga de la lista entera en memoria, clic en un encabezado y filtro por columna (sin consultas)"""
+    local = []
+
+    def cargar():
+        # La memoria de este escenario es la de la tabla por columnas (sin los órdenes precalculados)
+        return len(TablaLocal(bd.iterar_consulta(*consulta.todas())).filas)
+
+    def preparar():
+        # Lo que hace ListaVirtual la primera vez: traer la lista y calcular los órdenes fuera del hilo de Tk
+        local[:] = [TablaLocal(bd.iterar_consulta(*consulta.todas()))]
+        local[0].preparar(range(local[0].filas.ancho))
+
+    def reordenar():
+        # Título (o libro) descendente y luego ascendente: dos clics en el mismo encabezado
+        return len(local[0].vista(1, True)) + len(local[0].vista(1))
+
+    def filtrar():
+        # Escribir una palabra letra por letra en la caja de filtro de la segunda columna
+        for n in range(1, len(PALABRAS[0]) + 1):
+            local[0].filtrar(1, PALABRAS[0][:n])
+            filas = local[0].vista()
+        local[0].filtrar(1, "")
+        return len(filas)
+
+    return [Escenario(f"lista_{tabla}_cargar_local", cargar),
+            Escenario(f"lista_{tabla}_reordenar_local", reordenar, preparar),
+            Escenario(f"lista_{tabla}_filtrar_local", filtrar, preparar)]
+
+
+def _escenario_treeview(bd, root, tabla, argumentos):
+    """actualizar_lista_*: recargar la ListaVirtual real, con el llenado del Treeview"""
+    from tkinter import ttk
+    from paginacion import ListaVirtual
+
+    frame = ttk.Frame(root)
+    columnas = [f"c{n}" for n in range(6)]
+    tree = ttk.Treeview(frame, columns=columnas, show="headings", height=20)
+    scroll = ttk.Scrollbar(frame, orient="vertical")
+    lista = ListaVirtual(tree, scroll, ConsultaPaginada(**argumentos), _sincronico(bd))
+
+    def correr():
+        lista.recargar()
+        root.update_idletasks()
+        return len(tree.get_children())
+
+    return Escenario(f"lista_{tabla}_treeview", correr)
+
+
+def escenarios_busquedas(bd, libros):
+    azar = random.Random(2)
+    ids = []
+    consulta_libros = ConsultaPaginada(**consultas.LISTAS["libros"])
+
+    def preparar():
+        ids[:] = [azar.randrange(1, libros + 1) for _ in range(OPERACIONES)]
+
+    def por_id():
+        for libro_id in ids:
+            bd.execute_query(consultas.LIBRO_POR_ID, (libro_id,))
+        return len(ids)
+
+    def por_texto():
+        filas = 0
+        for palabra in PALABRAS[:10]:
+            ok, resultado = busqueda.buscar(bd, consulta_libros, "libros", palabra)
+            filas += len(resultado) if ok else 0
+        return filas
+
+    return [Escenario("buscar_libro_por_id", por_id, preparar, "consultas"),
+            Escenario("buscar_libros_texto", por_texto)]
+
+
+def escenarios_prestamos(bd):
+    disponibles = []
+
+    def preparar():
+        ok, filas = bd.execute_query(
+            "SELECT id FROM libros WHERE disponible = TRUE ORDER BY id LIMIT %s", (OPERACIONES,))
+        disponibles[:] = [fila[0] for fila in filas] if ok else []
+
+    def prestar_y_devolver():
+        # Cada préstamo se devuelve enseguida: la base queda como estaba
+        for libro_id in disponibles:
+            bd.execute_query(consultas.REALIZAR_PRESTAMO, (libro_id, 1))
+        ok, activos = bd.execute_query(
+            f"SELECT id FROM prestamos WHERE devuelto = FALSE AND libro_id IN ({', '.join(['%s'] * len(disponibles))})",
+            tuple(disponibles))
+        for (prestamo_id,) in activos:
+            bd.execute_query(consultas.DEVOLVER_LIBRO, (prestamo_id,))
+        return len(disponibles) * 2
+
+    def por_lote():
+        lote = disponibles[:LIBROS_POR_LOTE]
+        prestamos_lote.prestar_lote(bd, 1, lote)
+        prestamos_lote.devolver_lote(bd, lote)
+        return len(lote) * 2
+
+    return [Escenario("realizar_y_devolver_prestamo", prestar_y_devolver, preparar, "operaciones"),
+            Escenario("prestar_y_devolver_lote", por_lote, preparar, "operaciones")]
+
+
+def escenarios_estadisticas(bd):
+    meses = []
+
+    def preparar():
+        mes = date.today().replace(day=1)
+        meses.clear()
+        for _ in range(12):
+            meses.append(mes)
+            mes = (mes - timedelta(days=1)).replace(day=1)
+
+    def tablero():
+        # Lo que pide la pestaña Estadísticas al elegir cada uno de los últimos 12 meses
+        for mes in meses:
+            estadisticas.resumen(bd, mes)
+        return len(meses)
+
+    def recalcular():
+        ok, conteo = bd.execute_query(consultas.CONTAR_PRESTAMOS)
+        estadisticas.reconstruir(bd)
+        return conteo[0][0] if ok else 0
+
+    return [Escenario("estadisticas_tablero", tablero, preparar, "tableros"),
+            Escenario("estadisticas_recalcular", recalcular)]
+
+
+def escenarios_exportaciones(bd, carpeta):
+    escenarios = []
+    disponibles = {"excel": OPENPYXL_DISPONIBLE, "pdf": REPORTLAB_DISPONIBLE, "csv": True}
+    for tabla, (query, _, encabezados, titulo) in EXPORTACIONES.items():
+        for formato, (exportador, extension) in FORMATOS.items():
+            if not disponibles[formato]:
+                continue
+            nombre_archivo = os.path.join(carpeta, f"{tabla}{extension}")
+
+            def correr(query=query, formato=formato, exportador=exportador, nombre_archivo=nombre_archivo,
+                       encabezados=encabezados, titulo=titulo):
+                contador = [0]
+
+                def contar(filas):
+                    for contador[0], fila in enumerate(filas, start=1):
+                        yield fila
+                filas = contar(bd.iterar_consulta(query))
+                if formato == "pdf":
+                    exito, mensaje = exportador(filas, nombre_archivo, encabezados, titulo)
+                else:
+                    exito, mensaje = exportador(filas, nombre_archivo, encabezados)
+                if not exito:
+                    raise RuntimeError(mensaje)
+                return contador[0]
+
+            escenarios.append(Escenario(f"exportar_{tabla}_{formato}", correr))
+    return escenarios
+
+
+# INFORMES
+def comparar(resultados, base, tolerancia=TOLERANCIA):
+    """[(escenario, segundos base, segundos actuales, variación)] de los que empeoraron"""
+    regresiones = []
+    for nombre, actual in resultados.items():
+        anterior = base.get(nombre)
+        if anterior is None:
+            continue
+        diferencia = actual["segundos"] - anterior["segundos"]
+        if diferencia > RUIDO_MINIMO and actual["segundos"] > anterior["segundos"] * (1 + tolerancia):
+            regresiones.append((nombre, anterior["segundos"], actual["segundos"],
+                                actual["segundos"] / anterior["segundos"] - 1))
+    return regresiones
+
+
+def imprimir(resultados, base=None):
+    print(f"{'Escenario':<36}{'ms':>10}{'por segundo':>24}{'memoria KB':>12}{'vs base':>10}")
+    for nombre, r in resultados.items():
+        por_segundo = f"{r['por_segundo']:,.0f} {r['unidad']}" if r["por_segundo"] else "-"
+        memoria = f"{r['memoria_pico_kb']:,}" if r["memoria_pico_kb"] is not None else "-"
+        variacion = ""
+        if base and nombre in base and base[nombre]["segundos"] > 0:
+            variacion = f"{(r['segundos'] / base[nombre]['segundos'] - 1) * 100:+.0f}%"
+        print(f"{nombre:<36}{r['segundos'] * 1000:>10.1f}{por_segundo:>24}{memoria:>12}{variacion:>10}")
+
+
+def memoria_proceso_kb():
+    """Pico de memoria residente del proceso (KB), si el sistema lo informa"""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB; macOS, bytes
+    return pico // 1024 if sys.platform == "darwin" else pico
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Pruebas de rendimiento del sistema de biblioteca")
+    parser.add_argument("--escala", choices=ESCALAS, default="10k")
+    parser.add_argument("--motor", choices=("sqlite", "mysql"), default="sqlite")
+    parser.add_argument("--archivo", help="base SQLite (por defecto, una por escala en la carpeta temporal)")
+    parser.add_argument("--base", default="biblioteca_benchmark", help="base MySQL de prueba")
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    parser.add_argument("--regenerar", action="store_true", help="volver a generar los datos")
+    parser.add_argument("--solo", help="solo los escenarios que contienen este texto")
+    parser.add_argument("--sin-memoria", action="store_true", help="no medir el pico de memoria")
+    parser.add_argument("--sin-exportaciones", action="store_true")
+    parser.add_argument("--guardar", help="guardar los resultados como línea base (JSON)")
+    parser.add_argument("--comparar", help="línea base contra la que comparar (JSON)")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    opciones = parser.parse_args(argumentos)
+
+    libros = ESCALAS[opciones.escala]
+    if opciones.motor == "mysql":
+        if opciones.base == BASE_PROTEGIDA:
+            parser.error(f"La prueba borra los datos: usa una base distinta de {BASE_PROTEGIDA}")
+        config = {"motor": "mysql", "database": opciones.base}
+    else:
+        archivo = opciones.archivo or os.path.join(tempfile.gettempdir(),
+                                                   f"biblioteca_benchmark_{opciones.escala}.db")
+        config = {"motor": "sqlite", "archivo": archivo}
+    bd = DatabaseConnection(notificar_error=print, migrar=True, **config)
+    if not bd.connect():
+        return 2
+
+    if opciones.regenerar or not datos_listos(bd, libros):
+        print(f"Generando datos de la escala {opciones.escala}...")
+        inicio = time.perf_counter()
+        generar_datos(bd, libros, al_avanzar=lambda tabla, n: print(f"  {tabla}: {n:,}".ljust(40), end="\r"))
+        print(f"Datos generados en {time.perf_counter() - inicio:.1f} s")
+
+    root = _abrir_tk()
+    if root is None:
+        print("Sin pantalla: se omiten las pruebas de llenado de Treeview")
+    carpeta = tempfile.mkdtemp(prefix="biblioteca_benchmark_")
+    escenarios = (escenarios_listas(bd, root) + escenarios_busquedas(bd, libros) + escenarios_prestamos(bd)
+                  + escenarios_estadisticas(bd)
+                  + ([] if opciones.sin_exportaciones else escenarios_exportaciones(bd, carpeta)))
+    if opciones.solo:
+        escenarios = [e for e in escenarios if opciones.solo in e.nombre]
+
+    resultados = {}
+    try:
+        for escenario in escenarios:
+            print(f"  {escenario.nombre}...", end="\r")
+            try:
+                resultados[escenario.nombre] = medir(escenario, opciones.repeticiones, not opciones.sin_memoria)
+            except (mysql.connector.Error, RuntimeError, OSError) as error:
+                print(f"  {escenario.nombre}: falló ({error})")
+    finally:
+        if root is not None:
+            root.destroy()
+        bd.disconnect()
+
+    base = None
+    if opciones.comparar:
+        with open(opciones.comparar, encoding="utf-8") as archivo:
+            base = json.load(archivo)["resultados"]
+    imprimir(resultados, base)
+    pico = memoria_proceso_kb()
+    if pico:
+        print(f"Memoria residente máxima del proceso: {pico:,} KB")
+
+    if opciones.guardar:
+        with open(opciones.guardar, "w", encoding="utf-8") as archivo:
+            json.dump({"escala": opciones.escala, "motor": opciones.motor, "python": platform.python_version(),
+                       "fecha": date.today().isoformat(), "resultados": resultados}, archivo, indent=2)
+        print(f"Línea base guardada en {opciones.guardar}")
+
+    if base is not None:
+        regresiones = comparar(resultados, base, opciones.tolerancia)
+        for nombre, anterior, actual, variacion in regresiones:
+            print(f"REGRESIÓN {nombre}: {anterior * 1000:.1f} ms -> {actual * 1000:.1f} ms ({variacion:+.0%})")
+        if regresiones:
+            return 1
+        print("Sin regresiones respecto de la línea base")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
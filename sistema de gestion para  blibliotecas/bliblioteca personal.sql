@@ -22,7 +22,12 @@ CREATE TABLE libros (
     genero VARCHAR(50),
     año_publicacion INT,
     isbn VARCHAR(20),
-    disponible BOOLEAN DEFAULT TRUE
+    disponible BOOLEAN DEFAULT TRUE,
+    -- Sube con cada cambio de la fila: un préstamo solo se registra si el
+    -- libro sigue en la versión que se leyó (concurrencia optimista)
+    version INT NOT NULL DEFAULT 0,
+    -- Referencia a la portada en el almacén de imágenes (hash del contenido)
+    portada VARCHAR(80)
 );
 
 -- 3. TABLA: usuarios
@@ -31,7 +36,9 @@ CREATE TABLE usuarios (
     nombre VARCHAR(100) NOT NULL,
     email VARCHAR(100) UNIQUE NOT NULL,
     telefono VARCHAR(15),
-    fecha_registro DATE DEFAULT CURRENT_DATE
+    fecha_registro DATE DEFAULT CURRENT_DATE,
+    -- Referencia a la foto en el almacén de imágenes (hash del contenido)
+    foto VARCHAR(80)
 );
 
 -- 4. TABLA: prestamos
@@ -58,6 +65,80 @@ CREATE TABLE reseñas (
     FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
 );
 
+-- 6. TABLAS DE RESUMEN (pestaña Estadísticas)
+-- Las mantienen sp_RealizarPrestamo y sp_DevolverLibro con cada préstamo y
+-- devolución; las estadísticas se leen de aquí sin recorrer el historial.
+-- mes es siempre el primer día del mes.
+CREATE TABLE resumen_prestamos_libro (
+    mes DATE NOT NULL,
+    libro_id INT NOT NULL,
+    prestamos INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (mes, libro_id)
+);
+
+CREATE TABLE resumen_prestamos_genero (
+    mes DATE NOT NULL,
+    genero VARCHAR(50) NOT NULL,
+    prestamos INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (mes, genero)
+);
+
+CREATE TABLE resumen_usuarios (
+    usuario_id INT PRIMARY KEY,
+    prestamos_activos INT NOT NULL DEFAULT 0,
+    prestamos_total INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE resumen_circulacion_diaria (
+    fecha DATE PRIMARY KEY,
+    prestamos INT NOT NULL DEFAULT 0,
+    devoluciones INT NOT NULL DEFAULT 0
+);
+
+-- 7. TABLA: operaciones_aplicadas
+-- Claves de idempotencia de la cola local de cada mostrador: una operación
+-- reenviada después de un corte de conexión no se aplica dos veces
+CREATE TABLE operaciones_aplicadas (
+    clave CHAR(36) PRIMARY KEY,
+    operacion VARCHAR(30) NOT NULL,
+    resultado VARCHAR(255),
+    aplicada DATETIME NOT NULL
+);
+
+-- =============================================
+-- ÍNDICES DE BÚSQUEDA (texto completo)
+-- =============================================
+
+-- Usados por las cajas "Buscar" de las pestañas Libros, Usuarios y Autores
+CREATE FULLTEXT INDEX ft_libros ON libros (titulo, autor, genero, isbn);
+CREATE FULLTEXT INDEX ft_usuarios ON usuarios (nombre, email);
+CREATE FULLTEXT INDEX ft_autores ON autores (nombre);
+
+-- =============================================
+-- ÍNDICES DE LISTAS Y PRÉSTAMOS
+-- =============================================
+
+-- Orden de las listas (paginación por clave: columna de orden más id)
+CREATE INDEX idx_libros_titulo ON libros (titulo, id);
+CREATE INDEX idx_usuarios_nombre ON usuarios (nombre, id);
+CREATE INDEX idx_autores_nombre ON autores (nombre, id);
+CREATE INDEX idx_prestamos_fecha ON prestamos (fecha_prestamo, id);
+-- JOIN del historial y búsqueda del préstamo activo de un libro o usuario
+CREATE INDEX idx_prestamos_libro ON prestamos (libro_id, devuelto);
+CREATE INDEX idx_prestamos_usuario ON prestamos (usuario_id, devuelto);
+
+-- =============================================
+-- ÍNDICES DE ESTADÍSTICAS
+-- =============================================
+
+-- Los más prestados del mes y los usuarios con más préstamos activos
+CREATE INDEX idx_resumen_libro_ranking ON resumen_prestamos_libro (mes, prestamos);
+CREATE INDEX idx_resumen_genero_ranking ON resumen_prestamos_genero (mes, prestamos);
+CREATE INDEX idx_resumen_usuarios_activos ON resumen_usuarios (prestamos_activos);
+
+-- Limpieza de las claves de idempotencia viejas
+CREATE INDEX idx_operaciones_aplicada ON operaciones_aplicadas (aplicada);
+
 -- =============================================
 -- PROCEDIMIENTOS ALMACENADOS
 -- =============================================
@@ -69,11 +150,12 @@ CREATE PROCEDURE sp_InsertarLibro(
     IN p_autor VARCHAR(100),
     IN p_genero VARCHAR(50),
     IN p_anio_publicacion INT,
-    IN p_isbn VARCHAR(20)
+    IN p_isbn VARCHAR(20),
+    IN p_portada VARCHAR(80)
 )
 BEGIN
-    INSERT INTO libros (titulo, autor, genero, año_publicacion, isbn) 
-    VALUES (p_titulo, p_autor, p_genero, p_anio_publicacion, p_isbn);
+    INSERT INTO libros (titulo, autor, genero, año_publicacion, isbn, portada) 
+    VALUES (p_titulo, p_autor, p_genero, p_anio_publicacion, p_isbn, p_portada);
     
     SELECT CONCAT('Libro "', p_titulo, '" insertado correctamente') AS resultado;
 END //
@@ -95,7 +177,8 @@ BEGIN
         autor = p_autor, 
         genero = p_genero, 
         año_publicacion = p_anio_publicacion, 
-        isbn = p_isbn
+        isbn = p_isbn,
+        version = version + 1
     WHERE id = p_id;
     
     SELECT CONCAT('Libro ID ', p_id, ' actualizado correctamente') AS resultado;
@@ -130,15 +213,16 @@ DELIMITER //
 CREATE PROCEDURE sp_InsertarUsuario(
     IN p_nombre VARCHAR(100),
     IN p_email VARCHAR(100),
-    IN p_telefono VARCHAR(15)
+    IN p_telefono VARCHAR(15),
+    IN p_foto VARCHAR(80)
 )
 BEGIN
     -- Verificar si el email ya existe
     IF EXISTS (SELECT 1 FROM usuarios WHERE email = p_email) THEN
         SELECT CONCAT('Error: El email ', p_email, ' ya está registrado') AS resultado;
     ELSE
-        INSERT INTO usuarios (nombre, email, telefono) 
-        VALUES (p_nombre, p_email, p_telefono);
+        INSERT INTO usuarios (nombre, email, telefono, foto) 
+        VALUES (p_nombre, p_email, p_telefono, p_foto);
         
         SELECT CONCAT('Usuario "', p_nombre, '" registrado correctamente') AS resultado;
     END IF;
@@ -153,11 +237,13 @@ CREATE PROCEDURE sp_RealizarPrestamo(
 )
 BEGIN
     DECLARE v_disponible BOOLEAN;
+    DECLARE v_version INT;
     DECLARE v_libro_titulo VARCHAR(100);
+    DECLARE v_genero VARCHAR(50);
     DECLARE v_usuario_nombre VARCHAR(100);
     
     -- Verificar si el libro existe y está disponible
-    SELECT disponible, titulo INTO v_disponible, v_libro_titulo 
+    SELECT disponible, version, titulo, genero INTO v_disponible, v_version, v_libro_titulo, v_genero 
     FROM libros WHERE id = p_libro_id;
     
     -- Verificar si el usuario existe
@@ -170,13 +256,34 @@ BEGIN
     ELSEIF NOT v_disponible THEN
         SELECT CONCAT('Error: El libro "', v_libro_titulo, '" no está disponible') AS resultado;
     ELSE
-        -- Registrar el préstamo
-        INSERT INTO prestamos (libro_id, usuario_id) VALUES (p_libro_id, p_usuario_id);
+        -- Marcar libro como no disponible, solo si nadie lo cambió desde la lectura:
+        -- si otro mostrador se adelantó no se registra un segundo préstamo
+        UPDATE libros SET disponible = FALSE, version = version + 1
+        WHERE id = p_libro_id AND version = v_version AND disponible = TRUE;
         
-        -- Marcar libro como no disponible
-        UPDATE libros SET disponible = FALSE WHERE id = p_libro_id;
-        
-        SELECT CONCAT('Préstamo realizado: ', v_usuario_nombre, ' -> ', v_libro_titulo) AS resultado;
+        IF ROW_COUNT() = 0 THEN
+            SELECT CONCAT('Error: Conflicto: otro mostrador cambió el libro "', v_libro_titulo,
+                          '"; reintente') AS resultado;
+        ELSE
+            -- Registrar el préstamo
+            INSERT INTO prestamos (libro_id, usuario_id) VALUES (p_libro_id, p_usuario_id);
+            
+            -- Actualizar los resúmenes de la pestaña Estadísticas
+            INSERT INTO resumen_prestamos_libro (mes, libro_id, prestamos)
+            VALUES (DATE_FORMAT(CURDATE(), '%Y-%m-01'), p_libro_id, 1)
+            ON DUPLICATE KEY UPDATE prestamos = prestamos + 1;
+            INSERT INTO resumen_prestamos_genero (mes, genero, prestamos)
+            VALUES (DATE_FORMAT(CURDATE(), '%Y-%m-01'), COALESCE(NULLIF(v_genero, ''), 'Sin género'), 1)
+            ON DUPLICATE KEY UPDATE prestamos = prestamos + 1;
+            INSERT INTO resumen_usuarios (usuario_id, prestamos_activos, prestamos_total)
+            VALUES (p_usuario_id, 1, 1)
+            ON DUPLICATE KEY UPDATE prestamos_activos = prestamos_activos + 1, prestamos_total = prestamos_total + 1;
+            INSERT INTO resumen_circulacion_diaria (fecha, prestamos, devoluciones)
+            VALUES (CURDATE(), 1, 0)
+            ON DUPLICATE KEY UPDATE prestamos = prestamos + 1;
+            
+            SELECT CONCAT('Préstamo realizado: ', v_usuario_nombre, ' -> ', v_libro_titulo) AS resultado;
+        END IF;
     END IF;
 END //
 DELIMITER ;
@@ -186,11 +293,13 @@ DELIMITER //
 CREATE PROCEDURE sp_DevolverLibro(IN p_prestamo_id INT)
 BEGIN
     DECLARE v_libro_id INT;
+    DECLARE v_usuario_id INT;
     DECLARE v_libro_titulo VARCHAR(100);
     DECLARE v_devuelto BOOLEAN;
     
     -- Obtener información del préstamo
-    SELECT p.libro_id, l.titulo, p.devuelto INTO v_libro_id, v_libro_titulo, v_devuelto
+    SELECT p.libro_id, p.usuario_id, l.titulo, p.devuelto
+    INTO v_libro_id, v_usuario_id, v_libro_titulo, v_devuelto
     FROM prestamos p
     JOIN libros l ON p.libro_id = l.id
     WHERE p.id = p_prestamo_id;
@@ -200,15 +309,26 @@ BEGIN
     ELSEIF v_devuelto THEN
         SELECT 'Error: Este préstamo ya fue devuelto' AS resultado;
     ELSE
-        -- Marcar préstamo como devuelto
+        -- Marcar préstamo como devuelto (si otro mostrador no lo devolvió recién)
         UPDATE prestamos 
         SET devuelto = TRUE, fecha_devolucion = CURDATE() 
-        WHERE id = p_prestamo_id;
-        
-        -- Marcar libro como disponible
-        UPDATE libros SET disponible = TRUE WHERE id = v_libro_id;
+        WHERE id = p_prestamo_id AND devuelto = FALSE;
         
-        SELECT CONCAT('Libro "', v_libro_titulo, '" devuelto correctamente') AS resultado;
+        IF ROW_COUNT() = 0 THEN
+            SELECT 'Error: Este préstamo ya fue devuelto' AS resultado;
+        ELSE
+            -- Marcar libro como disponible
+            UPDATE libros SET disponible = TRUE, version = version + 1 WHERE id = v_libro_id;
+            
+            -- Actualizar los resúmenes de la pestaña Estadísticas
+            UPDATE resumen_usuarios SET prestamos_activos = prestamos_activos - 1
+            WHERE usuario_id = v_usuario_id AND prestamos_activos > 0;
+            INSERT INTO resumen_circulacion_diaria (fecha, prestamos, devoluciones)
+            VALUES (CURDATE(), 0, 1)
+            ON DUPLICATE KEY UPDATE devoluciones = devoluciones + 1;
+            
+            SELECT CONCAT('Libro "', v_libro_titulo, '" devuelto correctamente') AS resultado;
+        END IF;
     END IF;
 END //
 DELIMITER ;
@@ -345,6 +465,27 @@ INSERT INTO prestamos (libro_id, usuario_id, fecha_prestamo, fecha_devolucion, d
 (2, 2, '2024-02-05', NULL, FALSE),
 (3, 3, '2024-02-10', NULL, FALSE);
 
+-- Resúmenes de los préstamos de ejemplo (cargados sin sp_RealizarPrestamo)
+INSERT INTO resumen_prestamos_libro (mes, libro_id, prestamos)
+SELECT DATE_FORMAT(fecha_prestamo, '%Y-%m-01'), libro_id, COUNT(*)
+FROM prestamos GROUP BY DATE_FORMAT(fecha_prestamo, '%Y-%m-01'), libro_id;
+
+INSERT INTO resumen_prestamos_genero (mes, genero, prestamos)
+SELECT DATE_FORMAT(p.fecha_prestamo, '%Y-%m-01'), COALESCE(NULLIF(l.genero, ''), 'Sin género'), COUNT(*)
+FROM prestamos p JOIN libros l ON p.libro_id = l.id
+GROUP BY DATE_FORMAT(p.fecha_prestamo, '%Y-%m-01'), COALESCE(NULLIF(l.genero, ''), 'Sin género');
+
+INSERT INTO resumen_usuarios (usuario_id, prestamos_activos, prestamos_total)
+SELECT usuario_id, SUM(CASE WHEN devuelto THEN 0 ELSE 1 END), COUNT(*)
+FROM prestamos GROUP BY usuario_id;
+
+INSERT INTO resumen_circulacion_diaria (fecha, prestamos, devoluciones)
+SELECT fecha, SUM(prestamos), SUM(devoluciones) FROM (
+    SELECT fecha_prestamo AS fecha, 1 AS prestamos, 0 AS devoluciones FROM prestamos
+    UNION ALL
+    SELECT fecha_devolucion, 0, 1 FROM prestamos WHERE devuelto = TRUE AND fecha_devolucion IS NOT NULL
+) movimientos GROUP BY fecha;
+
 -- Insertar reseñas
 INSERT INTO reseñas (libro_id, usuario_id, calificacion, comentario, fecha_reseña) VALUES
 (1, 1, 5, 'Una obra maestra de la literatura latinoamericana', '2024-02-16'),
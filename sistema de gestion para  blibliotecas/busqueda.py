@@ -0,0 +1,123 @@
+import re
+
+from paginacion import normalizar
+
+# Milisegundos sin teclear antes de lanzar la búsqueda
+ESPERA_BUSQUEDA = 250
+MAXIMO_RESULTADOS = 200
+# Palabras más cortas no entran en el índice FULLTEXT (innodb_ft_min_token_size)
+LARGO_MINIMO_FULLTEXT = 3
+
+# Columnas de cada índice FULLTEXT; la primera es la de orden alfabético
+CAMPOS_BUSQUEDA = {
+    "libros": ("titulo", "autor", "genero", "isbn"),
+    "usuarios": ("nombre", "email"),
+    "autores": ("nombre",),
+}
+
+# Tablas en las que falló MATCH por no tener aún el índice FULLTEXT
+_sin_fulltext = set()
+
+
+def terminos(texto):
+    """Palabras de la búsqueda, en minúsculas y sin acentos"""
+    return re.findall(r"\w+", normalizar(texto))
+
+
+def _escapar_like(texto):
+    # Con ESCAPE '!' explícito: MySQL y SQLite no comparten carácter de escape por defecto
+    return texto.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+
+def condicion_busqueda(tabla, texto, fulltext=True):
+    """Devuelve (condicion, parametros, orden, parametros_orden) para buscar texto en la tabla
+
+    Las palabras largas se buscan como prefijos en el índice FULLTEXT y
+    los resultados se ordenan por relevancia. Si solo hay palabras cortas
+    (lo típico al empezar a escribir) se usa un prefijo sobre la primera
+    columna, que aprovecha su índice normal.
+    """
+    campos = CAMPOS_BUSQUEDA[tabla]
+    palabras = terminos(texto)
+    largas = [p for p in palabras if len(p) >= LARGO_MINIMO_FULLTEXT]
+
+    condiciones = []
+    parametros = []
+    orden = campos[0]
+    parametros_orden = []
+
+    if fulltext and largas:
+        match = f"MATCH({', '.join(campos)}) AGAINST (%s IN BOOLEAN MODE)"
+        booleana = " ".join(f"+{p}*" for p in largas)
+        condiciones.append(match)
+        parametros.append(booleana)
+        orden = f"{match} DESC, {campos[0]}"
+        parametros_orden.append(booleana)
+        por_palabra = [p for p in palabras if p not in largas]
+    elif fulltext or not largas:
+        condiciones.append(f"{campos[0]} LIKE %s ESCAPE '!'")
+        parametros.append(_escapar_like(texto.strip()) + "%")
+        por_palabra = []
+    else:
+        por_palabra = palabras
+
+    # Cada palabra restante debe empezar alguna palabra de alguna columna
+    for palabra in por_palabra:
+        alternativas = []
+        for campo in campos:
+            alternativas.append(f"{campo} LIKE %s ESCAPE '!' OR {campo} LIKE %s ESCAPE '!'")
+            parametros.extend([_escapar_like(palabra) + "%", "% " + _escapar_like(palabra) + "%"])
+        condiciones.append("(" + " OR ".join(alternativas) + ")")
+
+    return " AND ".join(condiciones) or "1 = 1", parametros, orden, parametros_orden
+
+
+def buscar(bd, consulta, tabla, texto, limite=MAXIMO_RESULTADOS):
+    """Ejecuta la búsqueda con las columnas de la ConsultaPaginada de la lista
+
+    Devuelve (success, filas). Si la tabla todavía no tiene índice FULLTEXT
+    se repite la búsqueda con LIKE y se recuerda para las siguientes; los
+    motores sin FULLTEXT (SQLite) usan LIKE directamente.
+    """
+    fulltext = bd.motor.fulltext and tabla not in _sin_fulltext
+    while True:
+        condicion, parametros, orden, parametros_orden = condicion_busqueda(tabla, texto, fulltext)
+        query, parametros = consulta.donde(condicion, parametros)
+        query = f"{query} ORDER BY {orden} LIMIT %s"
+        success, result = bd.execute_query(query, tuple(parametros) + tuple(parametros_orden) + (limite,))
+        if not success and fulltext and "FULLTEXT" in str(result):
+            _sin_fulltext.add(tabla)
+            fulltext = False
+            continue
+        return success, result
+
+
+# CAJA DE BÚSQUEDA CON ESPERA
+class BusquedaDiferida:
+    """Llama al_buscar(texto) cuando el usuario deja de escribir en el Entry"""
+
+    def __init__(self, entry, al_buscar, espera=ESPERA_BUSQUEDA):
+        self.entry = entry
+        self.al_buscar = al_buscar
+        self.espera = espera
+        self._pendiente = None
+        entry.bind("<KeyRelease>", self._programar)
+        entry.bind("<Return>", lambda e: self._disparar())
+        entry.bind("<Escape>", lambda e: self.limpiar())
+
+    def _programar(self, event=None):
+        if event is not None and event.keysym in ("Return", "Escape"):
+            return
+        if self._pendiente is not None:
+            self.entry.after_cancel(self._pendiente)
+        self._pendiente = self.entry.after(self.espera, self._disparar)
+
+    def _disparar(self):
+        if self._pendiente is not None:
+            self.entry.after_cancel(self._pendiente)
+            self._pendiente = None
+        self.al_buscar(self.entry.get().strip())
+
+    def limpiar(self):
+        self.entry.delete(0, "end")
+        self._disparar()
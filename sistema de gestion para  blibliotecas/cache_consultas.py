@@ -0,0 +1,182 @@
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+
+# Resultados de SELECT que se guardan como máximo
+MAXIMO_ENTRADAS = 2000
+# Segundos que vale un resultado; acota lo desactualizado si otro equipo escribe en la base
+SEGUNDOS_VIGENCIA = 60
+
+# Qué invalida cada procedimiento que escribe: (tabla, fila)
+#   None -> solo filas nuevas: listas y conteos de la tabla
+#   n    -> el parámetro n es el id de la fila modificada
+#   "*"  -> filas desconocidas: toda la tabla
+INVALIDACIONES = {
+    "sp_insertarlibro": (("libros", None),),
+    "sp_actualizarlibro": (("libros", 0),),
+    "sp_eliminarlibro": (("libros", 0), ("prestamos", "*"), ("reseñas", "*")),
+    "sp_insertarusuario": (("usuarios", None),),
+    "sp_realizarprestamo": (("libros", 0), ("prestamos", None), ("resumen_prestamos_libro", None),
+                            ("resumen_prestamos_genero", None), ("resumen_usuarios", None),
+                            ("resumen_circulacion_diaria", None)),
+    "sp_devolverlibro": (("prestamos", 0), ("libros", "*"), ("resumen_usuarios", None),
+                         ("resumen_circulacion_diaria", None)),
+    "sp_insertarautor": (("autores", None),),
+    "sp_eliminarautor": (("autores", 0),),
+    "sp_insertarreseña": (("reseñas", None),),
+}
+# Procedimientos que solo leen (no invalidan nada)
+SOLO_LECTURA = {"sp_obtenerestadisticas", "sp_buscarlibrosportitulo", "sp_obtenerprestamosactivos"}
+
+PATRON_TABLAS = re.compile(r"\b(?:FROM|JOIN|INTO|UPDATE)\s+`?(\w+)`?", re.IGNORECASE)
+PATRON_ENTIDAD = re.compile(r"^\s*SELECT\s.+?\sFROM\s+`?(\w+)`?\s+WHERE\s+id\s*=\s*%s\s*$",
+                            re.IGNORECASE | re.DOTALL)
+PATRON_CALL = re.compile(r"^\s*CALL\s+`?(\w+)`?", re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def analizar(query):
+    """Devuelve (tipo, detalle) de una consulta; se calcula una vez por texto
+
+    tipo es "entidad" (búsqueda por id; detalle: la tabla), "select"
+    (detalle: tablas leídas), "call" (detalle: nombre del procedimiento en
+    minúsculas) u "otra" (detalle: tablas que escribe).
+    """
+    inicio = query.lstrip()[:6].upper()
+    if inicio == "SELECT":
+        entidad = PATRON_ENTIDAD.match(query)
+        if entidad and "JOIN" not in query.upper():
+            return "entidad", entidad.group(1).lower()
+        return "select", frozenset(tabla.lower() for tabla in PATRON_TABLAS.findall(query))
+    llamada = PATRON_CALL.match(query)
+    if llamada:
+        return "call", llamada.group(1).lower()
+    return "otra", frozenset(tabla.lower() for tabla in PATRON_TABLAS.findall(query))
+
+
+# CACHÉ DE CONSULTAS
+class CacheConsultas:
+    """Guarda resultados de SELECT y los invalida cuando una escritura toca sus tablas
+
+    Las búsquedas por id (SELECT ... FROM tabla WHERE id = %s) quedan
+    asociadas a esa fila: un préstamo invalida el libro prestado, no todos.
+    El resto de las consultas (páginas de listas, conteos, búsquedas) se
+    asocian a las tablas que leen.
+    """
+
+    def __init__(self, maximo=MAXIMO_ENTRADAS, vigencia=SEGUNDOS_VIGENCIA):
+        self.maximo = maximo
+        self.vigencia = vigencia
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+        self._entradas = OrderedDict()
+        self._por_etiqueta = defaultdict(set)
+        self._epoca = 0
+        self._lock = threading.Lock()
+
+    def consultar(self, query, parameters, ejecutar):
+        """Responde desde la caché o con ejecutar(query, parameters), invalidando tras escribir"""
+        tipo, detalle = analizar(query)
+        if tipo in ("select", "entidad"):
+            return self._leer(tipo, detalle, query, parameters, ejecutar)
+
+        resultado = ejecutar(query, parameters)
+        if resultado[0]:
+            if tipo == "call":
+                if detalle not in SOLO_LECTURA:
+                    self._invalidar_procedimiento(detalle, parameters or ())
+            else:
+                self.invalidar_tablas(detalle)
+        return resultado
+
+    def _leer(self, tipo, detalle, query, parameters, ejecutar):
+        clave = (query, tuple(parameters) if parameters else ())
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] > ahora:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return True, list(entrada[1])
+            self.fallos += 1
+            epoca = self._epoca
+
+        success, result = ejecutar(query, parameters)
+        if not success:
+            return success, result
+
+        if tipo == "entidad":
+            etiquetas = ((detalle, str(clave[1][0])), (detalle, "*"))
+        else:
+            etiquetas = tuple((tabla, None) for tabla in detalle)
+        with self._lock:
+            # Si algo se invalidó mientras la consulta corría, el resultado puede ser viejo
+            if epoca == self._epoca:
+                self._quitar(clave)
+                self._entradas[clave] = (ahora + self.vigencia, list(result), etiquetas)
+                for etiqueta in etiquetas:
+                    self._por_etiqueta[etiqueta].add(clave)
+                while len(self._entradas) > self.maximo:
+                    self._quitar(next(iter(self._entradas)))
+        return success, result
+
+    def _quitar(self, clave):
+        entrada = self._entradas.pop(clave, None)
+        if entrada is None:
+            return
+        for etiqueta in entrada[2]:
+            claves = self._por_etiqueta.get(etiqueta)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._por_etiqueta[etiqueta]
+
+    def _invalidar(self, etiquetas):
+        with self._lock:
+            self._epoca += 1
+            self.invalidaciones += 1
+            for etiqueta in etiquetas:
+                for clave in list(self._por_etiqueta.get(etiqueta, ())):
+                    self._quitar(clave)
+
+    def _invalidar_procedimiento(self, procedimiento, parameters):
+        if procedimiento not in INVALIDACIONES:
+            # Procedimiento desconocido: no se sabe qué cambió
+            self.limpiar()
+            return
+        etiquetas = []
+        for tabla, fila in INVALIDACIONES[procedimiento]:
+            etiquetas.append((tabla, None))
+            if fila == "*":
+                etiquetas.append((tabla, "*"))
+            elif fila is not None and fila < len(parameters):
+                etiquetas.append((tabla, str(parameters[fila])))
+        self._invalidar(etiquetas)
+
+    def invalidar_tablas(self, tablas):
+        """Olvida todo lo leído de esas tablas (p. ej. después de una importación)"""
+        etiquetas = []
+        for tabla in tablas:
+            etiquetas.extend([(tabla, None), (tabla, "*")])
+        self._invalidar(etiquetas)
+
+    def limpiar(self):
+        with self._lock:
+            self._epoca += 1
+            self.invalidaciones += 1
+            self._entradas.clear()
+            self._por_etiqueta.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._entradas),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "invalidaciones": self.invalidaciones,
+                "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+            }
@@ -0,0 +1,321 @@
+"""Cola local de escrituras: el mostrador registra préstamos, devoluciones y altas sin esperar al servidor
+
+Cada operación ya validada se guarda primero en una base SQLite local
+(~/.biblioteca_personal/pendientes.db) con una clave de idempotencia; eso
+tarda milisegundos y funciona aunque el servidor esté lento o caído. Un
+Sincronizador en un hilo de fondo las aplica en orden y por lotes. Cada
+lote es una transacción del servidor que anota sus claves en
+operaciones_aplicadas: si la conexión se corta después del COMMIT y el
+lote se reenvía, las operaciones ya aplicadas no se repiten. Las que el
+servidor rechaza (el libro ya estaba prestado, el email ya existía)
+quedan en la cola como conflictos hasta que el bibliotecario las revisa.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import mysql.connector
+
+import consultas
+import reservas
+from metricas import METRICAS
+from miniaturas import CARPETA_DATOS
+from prestamos_lote import en_transaccion, llamar
+
+ARCHIVO_COLA = os.path.join(CARPETA_DATOS, "pendientes.db")
+# Operaciones que se aplican en cada transacción del servidor
+TAMANO_LOTE = 50
+# Segundos entre intentos de sincronizar cuando no llegan operaciones nuevas
+INTERVALO_SINCRONIZACION = 5
+# Días que el servidor recuerda las claves aplicadas
+DIAS_CLAVES = 30
+# Largo máximo del mensaje que se guarda con cada clave (VARCHAR del servidor)
+LARGO_RESULTADO = 255
+
+# Estados de una operación en la cola (las aplicadas se borran)
+PENDIENTE = "pendiente"
+APLICADA = "aplicada"
+CONFLICTO = "conflicto"
+
+# Operación -> (procedimiento, tablas que cambia, descripción a partir de sus parámetros)
+OPERACIONES = {
+    "realizar_prestamo": (consultas.REALIZAR_PRESTAMO, ("libros", "prestamos") + consultas.TABLAS_RESUMEN,
+                          "Préstamo del libro {0} al usuario {1}"),
+    "devolver_libro": (consultas.DEVOLVER_LIBRO, ("libros", "prestamos") + consultas.TABLAS_RESUMEN,
+                       "Devolución del préstamo {0}"),
+    "guardar_libro": (consultas.INSERTAR_LIBRO, ("libros",), 'Libro "{0}"'),
+    "guardar_usuario": (consultas.INSERTAR_USUARIO, ("usuarios",), 'Usuario "{0}" ({1})'),
+    "guardar_autor": (consultas.INSERTAR_AUTOR, ("autores",), 'Autor "{0}"'),
+}
+
+# WAL y synchronous=FULL: cada operación está en el disco cuando agregar() vuelve
+ESQUEMA_COLA = """
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = FULL;
+CREATE TABLE IF NOT EXISTS operaciones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    clave TEXT UNIQUE NOT NULL,
+    operacion TEXT NOT NULL,
+    parametros TEXT NOT NULL,
+    creada TEXT NOT NULL,
+    estado TEXT NOT NULL DEFAULT 'pendiente',
+    intentos INTEGER NOT NULL DEFAULT 0,
+    resultado TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_operaciones_estado ON operaciones (estado, id);
+"""
+
+# En el servidor
+CLAVE_APLICADA = "SELECT resultado FROM operaciones_aplicadas WHERE clave = %s"
+REGISTRAR_CLAVE = """INSERT INTO operaciones_aplicadas (clave, operacion, resultado, aplicada)
+                     VALUES (%s, %s, %s, %s)"""
+OLVIDAR_CLAVES = "DELETE FROM operaciones_aplicadas WHERE aplicada < %s"
+
+
+def describir(operacion, parametros):
+    try:
+        return OPERACIONES[operacion][2].format(*parametros)
+    except (KeyError, IndexError, TypeError):
+        # Fila de una versión anterior de la cola: se muestra tal cual
+        return f"{operacion} {parametros}"
+
+
+def _leer_parametros(operacion, parametros):
+    """Parámetros guardados de una operación; ValueError si la fila no se puede aplicar"""
+    if operacion not in OPERACIONES:
+        raise ValueError(f"operación desconocida {operacion}")
+    parametros = json.loads(parametros)
+    if not isinstance(parametros, list):
+        raise ValueError("parámetros ilegibles")
+    return parametros
+
+
+def _error_de_conexion(error):
+    """Errores que se resuelven esperando (servidor caído, bloqueos); los demás son de la operación"""
+    return (isinstance(error, (mysql.connector.InterfaceError, mysql.connector.OperationalError,
+                               mysql.connector.PoolError))
+            or reservas.es_conflicto(error))
+
+
+# COLA LOCAL
+class ColaEscrituras:
+    """Operaciones pendientes y en conflicto, en un archivo SQLite local; se puede usar desde cualquier hilo"""
+
+    def __init__(self, archivo=ARCHIVO_COLA):
+        if archivo != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(archivo)), exist_ok=True)
+        self._conexion = sqlite3.connect(archivo, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conexion.executescript(ESQUEMA_COLA)
+
+    def agregar(self, operacion, parametros):
+        """Guarda una operación ya validada; devuelve su clave de idempotencia"""
+        if operacion not in OPERACIONES:
+            raise ValueError(f"Operación desconocida: {operacion}")
+        clave = str(uuid.uuid4())
+        with self._lock:
+            self._conexion.execute(
+                "INSERT INTO operaciones (clave, operacion, parametros, creada) VALUES (?, ?, ?, ?)",
+                (clave, operacion, json.dumps(list(parametros), default=str),
+                 datetime.now().isoformat(" ", "seconds")))
+        return clave
+
+    def pendientes(self, limite=TAMANO_LOTE):
+        """Las próximas operaciones a aplicar, en el orden en que se registraron: [(id, clave, operacion, parametros)]
+
+        Las filas que no se pueden leer pasan a conflicto, para que no traben la cola.
+        """
+        while True:
+            with self._lock:
+                filas = self._conexion.execute(
+                    "SELECT id, clave, operacion, parametros FROM operaciones WHERE estado = ? ORDER BY id LIMIT ?",
+                    (PENDIENTE, limite)).fetchall()
+            lote, ilegibles = [], []
+            for id_, clave, operacion, parametros in filas:
+                try:
+                    lote.append((id_, clave, operacion, _leer_parametros(operacion, parametros)))
+                except ValueError as error:
+                    ilegibles.append((id_, CONFLICTO, f"Error: {error}"))
+            if not ilegibles:
+                return lote
+            self.marcar(ilegibles)
+            if lote:
+                return lote
+
+    def marcar(self, resultados):
+        """Anota el resultado de cada operación [(id, estado, mensaje)]; las aplicadas salen de la cola"""
+        with self._lock:
+            self._conexion.execute("BEGIN")
+            for id_, estado, mensaje in resultados:
+                if estado == APLICADA:
+                    self._conexion.execute("DELETE FROM operaciones WHERE id = ?", (id_,))
+                else:
+                    self._conexion.execute("""UPDATE operaciones SET estado = ?, resultado = ?, intentos = intentos + 1
+                                              WHERE id = ?""", (estado, mensaje, id_))
+            self._conexion.execute("COMMIT")
+
+    def listar(self):
+        """Las operaciones que siguen en la cola: [(id, creada, descripción, estado, intentos, resultado)]"""
+        with self._lock:
+            filas = self._conexion.execute(
+                "SELECT id, creada, operacion, parametros, estado, intentos, resultado FROM operaciones ORDER BY id"
+            ).fetchall()
+        operaciones = []
+        for id_, creada, operacion, parametros, estado, intentos, resultado in filas:
+            try:
+                descripcion = describir(operacion, _leer_parametros(operacion, parametros))
+            except ValueError:
+                descripcion = f"{operacion} {parametros}"
+            operaciones.append((id_, creada, descripcion, estado, intentos, resultado or ""))
+        return operaciones
+
+    def contar(self):
+        """(pendientes, conflictos)"""
+        with self._lock:
+            cantidades = dict(self._conexion.execute(
+                "SELECT estado, COUNT(*) FROM operaciones GROUP BY estado").fetchall())
+        return cantidades.get(PENDIENTE, 0), cantidades.get(CONFLICTO, 0)
+
+    def descartar(self, ids):
+        """Quita de la cola los conflictos ya revisados"""
+        with self._lock:
+            self._conexion.executemany("DELETE FROM operaciones WHERE id = ? AND estado = ?",
+                                       [(id_, CONFLICTO) for id_ in ids])
+
+    def cerrar(self):
+        with self._lock:
+            self._conexion.close()
+
+
+# SINCRONIZACIÓN
+class Sincronizador(threading.Thread):
+    """Hilo que aplica la cola en el servidor
+
+    Se despierta con avisar() (después de agregar una operación) o cada
+    intervalo segundos. al_sincronizar(aplicadas, en_linea) se llama desde
+    este hilo con las operaciones que el servidor resolvió, como
+    [(operacion, parametros, estado, mensaje)], y si el servidor respondió.
+    """
+
+    def __init__(self, cola, bd, al_sincronizar=None, intervalo=INTERVALO_SINCRONIZACION):
+        super().__init__(name="sincronizador", daemon=True)
+        self.cola = cola
+        self.bd = bd
+        self.al_sincronizar = al_sincronizar
+        self.intervalo = intervalo
+        self.en_linea = None
+        self._despertar = threading.Event()
+        self._detenido = threading.Event()
+        self._claves_olvidadas = False
+
+    def avisar(self):
+        self._despertar.set()
+
+    def detener(self, espera=2):
+        self._detenido.set()
+        self._despertar.set()
+        if self.is_alive():
+            self.join(espera)
+
+    def run(self):
+        while not self._detenido.is_set():
+            try:
+                self.sincronizar()
+            except sqlite3.Error:
+                # Problema con el archivo local (disco lleno, bloqueado): se reintenta en la próxima vuelta
+                METRICAS.registrar_interfaz("sincronizacion", "error_cola", 0)
+            except Exception:
+                # Cualquier otra falla no debe terminar el hilo: la cola quedaría sin enviarse toda la sesión
+                METRICAS.registrar_interfaz("sincronizacion", "error", 0)
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+
+    def sincronizar(self):
+        """Aplica los pendientes por lotes hasta vaciar la cola o perder el servidor; devuelve cuántos resolvió"""
+        resueltas = 0
+        while not self._detenido.is_set():
+            lote = self.cola.pendientes()
+            if not lote:
+                break
+            if not self.bd.conectado and not self.bd.connect(notificar=False):
+                self._avisar([], False)
+                break
+            self._olvidar_claves()
+
+            inicio = time.perf_counter()
+            try:
+                resultados = en_transaccion(self.bd, lambda cursor: self._aplicar(cursor, lote))
+            except Exception as error:
+                if isinstance(error, mysql.connector.Error) and _error_de_conexion(error):
+                    self.cola.marcar([(id_, PENDIENTE, str(error)) for id_, _, _, _ in lote])
+                    self._avisar([], False)
+                    break
+                # Una operación que el servidor no acepta (o que ya no coincide con
+                # el procedimiento) no debe trabar la cola: de a una
+                resultados = self._aplicar_de_a_una(lote)
+            METRICAS.registrar_interfaz("sincronizacion", "lote", time.perf_counter() - inicio, len(resultados))
+
+            self.cola.marcar(resultados)
+            por_id = {id_: (operacion, parametros) for id_, _, operacion, parametros in lote}
+            aplicadas = [por_id[id_] + (estado, mensaje) for id_, estado, mensaje in resultados
+                         if estado != PENDIENTE]
+            tablas = {tabla for operacion, _, _, _ in aplicadas for tabla in OPERACIONES[operacion][1]}
+            if tablas:
+                self.bd.invalidar(*tablas)
+            resueltas += len(aplicadas)
+            self._avisar(aplicadas, True)
+            if len(aplicadas) < len(lote):
+                # Quedó algo para reintentar (conflicto de versión): en la próxima vuelta
+                break
+        return resueltas
+
+    def _aplicar(self, cursor, lote):
+        """Aplica el lote en la transacción del cursor: [(id, estado, mensaje)]
+
+        Se detiene en el primer conflicto de versión (otro mostrador cambió
+        el libro): el resto del lote queda pendiente para no alterar el orden.
+        """
+        resultados = []
+        for id_, clave, operacion, parametros in lote:
+            cursor.execute(CLAVE_APLICADA, (clave,))
+            filas = cursor.fetchall()
+            if filas:
+                # Ya se aplicó en un envío anterior que no llegó a confirmarse en la cola
+                mensaje = filas[0][0] or ""
+            else:
+                mensaje = llamar(cursor, OPERACIONES[operacion][0], tuple(parametros))
+                if reservas.es_conflicto(mensaje):
+                    resultados.append((id_, PENDIENTE, mensaje))
+                    break
+                cursor.execute(REGISTRAR_CLAVE, (clave, operacion, mensaje[:LARGO_RESULTADO], datetime.now()))
+            resultados.append((id_, CONFLICTO if mensaje.startswith("Error") else APLICADA, mensaje))
+        return resultados
+
+    def _aplicar_de_a_una(self, lote):
+        resultados = []
+        for operacion in lote:
+            try:
+                resultados += en_transaccion(self.bd, lambda cursor: self._aplicar(cursor, [operacion]))
+            except Exception as error:
+                if isinstance(error, mysql.connector.Error) and _error_de_conexion(error):
+                    resultados.append((operacion[0], PENDIENTE, str(error)))
+                    break
+                resultados.append((operacion[0], CONFLICTO, f"Error: {error}"))
+        return resultados
+
+    def _olvidar_claves(self):
+        """Borra del servidor las claves viejas, una vez por sesión"""
+        if self._claves_olvidadas:
+            return
+        success, _ = self.bd.execute_query(OLVIDAR_CLAVES, (datetime.now() - timedelta(days=DIAS_CLAVES),))
+        self._claves_olvidadas = success
+
+    def _avisar(self, aplicadas, en_linea):
+        self.en_linea = en_linea
+        if self.al_sincronizar:
+            self.al_sincronizar(aplicadas, en_linea)
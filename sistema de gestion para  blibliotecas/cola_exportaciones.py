@@ -0,0 +1,274 @@
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import consultas
+from base_datos import DatabaseConnection
+from exportaciones import exportar_a_excel, exportar_a_pdf, exportar_a_csv
+from metricas import METRICAS
+from tareas import INTERVALO_SONDEO
+
+# Exportador y extensión de cada formato
+FORMATOS = {
+    "excel": (exportar_a_excel, ".xlsx"),
+    "pdf": (exportar_a_pdf, ".pdf"),
+    "csv": (exportar_a_csv, ".csv"),
+}
+# Por tabla: consulta, consulta para contar (estimar el tiempo), encabezados y título del PDF
+EXPORTACIONES = {
+    "libros": (consultas.EXPORTAR_LIBROS, consultas.CONTAR_LIBROS,
+               ["ID", "Título", "Autor", "Género", "Año", "ISBN", "Disponible"],
+               "Listado de Libros"),
+    "usuarios": (consultas.EXPORTAR_USUARIOS, consultas.CONTAR_USUARIOS,
+                 ["ID", "Nombre", "Email", "Teléfono"],
+                 "Listado de Usuarios"),
+    "prestamos": (consultas.EXPORTAR_PRESTAMOS, consultas.CONTAR_PRESTAMOS,
+                  ["ID Préstamo", "Libro", "Usuario", "Fecha Préstamo", "Fecha Devolución", "Devuelto"],
+                  "Historial de Préstamos"),
+    "autores": (consultas.EXPORTAR_AUTORES, consultas.CONTAR_AUTORES,
+                ["ID", "Nombre", "Nacionalidad", "Fecha Nacimiento"],
+                "Listado de Autores"),
+}
+PROCESOS_EXPORTACION = max(1, min(4, (os.cpu_count() or 2) - 1))
+# Cada cuántas filas un proceso informa su avance y revisa si lo cancelaron
+FILAS_POR_AVISO = 2000
+
+# Estados de un trabajo
+EN_COLA = "En cola"
+EXPORTANDO = "Exportando"
+CANCELANDO = "Cancelando"
+LISTO = "Listo"
+CANCELADO = "Cancelado"
+ERROR = "Error"
+
+
+class ExportacionCancelada(Exception):
+    pass
+
+
+def _con_avance(filas, id_trabajo, avisos, cancelados):
+    """Deja pasar las filas informando el avance y cortando si se cancela el trabajo"""
+    n = 0
+    for n, fila in enumerate(filas, start=1):
+        if n % FILAS_POR_AVISO == 0:
+            if id_trabajo in cancelados:
+                raise ExportacionCancelada()
+            avisos.put((id_trabajo, n, None))
+        yield fila
+    avisos.put((id_trabajo, n, None))
+
+
+def _exportar(id_trabajo, config, query, consulta_total, formato, nombre_archivo, encabezados, titulo,
+              avisos, cancelados):
+    """Corre en un proceso del pool con su propia conexión; devuelve (estado, mensaje)"""
+    bd = DatabaseConnection(tamano_pool=1, **config)
+    if not bd.connect():
+        return ERROR, "Error conectando a la base de datos"
+    try:
+        # El total solo sirve para estimar el tiempo restante
+        success, result = bd.execute_query(consulta_total)
+        avisos.put((id_trabajo, 0, result[0][0] if success and result else None))
+
+        exportador, _ = FORMATOS[formato]
+        filas = _con_avance(bd.iterar_consulta(query), id_trabajo, avisos, cancelados)
+        if formato == "pdf":
+            # Este proceso ya es uno de los del pool: el PDF se genera aquí mismo
+            exito, mensaje = exportador(filas, nombre_archivo, encabezados, titulo, procesos=1)
+        else:
+            exito, mensaje = exportador(filas, nombre_archivo, encabezados)
+
+        if id_trabajo in cancelados:
+            # El exportador convierte la cancelación en un error; se borra el archivo a medias
+            if os.path.exists(nombre_archivo):
+                os.remove(nombre_archivo)
+            return CANCELADO, "Exportación cancelada"
+        return (LISTO if exito else ERROR), mensaje
+    finally:
+        bd.disconnect()
+
+
+class TrabajoExportacion:
+    """Estado de una exportación tal como se muestra en la interfaz"""
+
+    def __init__(self, id_trabajo, descripcion, nombre_archivo, al_terminar=None, nombre=None):
+        self.id = id_trabajo
+        self.descripcion = descripcion
+        # Nombre con que aparece su duración en las métricas
+        self.nombre = nombre or descripcion
+        self.nombre_archivo = nombre_archivo
+        self.al_terminar = al_terminar
+        self.estado = EN_COLA
+        self.mensaje = ""
+        self.filas = 0
+        self.total = None
+        self.inicio = None
+        self.fin = None
+        self.futuro = None
+
+    @property
+    def terminado(self):
+        return self.estado in (LISTO, CANCELADO, ERROR)
+
+    @property
+    def filas_por_segundo(self):
+        if self.inicio is None:
+            return None
+        segundos = (self.fin or time.monotonic()) - self.inicio
+        return self.filas / segundos if segundos > 0 else None
+
+    @property
+    def segundos_restantes(self):
+        """Estimación a partir de la velocidad promedio; None si no se puede calcular"""
+        velocidad = self.filas_por_segundo
+        if self.terminado or not self.total or not velocidad:
+            return None
+        return max(0, self.total - self.filas) / velocidad
+
+
+# COLA DE EXPORTACIONES
+class ColaExportaciones:
+    """Ejecuta exportaciones en procesos aparte e informa su avance en el hilo de Tk
+
+    Cada proceso abre su propia conexión con config y recorre la consulta
+    sin cargarla en memoria. al_cambiar(trabajo) se llama en el hilo de Tk
+    cada vez que un trabajo avanza o cambia de estado.
+    """
+
+    def __init__(self, root, config, procesos=PROCESOS_EXPORTACION, al_cambiar=None):
+        self.root = root
+        self.config = dict(config)
+        self.procesos = procesos
+        self.al_cambiar = al_cambiar
+        self.trabajos = {}
+        self._siguiente_id = 1
+        self._contexto = multiprocessing.get_context("spawn")
+        self._manager = None
+        self._pool = None
+        self._terminados = queue.Queue()
+        self._cerrado = False
+        self.root.after(INTERVALO_SONDEO, self._sondear)
+
+    @property
+    def activos(self):
+        return sum(1 for trabajo in self.trabajos.values() if not trabajo.terminado)
+
+    def _iniciar(self):
+        # Los procesos se crean con la primera exportación, no al abrir la aplicación
+        if self._pool is None:
+            self._manager = self._contexto.Manager()
+            self._avisos = self._manager.Queue()
+            self._cancelados = self._manager.dict()
+            self._pool = ProcessPoolExecutor(max_workers=self.procesos, mp_context=self._contexto)
+
+    def encolar(self, descripcion, query, consulta_total, formato, nombre_archivo, encabezados,
+                titulo=None, al_terminar=None, nombre=None):
+        """Agrega una exportación a la cola; al_terminar(trabajo) se llama al finalizar"""
+        if self._cerrado:
+            return None
+        self._iniciar()
+        trabajo = TrabajoExportacion(self._siguiente_id, descripcion, nombre_archivo, al_terminar, nombre)
+        self._siguiente_id += 1
+        self.trabajos[trabajo.id] = trabajo
+
+        trabajo.futuro = self._pool.submit(
+            _exportar, trabajo.id, self.config, query, consulta_total, formato, nombre_archivo,
+            encabezados, titulo, self._avisos, self._cancelados)
+        trabajo.futuro.add_done_callback(lambda f, t=trabajo: self._terminados.put(t))
+        self._notificar(trabajo)
+        return trabajo
+
+    def cancelar(self, id_trabajo):
+        """Cancela un trabajo: si no empezó se quita de la cola, si no se le pide que pare"""
+        trabajo = self.trabajos.get(id_trabajo)
+        if trabajo is None or trabajo.terminado or trabajo.estado == CANCELANDO:
+            return
+        if trabajo.futuro.cancel():
+            # El aviso de terminado llega por el callback del futuro
+            return
+        self._cancelados[trabajo.id] = True
+        trabajo.estado = CANCELANDO
+        self._notificar(trabajo)
+
+    def cancelar_todo(self):
+        for id_trabajo in list(self.trabajos):
+            self.cancelar(id_trabajo)
+
+    def quitar_terminados(self):
+        """Olvida los trabajos terminados; devuelve sus ids"""
+        terminados = [id_trabajo for id_trabajo, trabajo in self.trabajos.items() if trabajo.terminado]
+        for id_trabajo in terminados:
+            del self.trabajos[id_trabajo]
+        return terminados
+
+    def cerrar(self):
+        self._cerrado = True
+        if self._pool is None:
+            return
+        for trabajo in self.trabajos.values():
+            if not trabajo.terminado:
+                self._cancelados[trabajo.id] = True
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._manager.shutdown()
+
+    def _notificar(self, trabajo):
+        if self.al_cambiar:
+            self.al_cambiar(trabajo)
+
+    def _sondear(self):
+        if self._cerrado:
+            return
+        self.root.after(INTERVALO_SONDEO, self._sondear)
+        if self._pool is None:
+            return
+
+        # Primero el avance: un proceso informa sus últimas filas antes de terminar
+        cambiados = {}
+        while True:
+            try:
+                id_trabajo, filas, total = self._avisos.get_nowait()
+            except queue.Empty:
+                break
+            trabajo = self.trabajos.get(id_trabajo)
+            if trabajo is None or trabajo.terminado:
+                continue
+            if trabajo.inicio is None:
+                trabajo.inicio = time.monotonic()
+            if trabajo.estado == EN_COLA:
+                trabajo.estado = EXPORTANDO
+            trabajo.filas = filas
+            if total is not None:
+                trabajo.total = total
+            cambiados[id_trabajo] = trabajo
+
+        while True:
+            try:
+                trabajo = self._terminados.get_nowait()
+            except queue.Empty:
+                break
+            self._finalizar(trabajo)
+            cambiados[trabajo.id] = trabajo
+
+        for trabajo in cambiados.values():
+            try:
+                self._notificar(trabajo)
+                if trabajo.terminado and trabajo.al_terminar:
+                    trabajo.al_terminar(trabajo)
+            except Exception as error:
+                self.root.report_callback_exception(type(error), error, error.__traceback__)
+
+    def _finalizar(self, trabajo):
+        trabajo.fin = time.monotonic()
+        futuro = trabajo.futuro
+        if futuro.cancelled():
+            trabajo.estado, trabajo.mensaje = CANCELADO, "Exportación cancelada"
+        elif futuro.exception() is not None:
+            trabajo.estado, trabajo.mensaje = ERROR, f"Error al exportar: {futuro.exception()}"
+        else:
+            trabajo.estado, trabajo.mensaje = futuro.result()
+        if trabajo.estado == LISTO and trabajo.inicio is not None:
+            # Desde que el proceso empezó a exportar (sin la espera en la cola)
+            METRICAS.registrar_interfaz("exportacion", trabajo.nombre, trabajo.fin - trabajo.inicio, trabajo.filas)
+        if trabajo.id in self._cancelados:
+            del self._cancelados[trabajo.id]
@@ -0,0 +1,175 @@
+import threading
+from functools import lru_cache
+
+# Tipos de sentencia
+LECTURA = "lectura"
+PROCEDIMIENTO = "procedimiento"
+ESCRITURA = "escritura"
+
+_lock = threading.Lock()
+
+
+class Consulta(str):
+    """Texto SQL declarado una vez con su nombre y tipo
+
+    Es un str, así que sirve en cualquier lugar donde se usaba el texto
+    (execute_query, la caché, los procesos de exportación). Las lecturas
+    se ejecutan como sentencias preparadas en el servidor, reutilizadas
+    en cada conexión. Acumula el tiempo de sus ejecuciones.
+    """
+
+    def __new__(cls, nombre, sql, tipo, preparada=None):
+        consulta = super().__new__(cls, sql)
+        consulta.nombre = nombre
+        consulta.tipo = tipo
+        consulta.preparada = (tipo == LECTURA) if preparada is None else preparada
+        consulta.llamadas = 0
+        consulta.segundos = 0.0
+        consulta.maximo = 0.0
+        return consulta
+
+    def __reduce__(self):
+        # Viaja a otros procesos sin sus estadísticas
+        return Consulta, (self.nombre, str(self), self.tipo, self.preparada)
+
+    def registrar_tiempo(self, segundos):
+        with _lock:
+            self.llamadas += 1
+            self.segundos += segundos
+            if segundos > self.maximo:
+                self.maximo = segundos
+
+
+CONSULTAS = {}
+
+
+def registrar(nombre, sql, tipo, preparada=None):
+    if nombre in CONSULTAS:
+        raise ValueError(f"La consulta {nombre} ya está registrada")
+    consulta = CONSULTAS[nombre] = Consulta(nombre, sql, tipo, preparada)
+    return consulta
+
+
+@lru_cache(maxsize=1024)
+def _tipo_texto(query):
+    inicio = query.lstrip()[:6].upper()
+    if inicio == "SELECT":
+        return LECTURA
+    if inicio.startswith("CALL"):
+        return PROCEDIMIENTO
+    return ESCRITURA
+
+
+def tipo_consulta(query):
+    """Tipo de una Consulta registrada, o deducido del texto (una vez por texto)"""
+    tipo = getattr(query, "tipo", None)
+    return tipo if tipo is not None else _tipo_texto(query)
+
+
+def estadisticas():
+    """[(nombre, llamadas, ms promedio, ms máximo)] de las consultas registradas, las más costosas primero"""
+    with _lock:
+        filas = [(c.nombre, c.llamadas, c.segundos * 1000 / c.llamadas if c.llamadas else 0.0, c.maximo * 1000)
+                 for c in CONSULTAS.values()]
+    return sorted(filas, key=lambda fila: fila[1] * fila[2], reverse=True)
+
+
+# LIBROS
+LIBRO_POR_ID = registrar(
+    "libro_por_id",
+    "SELECT id, titulo, autor, genero, año_publicacion, isbn, portada FROM libros WHERE id = %s",
+    LECTURA)
+INSERTAR_LIBRO = registrar("insertar_libro", "CALL sp_InsertarLibro(%s, %s, %s, %s, %s, %s)", PROCEDIMIENTO)
+ELIMINAR_LIBRO = registrar("eliminar_libro", "CALL sp_EliminarLibro(%s)", PROCEDIMIENTO)
+
+# USUARIOS
+INSERTAR_USUARIO = registrar("insertar_usuario", "CALL sp_InsertarUsuario(%s, %s, %s, %s)", PROCEDIMIENTO)
+
+# PRÉSTAMOS
+REALIZAR_PRESTAMO = registrar("realizar_prestamo", "CALL sp_RealizarPrestamo(%s, %s)", PROCEDIMIENTO)
+DEVOLVER_LIBRO = registrar("devolver_libro", "CALL sp_DevolverLibro(%s)", PROCEDIMIENTO)
+
+# AUTORES
+INSERTAR_AUTOR = registrar("insertar_autor", "CALL sp_InsertarAutor(%s, %s, %s)", PROCEDIMIENTO)
+ELIMINAR_AUTOR = registrar("eliminar_autor", "CALL sp_EliminarAutor(%s)", PROCEDIMIENTO)
+
+# ESTADÍSTICAS (solo leen las tablas de resumen, nunca el historial de préstamos)
+# Tablas que actualizan sp_RealizarPrestamo y sp_DevolverLibro
+TABLAS_RESUMEN = ("resumen_prestamos_libro", "resumen_prestamos_genero", "resumen_usuarios",
+                  "resumen_circulacion_diaria")
+LIBROS_MAS_PRESTADOS = registrar(
+    "libros_mas_prestados",
+    """SELECT l.titulo, r.prestamos
+       FROM resumen_prestamos_libro r
+       JOIN libros l ON r.libro_id = l.id
+       WHERE r.mes = %s
+       ORDER BY r.prestamos DESC, l.titulo LIMIT %s""",
+    LECTURA)
+PRESTAMOS_POR_GENERO = registrar(
+    "prestamos_por_genero",
+    """SELECT genero, prestamos FROM resumen_prestamos_genero
+       WHERE mes = %s ORDER BY prestamos DESC, genero LIMIT %s""",
+    LECTURA)
+USUARIOS_CON_PRESTAMOS = registrar(
+    "usuarios_con_prestamos",
+    """SELECT u.nombre, r.prestamos_activos, r.prestamos_total
+       FROM resumen_usuarios r
+       JOIN usuarios u ON r.usuario_id = u.id
+       WHERE r.prestamos_activos > 0
+       ORDER BY r.prestamos_activos DESC, u.nombre LIMIT %s""",
+    LECTURA)
+TOTAL_PRESTAMOS_ACTIVOS = registrar(
+    "total_prestamos_activos",
+    "SELECT COALESCE(SUM(prestamos_activos), 0), COUNT(*) FROM resumen_usuarios WHERE prestamos_activos > 0",
+    LECTURA)
+CIRCULACION_DIARIA = registrar(
+    "circulacion_diaria",
+    """SELECT fecha, prestamos, devoluciones FROM resumen_circulacion_diaria
+       WHERE fecha >= %s AND fecha < %s ORDER BY fecha""",
+    LECTURA)
+
+# LISTAS DE LAS PESTAÑAS (argumentos de ConsultaPaginada). Libros y
+# usuarios traen también la portada/foto, que no se muestra como columna.
+LISTAS = {
+    "libros": dict(
+        select="SELECT id, titulo, autor, genero, año_publicacion, portada", desde="FROM libros",
+        claves=("titulo", "id"), indices_clave=(1, 0)),
+    "usuarios": dict(
+        select="SELECT id, nombre, email, telefono, foto", desde="FROM usuarios",
+        claves=("nombre", "id"), indices_clave=(1, 0)),
+    "prestamos": dict(
+        select="""SELECT p.id, l.titulo, u.nombre, p.fecha_prestamo,
+                  CASE WHEN p.devuelto THEN 'Sí' ELSE 'No' END""",
+        desde="""FROM prestamos p
+                 JOIN libros l ON p.libro_id = l.id
+                 JOIN usuarios u ON p.usuario_id = u.id""",
+        claves=("p.fecha_prestamo", "p.id"), indices_clave=(3, 0), descendente=True, columna_id="p.id"),
+    "autores": dict(
+        select="SELECT id, nombre, nacionalidad, fecha_nacimiento", desde="FROM autores",
+        claves=("nombre", "id"), indices_clave=(1, 0)),
+}
+
+# EXPORTACIONES (se recorren con iterar_consulta; los conteos estiman el tiempo restante)
+EXPORTAR_LIBROS = registrar(
+    "exportar_libros",
+    "SELECT id, titulo, autor, genero, año_publicacion, isbn, disponible FROM libros ORDER BY titulo",
+    LECTURA, preparada=False)
+EXPORTAR_USUARIOS = registrar(
+    "exportar_usuarios", "SELECT id, nombre, email, telefono FROM usuarios ORDER BY nombre",
+    LECTURA, preparada=False)
+EXPORTAR_PRESTAMOS = registrar(
+    "exportar_prestamos",
+    """SELECT p.id, l.titulo, u.nombre, p.fecha_prestamo, p.fecha_devolucion,
+               CASE WHEN p.devuelto THEN 'Sí' ELSE 'No' END
+               FROM prestamos p
+               JOIN libros l ON p.libro_id = l.id
+               JOIN usuarios u ON p.usuario_id = u.id
+               ORDER BY p.fecha_prestamo DESC""",
+    LECTURA, preparada=False)
+EXPORTAR_AUTORES = registrar(
+    "exportar_autores", "SELECT id, nombre, nacionalidad, fecha_nacimiento FROM autores ORDER BY nombre",
+    LECTURA, preparada=False)
+CONTAR_LIBROS = registrar("contar_libros", "SELECT COUNT(*) FROM libros", LECTURA)
+CONTAR_USUARIOS = registrar("contar_usuarios", "SELECT COUNT(*) FROM usuarios", LECTURA)
+CONTAR_PRESTAMOS = registrar("contar_prestamos", "SELECT COUNT(*) FROM prestamos", LECTURA)
+CONTAR_AUTORES = registrar("contar_autores", "SELECT COUNT(*) FROM autores", LECTURA)
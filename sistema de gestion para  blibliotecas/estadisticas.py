@@ -0,0 +1,131 @@
+"""Estadísticas de circulación a partir de las tablas de resumen
+
+sp_RealizarPrestamo y sp_DevolverLibro (y sus equivalentes de
+motor_sqlite) suman cada préstamo y devolución a las tablas resumen_*,
+que tienen una fila por libro y mes, por género y mes, por usuario y por
+día. La pestaña Estadísticas solo lee esas tablas: el tiempo de
+respuesta no depende del tamaño del historial de préstamos.
+"""
+from datetime import date
+
+import mysql.connector
+
+import consultas
+from prestamos_lote import en_transaccion
+
+# Filas de cada ranking de la pestaña
+LIMITE_RANKING = 10
+# Con qué nombre se resumen los libros sin género (igual que en los procedimientos)
+SIN_GENERO = "Sin género"
+
+# RECÁLCULO (mismo SQL en MySQL y en SQLite)
+RECALCULAR_LIBROS_MES = """INSERT INTO resumen_prestamos_libro (mes, libro_id, prestamos)
+    SELECT %s, libro_id, COUNT(*) FROM prestamos
+    WHERE fecha_prestamo >= %s AND fecha_prestamo < %s GROUP BY libro_id"""
+RECALCULAR_GENEROS_MES = """INSERT INTO resumen_prestamos_genero (mes, genero, prestamos)
+    SELECT %s, COALESCE(NULLIF(l.genero, ''), %s), COUNT(*)
+    FROM prestamos p JOIN libros l ON p.libro_id = l.id
+    WHERE p.fecha_prestamo >= %s AND p.fecha_prestamo < %s GROUP BY 2"""
+RECALCULAR_USUARIOS = """INSERT INTO resumen_usuarios (usuario_id, prestamos_activos, prestamos_total)
+    SELECT usuario_id, SUM(CASE WHEN devuelto THEN 0 ELSE 1 END), COUNT(*)
+    FROM prestamos WHERE usuario_id IS NOT NULL GROUP BY usuario_id"""
+RECALCULAR_DIARIA = """INSERT INTO resumen_circulacion_diaria (fecha, prestamos, devoluciones)
+    SELECT fecha, SUM(prestamos), SUM(devoluciones) FROM (
+        SELECT fecha_prestamo AS fecha, 1 AS prestamos, 0 AS devoluciones FROM prestamos
+        UNION ALL
+        SELECT fecha_devolucion, 0, 1 FROM prestamos WHERE devuelto = TRUE AND fecha_devolucion IS NOT NULL
+    ) movimientos WHERE fecha IS NOT NULL GROUP BY fecha"""
+
+
+def _fecha(valor):
+    """Las fechas calculadas (MIN, MAX) llegan como texto desde SQLite"""
+    return date.fromisoformat(valor[:10]) if isinstance(valor, str) else valor
+
+
+def mes_siguiente(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def leer_mes(mes):
+    """Primer día del mes a partir de una date o un texto AAAA-MM; None si no es válido"""
+    if isinstance(mes, date):
+        return mes.replace(day=1)
+    try:
+        return date.fromisoformat(f"{str(mes).strip()[:7]}-01")
+    except ValueError:
+        return None
+
+
+def resumen(bd, mes=None, limite=LIMITE_RANKING):
+    """Datos de la pestaña Estadísticas para un mes (por defecto, el actual): (success, dict)
+
+    El dict trae los totales del mes y de préstamos activos, los libros
+    más prestados y los préstamos por género del mes, los usuarios con más
+    préstamos activos y la circulación de cada día del mes.
+    """
+    mes = leer_mes(mes or date.today())
+    if mes is None:
+        return False, "El mes debe tener el formato AAAA-MM"
+
+    consultas_resumen = (
+        (consultas.LIBROS_MAS_PRESTADOS, (mes, limite)),
+        (consultas.PRESTAMOS_POR_GENERO, (mes, limite)),
+        (consultas.USUARIOS_CON_PRESTAMOS, (limite,)),
+        (consultas.TOTAL_PRESTAMOS_ACTIVOS, None),
+        (consultas.CIRCULACION_DIARIA, (mes, mes_siguiente(mes))),
+    )
+    resultados = []
+    for query, parametros in consultas_resumen:
+        success, filas = bd.execute_query(query, parametros)
+        if not success:
+            return False, filas
+        resultados.append(filas)
+    libros, generos, usuarios, ((activos, usuarios_activos),), diario = resultados
+
+    return True, {
+        "mes": mes,
+        "prestamos_mes": sum(fila[1] for fila in diario),
+        "devoluciones_mes": sum(fila[2] for fila in diario),
+        "prestamos_activos": int(activos),
+        "usuarios_con_prestamos": usuarios_activos,
+        "libros": libros,
+        "generos": generos,
+        "usuarios": usuarios,
+        "diario": [(_fecha(fecha), prestamos, devoluciones) for fecha, prestamos, devoluciones in diario],
+    }
+
+
+def recalcular(cursor):
+    """Vuelve a llenar las tablas de resumen desde el historial de préstamos
+
+    Recibe un cursor para poder correr dentro de la migración que crea las
+    tablas. Los préstamos se agrupan un mes por vez (rango sobre
+    idx_prestamos_fecha) en lugar de ordenar todo el historial de una vez.
+    """
+    for tabla in consultas.TABLAS_RESUMEN:
+        cursor.execute(f"DELETE FROM {tabla}")
+    cursor.execute("SELECT MIN(fecha_prestamo), MAX(fecha_prestamo) FROM prestamos")
+    primero, ultimo = (_fecha(valor) for valor in cursor.fetchall()[0])
+    if primero is not None:
+        mes = primero.replace(day=1)
+        while mes <= ultimo:
+            siguiente = mes_siguiente(mes)
+            cursor.execute(RECALCULAR_LIBROS_MES, (mes, mes, siguiente))
+            cursor.execute(RECALCULAR_GENEROS_MES, (mes, SIN_GENERO, mes, siguiente))
+            mes = siguiente
+    cursor.execute(RECALCULAR_USUARIOS)
+    cursor.execute(RECALCULAR_DIARIA)
+
+
+def reconstruir(bd):
+    """Recalcula las tablas de resumen en una transacción; devuelve (success, mensaje)
+
+    Para cuando los préstamos se cargaron por fuera de los procedimientos
+    (p. ej. restaurando un respaldo) o se borraron libros con historial.
+    """
+    try:
+        en_transaccion(bd, recalcular)
+    except mysql.connector.Error as error:
+        return False, f"No se pudieron recalcular las estadísticas: {error}"
+    bd.invalidar(*consultas.TABLAS_RESUMEN)
+    return True, "Estadísticas recalculadas"
@@ -0,0 +1,225 @@
+"""Prueba de estrés de los préstamos: varios mostradores prestan y devuelven los mismos libros a la vez
+
+Uso:
+    python estres_prestamos.py
+    python estres_prestamos.py --mostradores 1,2,4,8,16 --operaciones 300
+    python estres_prestamos.py --motor mysql --base biblioteca_benchmark --escalado-minimo 2
+
+Cada mostrador es un hilo con su propia conexión (como un equipo aparte)
+que presta libros sueltos y por lote y devuelve los suyos, sobre pocos
+libros para que choquen seguido. Después de cada ronda se verifica que
+ningún libro tenga dos préstamos activos, que libros.disponible coincida
+con los préstamos, que cada préstamo informado exista (y ninguno más) y
+que los resúmenes de usuarios cuadren. Sale con código 1 si algo no se
+cumple, o si se pide --escalado-minimo y las operaciones por segundo con
+más mostradores no crecen lo suficiente.
+
+Con SQLite las escrituras se hacen de a una (bloqueo de la base entera):
+sirve para verificar que no hay préstamos dobles, no para medir el
+escalado. El escalado se mide contra un servidor MySQL.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import benchmark
+import estadisticas
+import reservas
+import servicio
+from base_datos import DatabaseConnection
+from metricas import METRICAS
+
+# Libros que se disputan los mostradores: pocos, para forzar conflictos
+LIBROS = 100
+MOSTRADORES = "1,2,4,8"
+# Operaciones de cada mostrador por ronda
+OPERACIONES = 200
+# Libros de cada préstamo o devolución por lote
+LIBROS_POR_LOTE = 3
+# Proporción de operaciones por lote y de devoluciones (el resto son préstamos sueltos)
+PROPORCION_LOTE = 0.1
+PROPORCION_DEVOLUCION = 0.4
+# Respuestas esperables cuando otro mostrador se llevó el libro
+ESPERADAS = ("no está disponible", "ocupado en otro mostrador")
+
+VERIFICACIONES = (
+    ("Libros con más de un préstamo activo", """SELECT COUNT(*) FROM (
+        SELECT libro_id FROM prestamos WHERE devuelto = FALSE GROUP BY libro_id HAVING COUNT(*) > 1) dobles"""),
+    ("Libros cuyo campo disponible no coincide con sus préstamos", """SELECT COUNT(*) FROM libros l
+        WHERE CASE WHEN l.disponible THEN 1 ELSE 0 END
+              = (SELECT COUNT(*) FROM prestamos p WHERE p.libro_id = l.id AND p.devuelto = FALSE)"""),
+    ("Usuarios cuyo resumen de préstamos activos no coincide", """SELECT COUNT(*) FROM usuarios u
+        WHERE COALESCE((SELECT prestamos_activos FROM resumen_usuarios r WHERE r.usuario_id = u.id), 0)
+              <> (SELECT COUNT(*) FROM prestamos p WHERE p.usuario_id = u.id AND p.devuelto = FALSE)"""),
+)
+
+
+def preparar_ronda(bd):
+    """Todos los libros disponibles, sin préstamos ni resúmenes"""
+    bd.execute_query("DELETE FROM prestamos")
+    bd.execute_query("UPDATE libros SET disponible = TRUE")
+    ok, mensaje = estadisticas.reconstruir(bd)
+    if not ok:
+        raise RuntimeError(mensaje)
+
+
+class Mostrador(threading.Thread):
+    """Un puesto de préstamos: su propia conexión y su propia lista de libros prestados"""
+
+    def __init__(self, numero, config, libros, usuarios, operaciones, barrera, semilla):
+        super().__init__(name=f"mostrador-{numero}", daemon=True)
+        self.bd = DatabaseConnection(tamano_pool=1, **config)
+        self.libros = libros
+        self.usuarios = usuarios
+        self.operaciones = operaciones
+        self.barrera = barrera
+        self.azar = random.Random(semilla)
+        self.prestados = []
+        self.prestamos = 0
+        self.devoluciones = 0
+        self.errores = []
+
+    def _prestar(self, libro_ids):
+        usuario_id = self.azar.randint(1, self.usuarios)
+        if len(libro_ids) == 1:
+            ok, mensaje = servicio.realizar_prestamo(self.bd, libro_ids[0], usuario_id)
+            resultados = [(libro_ids[0], ok, mensaje, None)]
+        else:
+            ok, resultados = servicio.prestar_lote(self.bd, usuario_id, libro_ids)
+            if not ok:
+                self.errores.append(resultados)
+                return
+        for libro_id, ok, mensaje, _ in resultados:
+            if ok:
+                self.prestamos += 1
+                self.prestados.append(libro_id)
+            elif not reservas.es_conflicto(mensaje) and not any(texto in mensaje for texto in ESPERADAS):
+                self.errores.append(mensaje)
+
+    def _devolver(self):
+        cantidad = min(len(self.prestados), self.azar.randint(1, LIBROS_POR_LOTE))
+        libro_ids = [self.prestados.pop(self.azar.randrange(len(self.prestados))) for _ in range(cantidad)]
+        ok, resultados = servicio.devolver_lote(self.bd, libro_ids)
+        if not ok:
+            self.errores.append(resultados)
+            return
+        for libro_id, ok, mensaje, _ in resultados:
+            if ok:
+                self.devoluciones += 1
+            else:
+                self.errores.append(mensaje)
+
+    def run(self):
+        self.bd.connect()
+        try:
+            self.barrera.wait()
+            for _ in range(self.operaciones):
+                sorteo = self.azar.random()
+                if self.prestados and sorteo < PROPORCION_DEVOLUCION:
+                    self._devolver()
+                elif sorteo < PROPORCION_DEVOLUCION + PROPORCION_LOTE:
+                    self._prestar(self.azar.sample(range(1, self.libros + 1), LIBROS_POR_LOTE))
+                else:
+                    self._prestar([self.azar.randint(1, self.libros)])
+        finally:
+            self.bd.disconnect()
+
+
+def ronda(bd, config, mostradores, libros, usuarios, operaciones, semilla):
+    """Corre los mostradores a la vez y verifica la base; devuelve un dict con el resultado"""
+    preparar_ronda(bd)
+    METRICAS.reiniciar()
+    barrera = threading.Barrier(mostradores + 1)
+    hilos = [Mostrador(n, config, libros, usuarios, operaciones, barrera, semilla * 1000 + n)
+             for n in range(mostradores)]
+    for hilo in hilos:
+        hilo.start()
+    barrera.wait()
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.join()
+    segundos = time.perf_counter() - inicio
+
+    prestamos = sum(hilo.prestamos for hilo in hilos)
+    devoluciones = sum(hilo.devoluciones for hilo in hilos)
+    fallas = [f"{hilo.name}: {error}" for hilo in hilos for error in hilo.errores]
+    ok, filas = bd.execute_query("SELECT COUNT(*), SUM(CASE WHEN devuelto THEN 1 ELSE 0 END) FROM prestamos")
+    registrados, devueltos = filas[0] if ok else (None, None)
+    if (registrados, devueltos or 0) != (prestamos, devoluciones):
+        fallas.append(f"Los mostradores informaron {prestamos} préstamos y {devoluciones} devoluciones; "
+                      f"la base tiene {registrados} y {devueltos}")
+    for descripcion, query in VERIFICACIONES:
+        ok, filas = bd.execute_query(query)
+        if not ok or filas[0][0]:
+            fallas.append(f"{descripcion}: {filas if not ok else filas[0][0]}")
+
+    reintentos = sum(r["llamadas"] for (tipo, _), r in METRICAS.resumen_interfaz() if tipo == "reintento")
+    return {"mostradores": mostradores, "operaciones": mostradores * operaciones, "segundos": segundos,
+            "prestamos": prestamos, "devoluciones": devoluciones, "reintentos": reintentos, "fallas": fallas}
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Prueba de estrés de préstamos concurrentes")
+    parser.add_argument("--motor", choices=("sqlite", "mysql"), default="sqlite")
+    parser.add_argument("--archivo", help="base SQLite (por defecto, una temporal)")
+    parser.add_argument("--base", default="biblioteca_benchmark", help="base MySQL de prueba")
+    parser.add_argument("--libros", type=int, default=LIBROS)
+    parser.add_argument("--mostradores", default=MOSTRADORES, help="cantidades de mostradores, separadas por comas")
+    parser.add_argument("--operaciones", type=int, default=OPERACIONES, help="operaciones de cada mostrador")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--escalado-minimo", type=float,
+                        help="operaciones por segundo con más mostradores / con el primero que se exige")
+    opciones = parser.parse_args(argumentos)
+
+    try:
+        cantidades = [int(parte) for parte in opciones.mostradores.split(",")]
+    except ValueError:
+        parser.error("--mostradores debe ser una lista de números, p. ej. 1,2,4,8")
+    if opciones.motor == "mysql":
+        if opciones.base == benchmark.BASE_PROTEGIDA:
+            parser.error(f"La prueba borra los datos: usa una base distinta de {benchmark.BASE_PROTEGIDA}")
+        config = {"motor": "mysql", "database": opciones.base}
+    else:
+        config = {"motor": "sqlite",
+                  "archivo": opciones.archivo or os.path.join(tempfile.mkdtemp(prefix="biblioteca_estres_"),
+                                                              "estres.db")}
+
+    bd = DatabaseConnection(notificar_error=print, migrar=True, **config)
+    if not bd.connect():
+        return 2
+    try:
+        usuarios = benchmark.generar_datos(bd, opciones.libros, opciones.semilla)["usuarios"]
+        resultados = [ronda(bd, config, mostradores, opciones.libros, usuarios, opciones.operaciones,
+                            opciones.semilla) for mostradores in cantidades]
+    finally:
+        bd.disconnect()
+
+    print(f"{'Mostradores':>11}{'operaciones':>13}{'ms':>10}{'por segundo':>13}{'escalado':>10}"
+          f"{'préstamos':>11}{'devoluciones':>14}{'reintentos':>12}")
+    base = resultados[0]["operaciones"] / resultados[0]["segundos"]
+    fallas = []
+    for r in resultados:
+        por_segundo = r["operaciones"] / r["segundos"]
+        r["escalado"] = por_segundo / base
+        print(f"{r['mostradores']:>11}{r['operaciones']:>13,}{r['segundos'] * 1000:>10.0f}{por_segundo:>13,.0f}"
+              f"{r['escalado']:>9.2f}x{r['prestamos']:>11,}{r['devoluciones']:>14,}{r['reintentos']:>12,}")
+        fallas += [f"{r['mostradores']} mostradores: {falla}" for falla in r["fallas"]]
+
+    for falla in fallas:
+        print(f"FALLA {falla}")
+    if opciones.escalado_minimo and resultados[-1]["escalado"] < opciones.escalado_minimo:
+        print(f"FALLA Con {resultados[-1]['mostradores']} mostradores el escalado es "
+              f"{resultados[-1]['escalado']:.2f}x (mínimo pedido {opciones.escalado_minimo:.2f}x)")
+        fallas.append("escalado")
+    if fallas:
+        return 1
+    print("Sin préstamos dobles: la base quedó consistente en todas las rondas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+import csv
+import os
+import shutil
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from importlib.util import find_spec
+from itertools import chain, islice
+
+from tabla_columnar import TablaColumnar
+
+# openpyxl, reportlab y pypdf tardan en cargarse: solo se busca si están
+# instalados y se importan con la primera exportación que los usa
+OPENPYXL_DISPONIBLE = find_spec("openpyxl") is not None
+REPORTLAB_DISPONIBLE = find_spec("reportlab") is not None
+# Opcional: une las secciones de PDF generadas en paralelo
+PYPDF_DISPONIBLE = find_spec("pypdf") is not None
+
+# Filas que se miran para calcular el ancho de las columnas de Excel
+FILAS_MUESTRA_ANCHO = 200
+ANCHO_MAXIMO_COLUMNA = 60
+
+# Reportes PDF: cada tabla ocupa exactamente una página (la primera lleva el título)
+FILAS_POR_PAGINA = 40
+FILAS_PRIMERA_PAGINA = 34
+MARGEN_PDF = 50
+# Páginas que genera cada proceso antes de unir el documento
+PAGINAS_POR_SECCION = 50
+PROCESOS_PDF = max(1, (os.cpu_count() or 2) - 1)
+
+
+def _ancho_columnas(encabezados, muestra):
+    """Ancho de cada columna según el encabezado y una muestra de filas"""
+    anchos = [len(str(encabezado)) for encabezado in encabezados]
+    for fila in muestra:
+        for n, valor in enumerate(fila):
+            if valor is not None and n < len(anchos):
+                anchos[n] = max(anchos[n], len(str(valor)))
+    return [min(ancho + 2, ANCHO_MAXIMO_COLUMNA) for ancho in anchos]
+
+
+def exportar_a_excel(filas, nombre_archivo, encabezados):
+    """Exporta filas a Excel con openpyxl en modo solo escritura
+
+    filas puede ser cualquier iterable (p. ej. DatabaseConnection.iterar_consulta):
+    se escribe a medida que se recorre, así la memoria no crece con la
+    cantidad de filas. Los valores se guardan con su tipo (números, fechas).
+    """
+    if not OPENPYXL_DISPONIBLE:
+        return False, "Instala 'openpyxl': pip install openpyxl"
+
+    try:
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font, PatternFill, Alignment
+        from openpyxl.utils import get_column_letter
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title=os.path.splitext(os.path.basename(nombre_archivo))[0][:31])
+
+        # Los anchos deben fijarse antes de escribir la primera fila
+        filas = iter(filas)
+        muestra = list(islice(filas, FILAS_MUESTRA_ANCHO))
+        for col_num, ancho in enumerate(_ancho_columnas(encabezados, muestra), start=1):
+            ws.column_dimensions[get_column_letter(col_num)].width = ancho
+
+        # Agregar encabezados
+        fila_encabezados = []
+        for encabezado in encabezados:
+            cell = WriteOnlyCell(ws, value=encabezado)
+            cell.font = Font(bold=True)
+            cell.fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
+            cell.alignment = Alignment(horizontal="center")
+            fila_encabezados.append(cell)
+        ws.append(fila_encabezados)
+
+        # Agregar datos
+        for fila in chain(muestra, filas):
+            ws.append(fila)
+
+        wb.save(nombre_archivo)
+        return True, f"Datos exportados a {nombre_archivo}"
+    except Exception as e:
+        return False, f"Error al exportar a Excel: {e}"
+
+
+def exportar_a_csv(filas, nombre_archivo, encabezados):
+    """Exporta filas a CSV; UTF-8 con BOM para que Excel muestre bien los acentos"""
+    try:
+        with open(nombre_archivo, "w", newline="", encoding="utf-8-sig") as archivo:
+            escritor = csv.writer(archivo)
+            escritor.writerow(encabezados)
+            escritor.writerows(filas)
+        return True, f"Datos exportados a {nombre_archivo}"
+    except Exception as e:
+        return False, f"Error al exportar a CSV: {e}"
+
+
+def _paginar(filas):
+    """Agrupa las filas en listas del tamaño de una página"""
+    filas = iter(filas)
+    pagina = list(islice(filas, FILAS_PRIMERA_PAGINA))
+    while pagina:
+        yield pagina
+        pagina = list(islice(filas, FILAS_POR_PAGINA))
+
+
+def _seccionar(paginas):
+    """Agrupa las páginas en secciones de PAGINAS_POR_SECCION"""
+    seccion = list(islice(paginas, PAGINAS_POR_SECCION))
+    while seccion:
+        yield seccion
+        seccion = list(islice(paginas, PAGINAS_POR_SECCION))
+
+
+class PaginasColumnares:
+    """Las páginas de una sección guardadas por columnas, para enviarlas a otro proceso
+
+    Se recorre igual que la lista de páginas (cada página, una lista de
+    tuplas), pero se serializa como unos pocos arreglos en lugar de una
+    tupla y un objeto por valor.
+    """
+    __slots__ = ("tabla", "largos")
+
+    def __init__(self, paginas):
+        self.largos = array("i", (len(filas) for filas in paginas))
+        self.tabla = TablaColumnar(fila for filas in paginas for fila in filas)
+
+    def __len__(self):
+        return len(self.largos)
+
+    def __iter__(self):
+        desde = 0
+        for largo in self.largos:
+            yield self.tabla.tuplas(desde, desde + largo)
+            desde += largo
+
+
+def _anchos_pdf(encabezados, muestra):
+    """Ancho en puntos de cada columna, repartiendo el ancho útil de la hoja"""
+    from reportlab.lib.pagesizes import A4
+
+    pesos = [min(ancho, 40) for ancho in _ancho_columnas(encabezados, muestra)]
+    disponible = A4[0] - 2 * MARGEN_PDF
+    return [disponible * peso / sum(pesos) for peso in pesos]
+
+
+def _texto_celda(valor, ancho):
+    """Texto de la celda recortado para que no se salga de la columna"""
+    if valor is None:
+        return ""
+    texto = str(valor)
+    maximo = max(3, int(ancho / 4.4))
+    return texto if len(texto) <= maximo else texto[:maximo - 1] + "…"
+
+
+def _renderizar_seccion(nombre_archivo, encabezados, anchos, paginas, titulo_tabla=None,
+                        primera_pagina=1, con_total=False, total_previo=0):
+    """Escribe un PDF con las páginas dadas; también se ejecuta en procesos hijos
+
+    primera_pagina es el número que lleva la primera hoja dentro del reporte
+    completo. Con con_total se agrega al final el total de registros
+    (total_previo más las filas de esta sección).
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+
+    doc = SimpleDocTemplate(nombre_archivo, pagesize=A4, leftMargin=MARGEN_PDF, rightMargin=MARGEN_PDF)
+    styles = getSampleStyleSheet()
+    elements = []
+
+    # Estilo de título
+    if titulo_tabla:
+        title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=18,
+            spaceAfter=30,
+            alignment=1,
+        )
+        elements.append(Paragraph(titulo_tabla, title_style))
+        elements.append(Spacer(1, 12))
+
+    # Estilo de la tabla (el mismo objeto para todas las páginas)
+    estilo = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ('TOPPADDING', (0, 1), (-1, -1), 2),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 2),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+
+    # Una tabla por página, con los encabezados repetidos en cada una
+    total = total_previo
+    for n, filas in enumerate(paginas):
+        if n:
+            elements.append(PageBreak())
+        datos = [encabezados] + [[_texto_celda(valor, ancho) for valor, ancho in zip(fila, anchos)]
+                                 for fila in filas]
+        table = Table(datos, colWidths=anchos, repeatRows=1)
+        table.setStyle(estilo)
+        elements.append(table)
+        total += len(filas)
+
+    if con_total:
+        elements.append(Spacer(1, 12))
+        elements.append(Paragraph(f"Total de registros: {total}", styles['Heading3']))
+
+    def numerar_pagina(canvas, doc):
+        canvas.saveState()
+        canvas.setFont('Helvetica', 8)
+        canvas.drawRightString(A4[0] - doc.rightMargin, doc.bottomMargin / 2,
+                               f"Página {primera_pagina + canvas.getPageNumber() - 1}")
+        canvas.restoreState()
+
+    doc.build(elements, onFirstPage=numerar_pagina, onLaterPages=numerar_pagina)
+    return nombre_archivo
+
+
+def _renderizar_en_paralelo(secciones, nombre_archivo, encabezados, anchos, titulo_tabla, procesos):
+    """Reparte las secciones entre procesos y une los PDF resultantes en orden"""
+    carpeta = tempfile.mkdtemp(prefix="reporte_")
+    try:
+        futuros = []
+        pendientes = set()
+        total = 0
+        pagina_inicial = 1
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            for seccion in secciones:
+                seccion = PaginasColumnares(seccion)
+                archivo = os.path.join(carpeta, f"seccion_{len(futuros):06d}.pdf")
+                futuro = pool.submit(_renderizar_seccion, archivo, encabezados, anchos, seccion,
+                                     titulo_tabla if not futuros else None, pagina_inicial)
+                futuros.append(futuro)
+                pendientes.add(futuro)
+                total += len(seccion.tabla)
+                pagina_inicial += len(seccion)
+                # No leer más filas de las que los procesos alcanzan a consumir
+                if len(pendientes) >= 2 * procesos:
+                    listos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                    for listo in listos:
+                        listo.result()
+
+            archivo = os.path.join(carpeta, "total.pdf")
+            futuros.append(pool.submit(_renderizar_seccion, archivo, encabezados, anchos, [],
+                                       None, pagina_inicial, True, total))
+
+        from pypdf import PdfWriter
+
+        writer = PdfWriter()
+        for futuro in futuros:
+            writer.append(futuro.result())
+        with open(nombre_archivo, "wb") as salida:
+            writer.write(salida)
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def exportar_a_pdf(filas, nombre_archivo, encabezados, titulo_tabla="Datos", procesos=PROCESOS_PDF):
+    """Exporta filas a un reporte PDF paginado usando reportlab
+
+    Las filas se leen a medida que se necesitan y se reparten en tablas de
+    una página, cada una con sus encabezados y número de página, y al final
+    el total de registros. Si el reporte ocupa más de una sección y pypdf
+    está instalado, las secciones se generan en varios procesos y se unen.
+    """
+    if not REPORTLAB_DISPONIBLE:
+        return False, "Instala 'reportlab': pip install reportlab"
+
+    try:
+        filas = iter(filas)
+        primera = list(islice(filas, FILAS_PRIMERA_PAGINA))
+        anchos = _anchos_pdf(encabezados, primera)
+        secciones = _seccionar(_paginar(chain(primera, filas)))
+        inicio = list(islice(secciones, 2))
+
+        if len(inicio) > 1 and PYPDF_DISPONIBLE and procesos > 1:
+            _renderizar_en_paralelo(chain(inicio, secciones), nombre_archivo, encabezados,
+                                    anchos, titulo_tabla, procesos)
+        else:
+            paginas = (pagina for seccion in chain(inicio, secciones) for pagina in seccion)
+            _renderizar_seccion(nombre_archivo, encabezados, anchos, paginas, titulo_tabla,
+                                con_total=True)
+        return True, f"Datos exportados a {nombre_archivo}"
+    except Exception as e:
+        return False, f"Error al exportar a PDF: {e}"
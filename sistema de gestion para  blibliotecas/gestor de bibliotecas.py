@@ -1,126 +1,81 @@
+import time
+# Referencia para medir el arranque: se toma antes de importar el resto
+INICIO_ARRANQUE = time.perf_counter()
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import mysql.connector
-from datetime import datetime
-import re
-from tkcalendar import DateEntry
-from PIL import Image, ImageTk
+from datetime import date, datetime, timedelta
 import os
-try:
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, PatternFill, Alignment
-    from openpyxl.utils import get_column_letter
-    OPENPYXL_DISPONIBLE = True
-except ImportError:
-    OPENPYXL_DISPONIBLE = False
-
-try:
-    from reportlab.lib.pagesizes import A4
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib import colors
-    REPORTLAB_DISPONIBLE = True
-except ImportError:
-    REPORTLAB_DISPONIBLE = False
+import sys
+from base_datos import DatabaseConnection
+from cache_consultas import CacheConsultas
+import consultas
+from validaciones import Validaciones
+from tareas import EjecutorTareas
+from paginacion import ConsultaPaginada, ListaVirtual
+import busqueda
+import importaciones
+import prestamos_lote
+import servicio
+import estadisticas
+from miniaturas import CacheMiniaturas
+from almacen_imagenes import AlmacenImagenes
+from cola_exportaciones import ColaExportaciones, EXPORTACIONES, FORMATOS, LISTO, ERROR
+from cola_escrituras import ColaEscrituras, Sincronizador, CONFLICTO, describir
+from metricas import METRICAS, VigilanteBucle
 
 
 # CONEXIÓN A BASE DE DATOS
-class DatabaseConnection:
-    def __init__(self):
-        self.connection = None
-        self.cursor = None
-
-    def connect(self):
-        try:
-            self.connection = mysql.connector.connect(
-                host="localhost",
-                database="biblioteca_personal",
-                user="root",
-                password="",
-                autocommit=True
-            )
-            self.cursor = self.connection.cursor(buffered=True)
-            return True
-        except mysql.connector.Error as error:
-            messagebox.showerror("Error de Conexión", f"Error conectando a la base de datos: {error}")
-            return False
-
-    def disconnect(self):
-        if self.cursor:
-            self.cursor.close()
-        if self.connection:
-            self.connection.close()
-
-    def execute_query(self, query, parameters=None):
-        try:
-            if parameters:
-                self.cursor.execute(query, parameters)
-            else:
-                self.cursor.execute(query)
-
-            if query.strip().upper().startswith('SELECT'):
-                return True, self.cursor.fetchall()
-            else:
-                self.connection.commit()
-
-                if query.strip().upper().startswith('CALL'):
-                    result = self.cursor.fetchall()
-                    self.cursor.nextset()
-                    return True, result
-                else:
-                    return True, "Operación exitosa"
-        except mysql.connector.Error as error:
-            return False, str(error)
-
-
-db = DatabaseConnection()
-
-
-# VALIDACIONES
-class Validaciones:
-    @staticmethod
-    def solo_numeros(texto):
-        """Solo permite números"""
-        return texto.isdigit() or texto == ""
-
-    @staticmethod
-    def validar_email(email):
-        """Valida formato de email"""
-        return re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email) is not None
-
-    @staticmethod
-    def validar_imagen(ruta):
-        """Valida imagen"""
-        if not ruta:
-            return False, "No hay imagen"
-
-        extensiones = ['.jpg', '.jpeg', '.png', '.gif']
-        ext = os.path.splitext(ruta)[1].lower()
-
-        if ext not in extensiones:
-            return False, f"Solo: {', '.join(extensiones)}"
-
-        # Verificar tamaño (máximo 2MB)
-        tamano = os.path.getsize(ruta) / (1024 * 1024)
-        if tamano > 2:
-            return False, "Máximo 2MB"
-
-        return True, "OK"
+# Los errores de conexión pueden ocurrir en un hilo de fondo: el aviso se
+# programa en el hilo de Tk. Las lecturas repetidas se responden desde la caché.
+# Al conectar se crea la base o se actualiza su esquema si hace falta.
+db = DatabaseConnection(
+    notificar_error=lambda mensaje: tareas.en_hilo_ui(
+        messagebox.showerror, "Error de Conexión", mensaje),
+    cache=CacheConsultas(),
+    migrar=True
+)
 
 
 # MANEJO DE IMÁGENES
 class ImagenManager:
     def __init__(self):
         self.ruta_actual = None
+        self.ruta_usuario = None
+        self.miniaturas = CacheMiniaturas()
+        self.almacen = AlmacenImagenes()
+
+    def cargar_imagen_para_mostrar(self, ruta, al_cargar, tamaño=(150, 150), clave=None):
+        """Carga imagen solo para mostrar en pantalla
 
-    def cargar_imagen_para_mostrar(self, ruta, tamaño=(150, 150)):
-        """Carga imagen solo para mostrar en pantalla"""
+        al_cargar(imagen) recibe la miniatura (None si no se pudo leer): al
+        instante si ya está en memoria, si no después de decodificarla en
+        segundo plano. Con clave, una carga nueva descarta la anterior.
+        """
         try:
-            imagen = Image.open(ruta)
-            imagen = imagen.resize(tamaño, Image.LANCZOS)
-            return ImageTk.PhotoImage(imagen)
-        except:
-            return None
+            clave_cache = self.miniaturas.clave(ruta, tamaño)
+        except OSError:
+            al_cargar(None)
+            return
+        foto = self.miniaturas.obtener(clave_cache)
+        if foto is not None:
+            al_cargar(foto)
+            return
+        tareas.ejecutar(self.miniaturas.decodificar, clave_cache,
+                        al_terminar=lambda imagen: al_cargar(self.miniaturas.guardar(clave_cache, imagen)),
+                        al_fallar=lambda error: al_cargar(None),
+                        clave=clave)
+
+    def cargar_guardada(self, referencia, al_cargar, tamaño=(150, 150), clave=None):
+        """Como cargar_imagen_para_mostrar, para una imagen del almacén (ya viene achicada)"""
+        clave_cache = ("almacen", referencia, tuple(tamaño))
+        foto = self.miniaturas.obtener(clave_cache)
+        if foto is not None:
+            al_cargar(foto)
+            return
+        tareas.ejecutar(lambda: self.almacen.abrir(referencia, tamaño[0]).resize(tamaño),
+                        al_terminar=lambda imagen: al_cargar(self.miniaturas.guardar(clave_cache, imagen)),
+                        al_fallar=lambda error: al_cargar(None),
+                        clave=clave)
 
 
 imagen_manager = ImagenManager()
@@ -136,12 +91,14 @@ def seleccionar_imagen_libro():
     if ruta:
         valido, mensaje = Validaciones.validar_imagen(ruta)
         if valido:
-            imagen = imagen_manager.cargar_imagen_para_mostrar(ruta)
-            if imagen:
-                label_imagen_libro.config(image=imagen)
-                label_imagen_libro.image = imagen
-                imagen_manager.ruta_actual = ruta
-                messagebox.showinfo("Éxito", "Imagen cargada correctamente")
+            def mostrar(imagen):
+                if imagen:
+                    label_imagen_libro.config(image=imagen)
+                    label_imagen_libro.image = imagen
+                    imagen_manager.ruta_actual = ruta
+                    messagebox.showinfo("Éxito", "Imagen cargada correctamente")
+
+            imagen_manager.cargar_imagen_para_mostrar(ruta, mostrar, clave="imagen_libro")
         else:
             messagebox.showerror("Error", mensaje)
 
@@ -155,12 +112,14 @@ def seleccionar_imagen_usuario():
     if ruta:
         valido, mensaje = Validaciones.validar_imagen(ruta)
         if valido:
-            imagen = imagen_manager.cargar_imagen_para_mostrar(ruta, (120, 120))
-            if imagen:
-                label_imagen_usuario.config(image=imagen)
-                label_imagen_usuario.image = imagen
-                imagen_manager.ruta_usuario = ruta
-                messagebox.showinfo("Éxito", "Foto cargada correctamente")
+            def mostrar(imagen):
+                if imagen:
+                    label_imagen_usuario.config(image=imagen)
+                    label_imagen_usuario.image = imagen
+                    imagen_manager.ruta_usuario = ruta
+                    messagebox.showinfo("Éxito", "Foto cargada correctamente")
+
+            imagen_manager.cargar_imagen_para_mostrar(ruta, mostrar, (120, 120), clave="imagen_usuario")
 
 
 def limpiar_imagen_libro():
@@ -169,6 +128,40 @@ def limpiar_imagen_libro():
     imagen_manager.ruta_actual = None
 
 
+def mostrar_portada(referencia):
+    """Muestra en el formulario la portada guardada de un libro"""
+    limpiar_imagen_libro()
+    if not referencia:
+        return
+
+    def mostrar(imagen):
+        if imagen:
+            label_imagen_libro.config(image=imagen)
+            label_imagen_libro.image = imagen
+            # Guardar de nuevo el libro conserva la portada (el almacén no la duplica)
+            imagen_manager.ruta_actual = imagen_manager.almacen.ruta_original(referencia)
+
+    imagen_manager.cargar_guardada(referencia, mostrar, clave="imagen_libro")
+
+
+def mostrar_vista_previa(lista, label, indice, tamaño):
+    """Carga bajo demanda la imagen de la fila seleccionada en la lista"""
+    seleccion = lista.tree.selection()
+    fila = lista.fila(seleccion[0]) if seleccion else None
+    referencia = fila[indice] if fila else None
+    if not referencia:
+        tareas.cancelar(f"vista_{id(label)}")
+        label.config(image="")
+        label.image = None
+        return
+
+    def mostrar(imagen):
+        label.config(image=imagen or "")
+        label.image = imagen
+
+    imagen_manager.cargar_guardada(referencia, mostrar, tamaño, clave=f"vista_{id(label)}")
+
+
 def limpiar_imagen_usuario():
     """Limpia imagen"""
     label_imagen_usuario.config(image='')
@@ -201,115 +194,85 @@ def limpiar_autor():
     autor_fecha_nacimiento.set_date(datetime.now())
 
 
-def validar_antes_de_guardar():
-    """Validaciones básicas"""
-    if not libro_titulo.get().strip():
-        messagebox.showerror("Error", "El título es obligatorio")
-        return False
-
-    if not libro_autor.get().strip():
-        messagebox.showerror("Error", "El autor es obligatorio")
-        return False
-
-    año = libro_anio.get().strip()
-    if año and not año.isdigit():
-        messagebox.showerror("Error", "El año debe ser numérico")
-        return False
-
-    return True
-
+def ejecutar_en_bd(trabajo, al_terminar=None, clave=None, al_fallar=None):
+    """Ejecuta trabajo(db) en segundo plano y llama al_terminar(resultado) en el hilo de Tk
 
-def validar_usuario():
-    """Validaciones de usuario"""
-    if not usuario_nombre.get().strip():
-        messagebox.showerror("Error", "El nombre es obligatorio")
-        return False
-
-    email = usuario_email.get().strip()
-    if not email:
-        messagebox.showerror("Error", "El email es obligatorio")
-        return False
+    Si no hay resultado (sin conexión, trabajo devolvió None o lanzó una
+    excepción) se llama al_fallar(error), con error None salvo en el último
+    caso; la excepción se informa igual.
+    """
+    def envoltura():
+        if not db.conectado and not db.connect():
+            return None
+        return trabajo(db)
 
-    if not Validaciones.validar_email(email):
-        messagebox.showerror("Error", "Formato de email inválido")
-        return False
+    def entregar(resultado):
+        # None: no hubo conexión y el error ya se notificó
+        if resultado is not None:
+            if al_terminar:
+                al_terminar(resultado)
+        elif al_fallar:
+            al_fallar(None)
 
-    telefono = usuario_telefono.get().strip()
-    if telefono and not telefono.isdigit():
-        messagebox.showerror("Error", "El teléfono debe contener solo números")
-        return False
+    def fallar(error):
+        al_fallar(error)
+        raise error
 
-    return True
+    tareas.ejecutar(envoltura, al_terminar=entregar, al_fallar=fallar if al_fallar else None, clave=clave)
 
 
-def guardar_libro():
-    if not db.connection and not db.connect():
-        return
+def ejecutar_servicio(operacion, *args, al_terminar=None, clave=None):
+    """Ejecuta operacion(db, *args) del módulo servicio en segundo plano; al_terminar(success, result) en el hilo de Tk"""
+    ejecutar_en_bd(lambda bd: operacion(bd, *args),
+                   (lambda respuesta: al_terminar(*respuesta)) if al_terminar else None,
+                   clave)
 
-    if not validar_antes_de_guardar():
-        return
 
-    titulo = libro_titulo.get().strip()
-    autor = libro_autor.get().strip()
+def encolar_escritura(operacion, *args, al_terminar=None):
+    """Valida la operación y la registra en la cola local; el sincronizador la envía al servidor
 
-    try:
-        if imagen_manager.ruta_actual:
-            print("Imagen procesada con PILLOW")
+    al_terminar(success, result) corre en el hilo de Tk apenas la operación
+    queda en el disco local, sin esperar al servidor. Las listas se
+    actualizan cuando el servidor la aplica (al_sincronizar).
+    """
+    def entregar(respuesta):
+        success, result = respuesta
+        if success:
+            sincronizador.avisar()
+            actualizar_sincronizacion()
+        al_terminar(success, result)
 
-        query = "CALL sp_InsertarLibro(%s, %s, %s, %s, %s)"
-        params = (titulo, autor, libro_genero.get().strip(),
-                  int(libro_anio.get()) if libro_anio.get().strip() else None,
-                  libro_isbn.get().strip())
+    tareas.ejecutar(servicio.encolar, cola_escrituras, operacion, *args, al_terminar=entregar,
+                    al_fallar=lambda error: al_terminar(False, f"No se pudo registrar la operación: {error}"))
 
-        success, result = db.execute_query(query, params)
 
+def guardar_libro():
+    def al_terminar(success, result):
         if success:
-            mensaje_sp = result[0][0] if result else "Libro guardado (mensaje no devuelto por SP)"
-            messagebox.showinfo("Resultado", mensaje_sp)
+            messagebox.showinfo("Resultado", result)
             limpiar_libro()
-            actualizar_lista_libros()
         else:
-            messagebox.showerror("Error", f"Error al guardar: {result}")
-    except ValueError:
-        messagebox.showerror("Error", "El año debe ser número válido")
-    except IndexError:
-        messagebox.showerror("Error", "Error inesperado al guardar el libro (índice).")
-
-
-def guardar_usuario():
-    if not db.connection and not db.connect():
-        return
-
-    if not validar_usuario():
-        return
-
-    nombre = usuario_nombre.get().strip()
-    email = usuario_email.get().strip()
-
-    try:
-        if hasattr(imagen_manager, 'ruta_usuario') and imagen_manager.ruta_usuario:
-            print("Foto procesada con PILLOW")
+            messagebox.showerror("Error", result)
 
-        query = "CALL sp_InsertarUsuario(%s, %s, %s)"
-        params = (nombre, email, usuario_telefono.get().strip() or None)
+    encolar_escritura("guardar_libro", libro_titulo.get(), libro_autor.get(), libro_genero.get(),
+                      libro_anio.get(), libro_isbn.get(), imagen_manager.ruta_actual, imagen_manager.almacen,
+                      al_terminar=al_terminar)
 
-        success, result = db.execute_query(query, params)
 
+def guardar_usuario():
+    def al_terminar(success, result):
         if success:
-            mensaje_sp = result[0][0] if result else "Usuario guardado (mensaje no devuelto por SP)"
-            messagebox.showinfo("Resultado", mensaje_sp)
+            messagebox.showinfo("Resultado", result)
             limpiar_usuario()
-            actualizar_lista_usuarios()
         else:
-            messagebox.showerror("Error", f"Error al guardar: {result}")
-    except Exception as e:
-        messagebox.showerror("Error", f"Error inesperado: {e}")
+            messagebox.showerror("Error", result)
 
+    encolar_escritura("guardar_usuario", usuario_nombre.get(), usuario_email.get(),
+                      usuario_telefono.get(), imagen_manager.ruta_usuario, imagen_manager.almacen,
+                      al_terminar=al_terminar)
 
-def eliminar_libro():
-    if not db.connection and not db.connect():
-        return
 
+def eliminar_libro():
     id_libro = libro_id.get().strip()
 
     if not id_libro or not id_libro.isdigit():
@@ -319,33 +282,22 @@ def eliminar_libro():
     if not messagebox.askyesno("Confirmar", f"¿Eliminar el libro ID {id_libro}?"):
         return
 
-    query = "CALL sp_EliminarLibro(%s)"
-    success, result = db.execute_query(query, (int(id_libro),))
+    def al_terminar(success, result):
+        if success:
+            messagebox.showinfo("Resultado", result)
+            limpiar_libro()
+            lista_libros.refrescar_ids([id_libro])
+        else:
+            messagebox.showerror("Error", result)
 
-    if success:
-        mensaje_sp = result[0][0] if result else "Libro eliminado (mensaje no devuelto por SP)"
-        messagebox.showinfo("Resultado", mensaje_sp)
-        limpiar_libro()
-        actualizar_lista_libros()
-    else:
-        messagebox.showerror("Error", f"Error al eliminar: {result}")
+    ejecutar_servicio(servicio.eliminar_libro, id_libro, al_terminar=al_terminar)
 
 
 def buscar_libro_por_id():
-    if not db.connection and not db.connect():
-        return
-
-    id_libro = libro_id.get().strip()
-
-    if not id_libro or not id_libro.isdigit():
-        messagebox.showerror("Error", "Ingrese un ID válido")
-        return
-
-    query = "SELECT * FROM libros WHERE id = %s"
-    success, result = db.execute_query(query, (int(id_libro),))
-
-    if success and result:
-        libro = result[0]
+    def al_terminar(success, libro):
+        if not success:
+            messagebox.showinfo("Búsqueda", libro)
+            return
         libro_titulo.delete(0, tk.END)
         libro_titulo.insert(0, libro[1])
         libro_autor.delete(0, tk.END)
@@ -357,44 +309,38 @@ def buscar_libro_por_id():
             libro_anio.insert(0, str(libro[4]))
         libro_isbn.delete(0, tk.END)
         libro_isbn.insert(0, libro[5] or "")
-    else:
-        messagebox.showinfo("Búsqueda", "Libro no encontrado")
-
+        mostrar_portada(libro[6])
 
-def actualizar_lista_libros():
-    if not db.connection and not db.connect():
-        return
+    ejecutar_servicio(servicio.obtener_libro, libro_id.get(), al_terminar=al_terminar, clave="buscar_libro")
 
-    for item in tree_libros.get_children():
-        tree_libros.delete(item)
 
-    query = "SELECT id, titulo, autor, genero, año_publicacion FROM libros ORDER BY titulo"
-    success, result = db.execute_query(query)
+def buscar_en_lista(lista, tabla, texto):
+    """Muestra en la lista los mejores resultados de la búsqueda, o la lista completa si no hay texto"""
+    if not texto:
+        lista.recargar()
+        return
 
-    if success:
-        for libro in result:
-            tree_libros.insert("", tk.END, values=libro)
+    def al_terminar(respuesta):
+        success, result = respuesta
+        if success:
+            lista.fijar_resultados(result)
+        else:
+            messagebox.showerror("Error", f"Error al buscar: {result}")
 
+    # Misma clave que la lista: una búsqueda nueva descarta la carga anterior
+    ejecutar_en_bd(lambda bd: busqueda.buscar(bd, lista.consulta, tabla, texto),
+                   al_terminar, lista.clave)
 
-def actualizar_lista_usuarios():
-    if not db.connection and not db.connect():
-        return
 
-    for item in tree_usuarios.get_children():
-        tree_usuarios.delete(item)
+def actualizar_lista_libros():
+    buscar_en_lista(lista_libros, "libros", busqueda_libros.get().strip())
 
-    query = "SELECT id, nombre, email, telefono FROM usuarios ORDER BY nombre"
-    success, result = db.execute_query(query)
 
-    if success:
-        for usuario in result:
-            tree_usuarios.insert("", tk.END, values=usuario)
+def actualizar_lista_usuarios():
+    buscar_en_lista(lista_usuarios, "usuarios", busqueda_usuarios.get().strip())
 
 
 def realizar_prestamo():
-    if not db.connection and not db.connect():
-        return
-
     libro_id_val = prestamo_libro_id.get().strip()
     usuario_id_val = prestamo_usuario_id.get().strip()
 
@@ -408,24 +354,18 @@ def realizar_prestamo():
     if not messagebox.askyesno("Confirmar", "¿Realizar el préstamo?"):
         return
 
-    query = "CALL sp_RealizarPrestamo(%s, %s)"
-    success, result = db.execute_query(query, (int(libro_id_val), int(usuario_id_val)))
+    def al_terminar(success, result):
+        if success:
+            messagebox.showinfo("Resultado", result)
+            prestamo_libro_id.delete(0, tk.END)
+            prestamo_usuario_id.delete(0, tk.END)
+        else:
+            messagebox.showerror("Error", result)
 
-    if success:
-        mensaje_sp = result[0][0] if result else "Préstamo realizado (mensaje no devuelto por SP)"
-        messagebox.showinfo("Resultado", mensaje_sp)
-        prestamo_libro_id.delete(0, tk.END)
-        prestamo_usuario_id.delete(0, tk.END)
-        actualizar_lista_prestamos()
-        actualizar_lista_libros()
-    else:
-        messagebox.showerror("Error", f"Error al realizar préstamo: {result}")
+    encolar_escritura("realizar_prestamo", libro_id_val, usuario_id_val, al_terminar=al_terminar)
 
 
 def devolver_libro():
-    if not db.connection and not db.connect():
-        return
-
     prestamo_id = devolucion_id.get().strip()
 
     if not prestamo_id or not prestamo_id.isdigit():
@@ -435,68 +375,186 @@ def devolver_libro():
     if not messagebox.askyesno("Confirmar", "¿Realizar la devolución?"):
         return
 
-    query = "CALL sp_DevolverLibro(%s)"
-    success, result = db.execute_query(query, (int(prestamo_id),))
+    def al_terminar(success, result):
+        if success:
+            messagebox.showinfo("Resultado", result)
+            devolucion_id.delete(0, tk.END)
+        else:
+            messagebox.showerror("Error", result)
 
-    if success:
-        mensaje_sp = result[0][0] if result else "Libro devuelto (mensaje no devuelto por SP)"
-        messagebox.showinfo("Resultado", mensaje_sp)
-        devolucion_id.delete(0, tk.END)
-        actualizar_lista_prestamos()
-        actualizar_lista_libros()
-    else:
-        messagebox.showerror("Error", f"Error al devolver libro: {result}")
+    encolar_escritura("devolver_libro", prestamo_id, al_terminar=al_terminar)
 
 
 def actualizar_lista_prestamos():
-    if not db.connection and not db.connect():
+    lista_prestamos.recargar()
+
+
+# SINCRONIZACIÓN CON EL SERVIDOR
+# Operación de la cola -> lista que muestra las filas que agrega
+LISTA_DE_OPERACION = {"guardar_libro": "lista_libros", "guardar_usuario": "lista_usuarios",
+                      "guardar_autor": "lista_autores", "realizar_prestamo": "lista_prestamos"}
+
+
+def al_sincronizar(aplicadas, en_linea):
+    """Actualiza las listas con lo que el servidor aplicó y avisa de los conflictos (hilo de Tk)"""
+    # Las pestañas que todavía no se armaron no tienen lista: la cargan al abrirse
+    listas = {nombre: globals().get(nombre) for nombre in LISTA_DE_OPERACION.values()}
+    nuevas, libros, devueltos, conflictos = set(), [], [], []
+    for operacion, parametros, estado, mensaje in aplicadas:
+        if estado == CONFLICTO:
+            conflictos.append(f"{describir(operacion, parametros)}: {mensaje}")
+        elif operacion == "devolver_libro":
+            devueltos.append(parametros[0])
+        else:
+            nuevas.add(LISTA_DE_OPERACION[operacion])
+            if operacion == "realizar_prestamo":
+                libros.append(parametros[0])
+
+    for nombre in nuevas:
+        if listas[nombre]:
+            listas[nombre].cargar_nuevos()
+    if libros:
+        listas["lista_libros"].refrescar_ids(libros)
+    if devueltos:
+        if listas["lista_prestamos"]:
+            listas["lista_prestamos"].refrescar_ids(devueltos)
+        listas["lista_libros"].refrescar_donde(
+            f"id IN (SELECT libro_id FROM prestamos WHERE id IN ({', '.join(['%s'] * len(devueltos))}))",
+            tuple(devueltos))
+    actualizar_sincronizacion(en_linea)
+    if conflictos:
+        messagebox.showwarning("Operaciones rechazadas por el servidor",
+                               "\n".join(conflictos) + "\n\nQuedan en la pestaña Préstamos para revisarlas.")
+
+
+def actualizar_sincronizacion(en_linea=None):
+    """Indicador de la barra de estado y panel de operaciones sin sincronizar"""
+    pendientes, conflictos = cola_escrituras.contar()
+    if en_linea is None:
+        en_linea = sincronizador.en_linea
+    partes = []
+    if pendientes:
+        partes.append(f"{'Sin conexión' if en_linea is False else 'Sin sincronizar'}: {pendientes}")
+    if conflictos:
+        partes.append(f"Conflictos: {conflictos}")
+    label_sincronizacion.config(text=" · ".join(partes) or "Sincronizado")
+    if "tree_pendientes" in globals():
+        tree_pendientes.delete(*tree_pendientes.get_children())
+        for id_, *valores in cola_escrituras.listar():
+            tree_pendientes.insert("", "end", iid=str(id_), values=valores)
+
+
+def sincronizar_ahora():
+    sincronizador.avisar()
+    label_sincronizacion.config(text="Sincronizando...")
+
+
+def descartar_conflictos():
+    ids = [int(iid) for iid in tree_pendientes.selection()
+           if tree_pendientes.set(iid, "Estado") == CONFLICTO]
+    if not ids:
+        messagebox.showinfo("Conflictos", "Seleccione las operaciones en conflicto ya revisadas")
         return
+    if not messagebox.askyesno("Confirmar", f"¿Quitar {len(ids)} operación(es) rechazada(s) de la cola?"):
+        return
+    cola_escrituras.descartar(ids)
+    actualizar_sincronizacion()
 
-    for item in tree_prestamos.get_children():
-        tree_prestamos.delete(item)
 
-    query = """SELECT p.id, l.titulo, u.nombre, p.fecha_prestamo, 
-               CASE WHEN p.devuelto THEN 'Sí' ELSE 'No' END
-               FROM prestamos p
-               JOIN libros l ON p.libro_id = l.id
-               JOIN usuarios u ON p.usuario_id = u.id
-               ORDER BY p.fecha_prestamo DESC"""
-    success, result = db.execute_query(query)
+# PRÉSTAMOS POR LOTE
+def mostrar_lote(lineas):
+    listbox_lote.delete(0, tk.END)
+    for linea in lineas:
+        listbox_lote.insert(tk.END, linea)
+    label_lote.config(text=f"{len(ids_lote)} libro(s) en el lote")
 
-    if success:
-        for prestamo in result:
-            tree_prestamos.insert("", tk.END, values=prestamo)
 
+def escanear_libro(event=None):
+    """Agrega al lote los IDs del campo; el lector de códigos envía Enter tras cada libro"""
+    ids, invalidos = prestamos_lote.leer_ids(lote_escaneo.get())
+    lote_escaneo.delete(0, tk.END)
+    if not ids and not invalidos:
+        return
+    if resultados_lote:
+        # Empieza un lote nuevo: se borran los resultados del anterior
+        resultados_lote.clear()
+        ids_lote.clear()
+    ids_lote.extend(i for i in ids if i not in ids_lote)
+    mostrar_lote(ids_lote)
+    if invalidos:
+        messagebox.showwarning("Aviso", f"IDs inválidos ignorados: {', '.join(invalidos)}")
+
+
+def quitar_del_lote():
+    for indice in reversed(listbox_lote.curselection()):
+        if indice < len(ids_lote):
+            del ids_lote[indice]
+    resultados_lote.clear()
+    mostrar_lote(ids_lote)
+
+
+def vaciar_lote():
+    ids_lote.clear()
+    resultados_lote.clear()
+    mostrar_lote(ids_lote)
+
+
+def aplicar_lote(devolucion):
+    """Presta o devuelve todos los libros del lote con una confirmación y un solo refresco"""
+    escanear_libro()
+    if not ids_lote:
+        messagebox.showerror("Error", "No hay libros en el lote")
+        return
+    libro_ids = list(ids_lote)
 
-def guardar_autor():
-    if not db.connection and not db.connect():
+    if devolucion:
+        pregunta = f"¿Devolver {len(libro_ids)} libro(s)?"
+        trabajo = lambda bd: servicio.devolver_lote(bd, libro_ids)
+    else:
+        usuario_id_val = lote_usuario_id.get().strip()
+        if not usuario_id_val or not usuario_id_val.isdigit():
+            messagebox.showerror("Error", "ID de usuario inválido")
+            return
+        pregunta = f"¿Prestar {len(libro_ids)} libro(s) al usuario {usuario_id_val}?"
+        trabajo = lambda bd: servicio.prestar_lote(bd, usuario_id_val, libro_ids)
+    if not messagebox.askyesno("Confirmar", pregunta):
         return
 
-    nombre = autor_nombre.get().strip()
+    def al_terminar(respuesta):
+        success, resultados = respuesta
+        if not success:
+            messagebox.showerror("Error", resultados)
+            return
+        resultados_lote[:] = resultados
+        mostrar_lote(f"{'✔' if ok else '✘'} {libro_id}: {mensaje}"
+                     for libro_id, ok, mensaje, _ in resultados)
+        aplicados = [libro_id for libro_id, ok, _, _ in resultados if ok]
+        if aplicados:
+            lista_libros.refrescar_ids(aplicados)
+            if devolucion:
+                lista_prestamos.refrescar_ids([p for _, ok, _, p in resultados if ok])
+            else:
+                lista_prestamos.cargar_nuevos()
+        accion = "devueltos" if devolucion else "prestados"
+        messagebox.showinfo("Resultado", f"Libros {accion}: {len(aplicados)} de {len(resultados)}"
+                            + ("\nLos que fallaron se indican en la lista." if len(aplicados) < len(resultados) else ""))
 
-    if not nombre:
-        messagebox.showerror("Error", "El nombre del autor es obligatorio")
-        return
+    ejecutar_en_bd(trabajo, al_terminar)
 
-    query = "CALL sp_InsertarAutor(%s, %s, %s)"
-    params = (nombre, autor_nacionalidad.get().strip() or None,
-              autor_fecha_nacimiento.get_date())
 
-    success, result = db.execute_query(query, params)
+def guardar_autor():
+    def al_terminar(success, result):
+        if success:
+            messagebox.showinfo("Resultado", result)
+            limpiar_autor()
+        else:
+            messagebox.showerror("Error", result)
 
-    if success:
-        mensaje_sp = result[0][0] if result else "Autor guardado (mensaje no devuelto por SP)"
-        messagebox.showinfo("Resultado", mensaje_sp)
-        limpiar_autor()
-        actualizar_lista_autores()
-    else:
-        messagebox.showerror("Error", f"Error al guardar: {result}")
+    encolar_escritura("guardar_autor", autor_nombre.get(), autor_nacionalidad.get(),
+                      autor_fecha_nacimiento.get_date(), al_terminar=al_terminar)
 
 
 def eliminar_autor():
-    if not db.connection and not db.connect():
-        return
-
     id_autor = autor_id.get().strip()
 
     if not id_autor or not id_autor.isdigit():
@@ -506,352 +564,1024 @@ def eliminar_autor():
     if not messagebox.askyesno("Confirmar", f"¿Eliminar el autor ID {id_autor}?"):
         return
 
-    query = "CALL sp_EliminarAutor(%s)"
-    success, result = db.execute_query(query, (int(id_autor),))
+    def al_terminar(success, result):
+        if success:
+            messagebox.showinfo("Resultado", result)
+            limpiar_autor()
+            lista_autores.refrescar_ids([id_autor])
+        else:
+            messagebox.showerror("Error", result)
+
+    ejecutar_servicio(servicio.eliminar_autor, id_autor, al_terminar=al_terminar)
 
-    if success:
-        mensaje_sp = result[0][0] if result else "Autor eliminado"
-        messagebox.showinfo("Resultado", mensaje_sp)
-        limpiar_autor()
-        actualizar_lista_autores()
-    else:
-        messagebox.showerror("Error", f"Error al eliminar: {result}")
+
+def formatear_autor(autor):
+    fecha_formateada = autor[3].strftime("%d/%m/%Y") if autor[3] else ""
+    return (autor[0], autor[1], autor[2] or "", fecha_formateada)
 
 
 def actualizar_lista_autores():
-    if not db.connection and not db.connect():
+    buscar_en_lista(lista_autores, "autores", busqueda_autores.get().strip())
+
+
+# IMPORTACIÓN MASIVA
+def importar_archivo(tabla, lista):
+    """Importa libros o usuarios desde un CSV o Excel elegido por el usuario"""
+    nombre_archivo = filedialog.askopenfilename(
+        title=f"Importar {tabla}",
+        filetypes=[("CSV o Excel", "*.csv *.xlsx"), ("Todos los archivos", "*.*")])
+    if not nombre_archivo:
         return
 
-    for item in tree_autores.get_children():
-        tree_autores.delete(item)
+    def al_avanzar(leidas, importadas, rechazadas):
+        texto = f"Importando {tabla}: {leidas} filas leídas, {importadas} importadas, {rechazadas} rechazadas"
+        tareas.en_hilo_ui(lambda: label_estado.config(text=texto))
 
-    query = "SELECT id, nombre, nacionalidad, fecha_nacimiento FROM autores ORDER BY nombre"
-    success, result = db.execute_query(query)
+    def al_terminar(respuesta):
+        success, resumen = respuesta
+        # Aun con error pueden haberse guardado lotes anteriores
+        lista.recargar()
+        if not success:
+            messagebox.showerror("Error", resumen)
+            return
+        leidas, importadas, rechazadas, archivo_rechazadas = resumen
+        mensaje = f"Filas leídas: {leidas}\nImportadas: {importadas}\nRechazadas: {rechazadas}"
+        if archivo_rechazadas:
+            mensaje += f"\n\nLas filas rechazadas y su motivo están en:\n{archivo_rechazadas}"
+        messagebox.showinfo("Importación terminada", mensaje)
 
-    if success:
-        for autor in result:
-            fecha_formateada = autor[3].strftime("%d/%m/%Y") if autor[3] else ""
-            tree_autores.insert("", tk.END, values=(autor[0], autor[1], autor[2] or "", fecha_formateada))
+    ejecutar_en_bd(lambda bd: importaciones.importar(bd, tabla, nombre_archivo, al_avanzar=al_avanzar),
+                   al_terminar)
 
 
 #  EXPORTACIONES - VERSIÓN CORREGIDA
-def exportar_a_excel(datos, nombre_archivo, encabezados):
-    """Exporta datos a un archivo Excel usando openpyxl"""
-    if not OPENPYXL_DISPONIBLE:
-        messagebox.showerror("Error", "Instala 'openpyxl': pip install openpyxl")
-        return
+def exportar_tabla(tabla, formato, nombre_archivo, al_terminar=None):
+    """Encola la exportación de una tabla; el avance se ve en la pestaña Exportaciones"""
+    query, consulta_total, encabezados, titulo = EXPORTACIONES[tabla]
+    descripcion = f"{tabla.capitalize()} a {formato.upper()}"
+    return cola_exportaciones.encolar(descripcion, query, consulta_total, formato, nombre_archivo,
+                                      encabezados, titulo, al_terminar, nombre=f"{tabla}_{formato}")
 
-    try:
-        wb = Workbook()
-        ws = wb.active
-        ws.title = nombre_archivo.replace('.xlsx', '')
-
-        # Agregar encabezados
-        for col_num, encabezado in enumerate(encabezados, start=1):
-            cell = ws.cell(row=1, column=col_num, value=encabezado)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center")
-
-        # Agregar datos
-        for row_num, fila in enumerate(datos, start=2):
-            for col_num, valor in enumerate(fila, start=1):
-                ws.cell(row=row_num, column=col_num, value=str(valor))
-
-        # Ajustar ancho de columnas
-        for column in ws.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            ws.column_dimensions[column_letter].width = adjusted_width
-
-        wb.save(nombre_archivo)
-        messagebox.showinfo("Éxito", f"Datos exportados a {nombre_archivo}")
-    except Exception as e:
-        messagebox.showerror("Error", f"Error al exportar a Excel: {e}")
-
-
-def exportar_a_pdf(datos, nombre_archivo, encabezados, titulo_tabla="Datos"):
-    """Exporta datos a un archivo PDF usando reportlab"""
-    if not REPORTLAB_DISPONIBLE:
-        messagebox.showerror("Error", "Instala 'reportlab': pip install reportlab")
-        return
 
-    try:
-        doc = SimpleDocTemplate(nombre_archivo, pagesize=A4)
-        elements = []
-
-        # Estilo de título
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=30,
-            alignment=1,
-        )
-        title = Paragraph(titulo_tabla, title_style)
-        elements.append(title)
-        elements.append(Spacer(1, 12))
-
-        # Crear tabla
-        data_for_table = [encabezados] + datos
-        table = Table(data_for_table)
-
-        # Estilo de la tabla
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-
-        elements.append(table)
-        doc.build(elements)
-        messagebox.showinfo("Éxito", f"Datos exportados a {nombre_archivo}")
-    except Exception as e:
-        messagebox.showerror("Error", f"Error al exportar a PDF: {e}")
+def avisar_exportacion(trabajo):
+    if trabajo.estado == LISTO:
+        messagebox.showinfo("Éxito", trabajo.mensaje)
+    elif trabajo.estado == ERROR:
+        messagebox.showerror("Error", trabajo.mensaje)
 
 
 def exportar_libros_excel():
-    if not db.connection and not db.connect():
-        return
+    exportar_tabla("libros", "excel", "libros_exportados.xlsx", avisar_exportacion)
 
-    query = "SELECT id, titulo, autor, genero, año_publicacion, isbn, disponible FROM libros ORDER BY titulo"
-    success, result = db.execute_query(query)
 
-    if success:
-        encabezados = ["ID", "Título", "Autor", "Género", "Año", "ISBN", "Disponible"]
-        exportar_a_excel(result, "libros_exportados.xlsx", encabezados)
-    else:
-        messagebox.showerror("Error", "No se pudieron obtener los datos de libros")
+def exportar_libros_pdf():
+    exportar_tabla("libros", "pdf", "libros_exportados.pdf", avisar_exportacion)
 
 
-def exportar_libros_pdf():
-    if not db.connection and not db.connect():
-        return
+def exportar_usuarios_excel():
+    exportar_tabla("usuarios", "excel", "usuarios_exportados.xlsx", avisar_exportacion)
 
-    query = "SELECT id, titulo, autor, genero, año_publicacion, isbn, disponible FROM libros ORDER BY titulo"
-    success, result = db.execute_query(query)
 
-    if success:
-        encabezados = ["ID", "Título", "Autor", "Género", "Año", "ISBN", "Disponible"]
-        exportar_a_pdf(result, "libros_exportados.pdf", encabezados, "Listado de Libros")
-    else:
-        messagebox.showerror("Error", "No se pudieron obtener los datos de libros")
+def exportar_usuarios_pdf():
+    exportar_tabla("usuarios", "pdf", "usuarios_exportados.pdf", avisar_exportacion)
 
 
-def exportar_usuarios_excel():
-    if not db.connection and not db.connect():
-        return
+def exportar_prestamos_excel():
+    exportar_tabla("prestamos", "excel", "prestamos_exportados.xlsx", avisar_exportacion)
 
-    query = "SELECT id, nombre, email, telefono FROM usuarios ORDER BY nombre"
-    success, result = db.execute_query(query)
 
-    if success:
-        encabezados = ["ID", "Nombre", "Email", "Teléfono"]
-        exportar_a_excel(result, "usuarios_exportados.xlsx", encabezados)
-    else:
-        messagebox.showerror("Error", "No se pudieron obtener los datos de usuarios")
+def exportar_prestamos_pdf():
+    exportar_tabla("prestamos", "pdf", "prestamos_exportados.pdf", avisar_exportacion)
 
 
-def exportar_usuarios_pdf():
-    if not db.connection and not db.connect():
-        return
+def exportar_autores_excel():
+    exportar_tabla("autores", "excel", "autores_exportados.xlsx", avisar_exportacion)
 
-    query = "SELECT id, nombre, email, telefono FROM usuarios ORDER BY nombre"
-    success, result = db.execute_query(query)
 
-    if success:
-        encabezados = ["ID", "Nombre", "Email", "Teléfono"]
-        exportar_a_pdf(result, "usuarios_exportados.pdf", encabezados, "Listado de Usuarios")
-    else:
-        messagebox.showerror("Error", "No se pudieron obtener los datos de usuarios")
+def exportar_autores_pdf():
+    exportar_tabla("autores", "pdf", "autores_exportados.pdf", avisar_exportacion)
 
 
-def exportar_prestamos_excel():
-    if not db.connection and not db.connect():
+def exportar_todo():
+    """Exporta las cuatro tablas en los formatos marcados a una carpeta elegida (respaldo)"""
+    formatos = [formato for formato, marcado in formatos_respaldo.items() if marcado.get()]
+    if not formatos:
+        messagebox.showwarning("Advertencia", "Marca al menos un formato")
+        return
+    carpeta = filedialog.askdirectory(title="Carpeta para el respaldo")
+    if not carpeta:
         return
 
-    query = """SELECT p.id, l.titulo, u.nombre, p.fecha_prestamo, p.fecha_devolucion, 
-               CASE WHEN p.devuelto THEN 'Sí' ELSE 'No' END
-               FROM prestamos p
-               JOIN libros l ON p.libro_id = l.id
-               JOIN usuarios u ON p.usuario_id = u.id
-               ORDER BY p.fecha_prestamo DESC"""
-    success, result = db.execute_query(query)
-
-    if success:
-        encabezados = ["ID Préstamo", "Libro", "Usuario", "Fecha Préstamo", "Fecha Devolución", "Devuelto"]
-        exportar_a_excel(result, "prestamos_exportados.xlsx", encabezados)
+    marca = datetime.now().strftime("%Y%m%d_%H%M%S")
+    pendientes = {"total": len(EXPORTACIONES) * len(formatos), "errores": []}
+
+    def al_terminar(trabajo):
+        pendientes["total"] -= 1
+        if trabajo.estado == ERROR:
+            pendientes["errores"].append(f"{trabajo.descripcion}: {trabajo.mensaje}")
+        if pendientes["total"] == 0:
+            if pendientes["errores"]:
+                messagebox.showerror("Error", "Respaldo incompleto:\n" + "\n".join(pendientes["errores"]))
+            else:
+                messagebox.showinfo("Éxito", f"Respaldo terminado en {carpeta}")
+
+    for tabla in EXPORTACIONES:
+        for formato in formatos:
+            nombre_archivo = os.path.join(carpeta, f"{tabla}_{marca}{FORMATOS[formato][1]}")
+            exportar_tabla(tabla, formato, nombre_archivo, al_terminar)
+    notebook.select(tab_exportaciones)
+
+
+def formatear_segundos(segundos):
+    if segundos is None:
+        return ""
+    minutos, segundos = divmod(int(segundos), 60)
+    return f"{minutos}:{segundos:02d}"
+
+
+def mostrar_trabajo(trabajo):
+    """Agrega o actualiza la fila del trabajo en la lista de exportaciones"""
+    if trabajo.total:
+        progreso = f"{trabajo.filas} / {trabajo.total} ({min(100, trabajo.filas * 100 // trabajo.total)}%)"
     else:
-        messagebox.showerror("Error", "No se pudieron obtener los datos de préstamos")
+        progreso = str(trabajo.filas)
+    velocidad = trabajo.filas_por_segundo
+    valores = (trabajo.id, trabajo.descripcion, trabajo.estado, progreso,
+               f"{velocidad:.0f}" if velocidad else "", formatear_segundos(trabajo.segundos_restantes),
+               trabajo.mensaje if trabajo.estado == ERROR else trabajo.nombre_archivo)
+    iid = str(trabajo.id)
+    if tree_exportaciones.exists(iid):
+        tree_exportaciones.item(iid, values=valores)
+    else:
+        tree_exportaciones.insert("", "end", iid=iid, values=valores)
 
 
-def exportar_prestamos_pdf():
-    if not db.connection and not db.connect():
+def cancelar_exportacion():
+    for iid in tree_exportaciones.selection():
+        cola_exportaciones.cancelar(int(iid))
+
+
+def limpiar_exportaciones():
+    for id_trabajo in cola_exportaciones.quitar_terminados():
+        tree_exportaciones.delete(str(id_trabajo))
+
+
+# ESTADÍSTICAS
+# Meses que se pueden elegir en la pestaña (el actual y los anteriores)
+MESES_ESTADISTICAS = 12
+COLOR_PRESTAMOS = "#4a7abc"
+COLOR_DEVOLUCIONES = "#e0883a"
+# Largo máximo de las etiquetas de los gráficos de barras
+LARGO_ETIQUETA = 28
+
+
+def meses_recientes():
+    mes = date.today().replace(day=1)
+    meses = []
+    for _ in range(MESES_ESTADISTICAS):
+        meses.append(mes.strftime("%Y-%m"))
+        mes = (mes - timedelta(days=1)).replace(day=1)
+    return meses
+
+
+def dibujar_barras(canvas, filas):
+    """Barras horizontales de (etiqueta, valor); la mayor ocupa todo el ancho"""
+    canvas.delete("all")
+    ancho, alto = canvas.winfo_width(), canvas.winfo_height()
+    if not filas:
+        canvas.create_text(ancho // 2, alto // 2, text="Sin datos", fill="gray")
+        return
+    maximo = max(valor for _, valor in filas) or 1
+    inicio_barras = min(200, ancho // 3)
+    largo_maximo = ancho - inicio_barras - 40
+    alto_fila = min(24, (alto - 10) / len(filas))
+    for n, (etiqueta, valor) in enumerate(filas):
+        etiqueta = str(etiqueta)
+        if len(etiqueta) > LARGO_ETIQUETA:
+            etiqueta = etiqueta[:LARGO_ETIQUETA - 1] + "…"
+        y = 5 + n * alto_fila
+        largo = max(1, largo_maximo * valor / maximo)
+        canvas.create_text(inicio_barras - 5, y + alto_fila / 2, text=etiqueta, anchor="e")
+        canvas.create_rectangle(inicio_barras, y + 2, inicio_barras + largo, y + alto_fila - 2,
+                                fill=COLOR_PRESTAMOS, outline="")
+        canvas.create_text(inicio_barras + largo + 5, y + alto_fila / 2, text=str(valor), anchor="w")
+
+
+def dibujar_circulacion(canvas, mes, diario):
+    """Préstamos y devoluciones de cada día del mes, en barras verticales"""
+    canvas.delete("all")
+    ancho, alto = canvas.winfo_width(), canvas.winfo_height()
+    dias = (estadisticas.mes_siguiente(mes) - mes).days
+    por_dia = {fecha.day: (prestamos, devoluciones) for fecha, prestamos, devoluciones in diario}
+    maximo = max([max(valores) for valores in por_dia.values()] or [0]) or 1
+    base = alto - 20
+    ancho_dia = (ancho - 20) / dias
+    for dia in range(1, dias + 1):
+        x = 10 + (dia - 1) * ancho_dia
+        for n, (valor, color) in enumerate(zip(por_dia.get(dia, (0, 0)), (COLOR_PRESTAMOS, COLOR_DEVOLUCIONES))):
+            if valor:
+                x_barra = x + 1 + n * (ancho_dia - 2) / 2
+                canvas.create_rectangle(x_barra, base - (base - 20) * valor / maximo,
+                                        x_barra + (ancho_dia - 2) / 2, base, fill=color, outline="")
+        if dia == 1 or dia % 5 == 0:
+            canvas.create_text(x + ancho_dia / 2, base + 10, text=str(dia), fill="gray")
+    canvas.create_line(10, base, ancho - 10, base, fill="gray")
+    canvas.create_text(ancho - 10, 8, anchor="ne", text=f"Máximo diario: {maximo}", fill="gray")
+
+
+def redibujar_grafico(canvas):
+    """Vuelve a dibujar el gráfico con sus últimos datos (al cambiar de tamaño)"""
+    dibujar = graficos_estadisticas.get(str(canvas))
+    if dibujar:
+        dibujar()
+
+
+def mostrar_estadisticas(datos):
+    label_prestamos_mes.config(text=f"Préstamos del mes: {datos['prestamos_mes']}")
+    label_devoluciones_mes.config(text=f"Devoluciones del mes: {datos['devoluciones_mes']}")
+    label_prestamos_activos.config(text=f"Préstamos activos: {datos['prestamos_activos']}")
+    label_usuarios_activos.config(text=f"Usuarios con préstamos: {datos['usuarios_con_prestamos']}")
+    usuarios = [(nombre, activos) for nombre, activos, _ in datos["usuarios"]]
+    for canvas, dibujar in (
+            (canvas_libros, lambda: dibujar_barras(canvas_libros, datos["libros"])),
+            (canvas_generos, lambda: dibujar_barras(canvas_generos, datos["generos"])),
+            (canvas_usuarios, lambda: dibujar_barras(canvas_usuarios, usuarios)),
+            (canvas_circulacion, lambda: dibujar_circulacion(canvas_circulacion, datos["mes"], datos["diario"]))):
+        graficos_estadisticas[str(canvas)] = dibujar
+        dibujar()
+
+
+def actualizar_estadisticas(event=None):
+    inicio = time.perf_counter()
+
+    def al_terminar(success, datos):
+        if not success:
+            messagebox.showerror("Error", datos)
+            return
+        mostrar_estadisticas(datos)
+        # Desde que se piden hasta que los gráficos están dibujados
+        METRICAS.registrar_interfaz("estadisticas", "tablero", time.perf_counter() - inicio)
+
+    ejecutar_servicio(estadisticas.resumen, estadisticas_mes.get(), al_terminar=al_terminar, clave="estadisticas")
+
+
+def recalcular_estadisticas():
+    if not messagebox.askyesno("Confirmar", "¿Recalcular las estadísticas desde todo el historial de préstamos?"):
         return
 
-    query = """SELECT p.id, l.titulo, u.nombre, p.fecha_prestamo, p.fecha_devolucion, 
-               CASE WHEN p.devuelto THEN 'Sí' ELSE 'No' END
-               FROM prestamos p
-               JOIN libros l ON p.libro_id = l.id
-               JOIN usuarios u ON p.usuario_id = u.id
-               ORDER BY p.fecha_prestamo DESC"""
-    success, result = db.execute_query(query)
-
-    if success:
-        encabezados = ["ID Préstamo", "Libro", "Usuario", "Fecha Préstamo", "Fecha Devolución", "Devuelto"]
-        exportar_a_pdf(result, "prestamos_exportados.pdf", encabezados, "Historial de Préstamos")
-    else:
-        messagebox.showerror("Error", "No se pudieron obtener los datos de préstamos")
+    def al_terminar(success, mensaje):
+        if success:
+            messagebox.showinfo("Resultado", mensaje)
+            actualizar_estadisticas()
+        else:
+            messagebox.showerror("Error", mensaje)
 
+    ejecutar_servicio(estadisticas.reconstruir, al_terminar=al_terminar)
 
-def exportar_autores_excel():
-    if not db.connection and not db.connect():
+
+# DIAGNÓSTICO
+# Cada cuántos milisegundos se refresca la pestaña Diagnóstico mientras está a la vista
+INTERVALO_DIAGNOSTICO = 2000
+# Cada cuántos milisegundos se guardan las métricas en disco (para un recolector externo)
+INTERVALO_VOLCADO = 60000
+
+
+def llenar_tabla(tree, filas):
+    tree.delete(*tree.get_children())
+    for valores in filas:
+        tree.insert("", "end", values=valores)
+
+
+def actualizar_diagnostico():
+    """Vuelca en la pestaña los tiempos por sentencia y de la interfaz, y los eventos recientes"""
+    llenar_tabla(tree_diag_consultas, [
+        (nombre, r["llamadas"], r["filas"], r["errores"], r["lentas"],
+         f"{r['ms_promedio']:.1f}", f"{r['ms_p95']:.1f}", f"{r['ms_maximo']:.1f}")
+        for nombre, r in METRICAS.resumen_consultas()])
+    llenar_tabla(tree_diag_interfaz, [
+        (tipo, nombre, r["llamadas"], r["filas"],
+         f"{r['ms_promedio']:.1f}", f"{r['ms_p95']:.1f}", f"{r['ms_maximo']:.1f}")
+        for (tipo, nombre), r in METRICAS.resumen_interfaz()])
+
+    lentas, errores, bloqueos = METRICAS.recientes()
+    eventos = ([(t, "Consulta lenta", f"{nombre}: {segundos * 1000:.0f} ms", f"{sql}\n\n{parametros}")
+                for t, nombre, segundos, sql, parametros in lentas]
+               + [(t, "Error", f"{nombre}: {error}", error) for t, nombre, error in errores]
+               + [(t, "Ventana bloqueada", f"{segundos * 1000:.0f} ms sin atender eventos",
+                   pila or "(sin pila)") for t, segundos, pila in bloqueos])
+    eventos.sort(key=lambda evento: evento[0], reverse=True)
+    detalles_diagnostico.clear()
+    tree_diag_eventos.delete(*tree_diag_eventos.get_children())
+    for n, (t, tipo, resumen, detalle) in enumerate(eventos):
+        iid = str(n)
+        tree_diag_eventos.insert("", "end", iid=iid,
+                                 values=(datetime.fromtimestamp(t).strftime("%H:%M:%S"), tipo, resumen))
+        detalles_diagnostico[iid] = detalle
+
+
+def mostrar_detalle_evento(event=None):
+    seleccion = tree_diag_eventos.selection()
+    texto_diag_detalle.delete("1.0", "end")
+    if seleccion:
+        texto_diag_detalle.insert("1.0", detalles_diagnostico.get(seleccion[0], ""))
+
+
+def refrescar_diagnostico_periodico():
+    if notebook.select() == str(tab_diagnostico):
+        actualizar_diagnostico()
+    root.after(INTERVALO_DIAGNOSTICO, refrescar_diagnostico_periodico)
+
+
+def aplicar_umbral_lenta():
+    try:
+        umbral = float(diag_umbral.get())
+    except ValueError:
+        messagebox.showwarning("Advertencia", "El umbral debe ser un número de milisegundos")
         return
+    METRICAS.configurar(umbral_lenta=umbral / 1000)
 
-    query = "SELECT id, nombre, nacionalidad, fecha_nacimiento FROM autores ORDER BY nombre"
-    success, result = db.execute_query(query)
 
-    if success:
-        encabezados = ["ID", "Nombre", "Nacionalidad", "Fecha Nacimiento"]
-        exportar_a_excel(result, "autores_exportados.xlsx", encabezados)
-    else:
-        messagebox.showerror("Error", "No se pudieron obtener los datos de autores")
+def guardar_metricas():
+    """Guarda metricas.json y metricas.prom (formato de Prometheus)"""
+    def al_terminar(resultado):
+        success, mensaje = resultado
+        (messagebox.showinfo if success else messagebox.showerror)("Métricas", mensaje)
 
+    tareas.ejecutar(METRICAS.volcar, al_terminar=al_terminar)
 
-def exportar_autores_pdf():
-    if not db.connection and not db.connect():
+
+def volcar_metricas_periodico():
+    tareas.ejecutar(METRICAS.volcar)
+    root.after(INTERVALO_VOLCADO, volcar_metricas_periodico)
+
+
+def reiniciar_metricas():
+    METRICAS.reiniciar()
+    actualizar_diagnostico()
+
+
+# ARRANQUE
+# Segundos desde que se lanza el programa hasta ver la ventana y hasta ver
+# la primera página de libros; se miden en cada arranque
+PRESUPUESTO_VENTANA = 1.0
+PRESUPUESTO_PRIMERA_LISTA = 2.5
+# Con este argumento se informan los tiempos de arranque y se cierra la ventana
+# (código de salida 1 si se pasó algún presupuesto)
+MEDIR_ARRANQUE = "--medir-arranque" in sys.argv
+tiempos_arranque = {}
+
+
+def marcar_arranque(etapa, presupuesto):
+    """Registra los segundos desde el lanzamiento hasta la etapa (pestaña Diagnóstico)"""
+    segundos = time.perf_counter() - INICIO_ARRANQUE
+    tiempos_arranque[etapa] = (segundos, presupuesto)
+    METRICAS.registrar_interfaz("arranque", etapa, segundos)
+
+
+def arranque_excedido():
+    return [f"{etapa}: {segundos:.2f} s (presupuesto {presupuesto:.1f} s)"
+            for etapa, (segundos, presupuesto) in tiempos_arranque.items() if segundos > presupuesto]
+
+
+def al_mostrar_ventana(event):
+    """La primera vez que la ventana está en pantalla se conecta y se carga la lista de libros"""
+    if event.widget is not root or "ventana_visible" in tiempos_arranque:
         return
+    marcar_arranque("ventana_visible", PRESUPUESTO_VENTANA)
+    # La conexión (y la migración del esquema) ocurre en segundo plano con la primera consulta
+    lista_libros.recargar(al_mostrar=al_mostrar_primera_lista)
 
-    query = "SELECT id, nombre, nacionalidad, fecha_nacimiento FROM autores ORDER BY nombre"
-    success, result = db.execute_query(query)
 
-    if success:
-        encabezados = ["ID", "Nombre", "Nacionalidad", "Fecha Nacimiento"]
-        exportar_a_pdf(result, "autores_exportados.pdf", encabezados, "Listado de Autores")
-    else:
-        messagebox.showerror("Error", "No se pudieron obtener los datos de autores")
+def al_mostrar_primera_lista():
+    marcar_arranque("primera_lista", PRESUPUESTO_PRIMERA_LISTA)
+    excedido = arranque_excedido()
+    if MEDIR_ARRANQUE:
+        for etapa, (segundos, presupuesto) in tiempos_arranque.items():
+            print(f"{etapa}: {segundos:.3f} s (presupuesto {presupuesto:.1f} s)")
+        cerrar_aplicacion()
+    elif excedido:
+        # Después de que la barra de estado muestre "Listo"
+        root.after_idle(lambda: label_estado.config(text="Arranque lento: " + "; ".join(excedido)))
+
+
+def al_cambiar_pestaña(event=None):
+    """Arma la pestaña elegida si todavía no se armó; Estadísticas se actualiza cada vez que se elige"""
+    construir = pestañas_pendientes.pop(notebook.select(), None)
+    if construir:
+        construir()
+    elif notebook.select() == str(tab_estadisticas):
+        actualizar_estadisticas()
 
 
 # INTERFAZ GRÁFICA (el resto del código permanece igual)
-root = tk.Tk()
-root.title("Sistema de Gestión de Biblioteca")
-root.geometry("1200x800")
-root.configure(bg='white')
-
-try:
-    root.iconbitmap("favicon.ico")
-except:
-    pass
-
-# Crear pestañas
-notebook = ttk.Notebook(root)
-
-# Pestaña Libros
-tab_libros = ttk.Frame(notebook)
-notebook.add(tab_libros, text="Libros")
-
-# Pestaña Usuarios
-tab_usuarios = ttk.Frame(notebook)
-notebook.add(tab_usuarios, text="Usuarios")
-
-# Pestaña Préstamos
-tab_prestamos = ttk.Frame(notebook)
-notebook.add(tab_prestamos, text="Préstamos")
-
-# Pestaña Autores
-tab_autores = ttk.Frame(notebook)
-notebook.add(tab_autores, text="Autores")
-
-notebook.pack(expand=True, fill="both", padx=10, pady=5)
-
-# INTERFAZ LIBROS
-frame_form_libro = ttk.LabelFrame(tab_libros, text="Gestión de Libros", padding=10)
-frame_form_libro.pack(fill="x", padx=10, pady=5)
-
-# Formulario
-frame_izq = ttk.Frame(frame_form_libro)
-frame_izq.pack(side="left", fill="both", expand=True)
-
-ttk.Label(frame_izq, text="ID:").grid(row=0, column=0, padx=5, pady=2, sticky="w")
-libro_id = ttk.Entry(frame_izq, width=10)
-libro_id.grid(row=0, column=1, padx=5, pady=2)
-ttk.Button(frame_izq, text="Buscar por ID", command=buscar_libro_por_id).grid(row=0, column=2, padx=5)
-
-ttk.Label(frame_izq, text="Título:*").grid(row=1, column=0, padx=5, pady=2, sticky="w")
-libro_titulo = ttk.Entry(frame_izq, width=30)
-libro_titulo.grid(row=1, column=1, padx=5, pady=2, columnspan=2)
-
-ttk.Label(frame_izq, text="Autor:*").grid(row=2, column=0, padx=5, pady=2, sticky="w")
-libro_autor = ttk.Entry(frame_izq, width=30)
-libro_autor.grid(row=2, column=1, padx=5, pady=2, columnspan=2)
-
-ttk.Label(frame_izq, text="Género:").grid(row=3, column=0, padx=5, pady=2, sticky="w")
-libro_genero = ttk.Entry(frame_izq, width=30)
-libro_genero.grid(row=3, column=1, padx=5, pady=2, columnspan=2)
-
-ttk.Label(frame_izq, text="Año:").grid(row=4, column=0, padx=5, pady=2, sticky="w")
-libro_anio = ttk.Entry(frame_izq, width=10)
-libro_anio.grid(row=4, column=1, padx=5, pady=2, sticky="w")
-vcmd = (root.register(Validaciones.solo_numeros), '%P')
-libro_anio.configure(validate="key", validatecommand=vcmd)
-
-ttk.Label(frame_izq, text="ISBN:").grid(row=4, column=2, padx=5, pady=2, sticky="w")
-libro_isbn = ttk.Entry(frame_izq, width=20)
-libro_isbn.grid(row=4, column=3, padx=5, pady=2)
-
-# Imagen
-frame_der = ttk.Frame(frame_form_libro)
-frame_der.pack(side="right", padx=20)
-
-ttk.Label(frame_der, text="Portada del Libro").pack()
-label_imagen_libro = tk.Label(frame_der, background="lightgray", width=20, height=10)
-label_imagen_libro.pack(pady=5)
-frame_botones_img = ttk.Frame(frame_der)
-frame_botones_img.pack()
-ttk.Button(frame_botones_img, text="Seleccionar Imagen",
-           command=seleccionar_imagen_libro).pack(side="left", padx=2)
-ttk.Button(frame_botones_img, text="Limpiar Imagen",
-           command=limpiar_imagen_libro).pack(side="left", padx=2)
-
-# Botones
-frame_botones = ttk.Frame(frame_izq)
-frame_botones.grid(row=5, column=0, columnspan=4, pady=10)
-ttk.Button(frame_botones, text="Guardar", command=guardar_libro).pack(side="left", padx=5)
-ttk.Button(frame_botones, text="Eliminar", command=eliminar_libro).pack(side="left", padx=5)
-ttk.Button(frame_botones, text="Limpiar", command=limpiar_libro).pack(side="left", padx=5)
-# Botones de exportación para Libros
-ttk.Button(frame_botones, text="Exportar a Excel", command=exportar_libros_excel).pack(side="left", padx=5)
-ttk.Button(frame_botones, text="Exportar a PDF", command=exportar_libros_pdf).pack(side="left", padx=5)
-
-# Lista
-frame_lista_libros = ttk.LabelFrame(tab_libros, text="Lista de Libros", padding=10)
-frame_lista_libros.pack(fill="both", expand=True, padx=10, pady=5)
-columns_libros = ("ID", "Título", "Autor", "Género", "Año")
-tree_libros = ttk.Treeview(frame_lista_libros, columns=columns_libros, show="headings", height=12)
-for col in columns_libros:
-    tree_libros.heading(col, text=col)
-tree_libros.column("ID", width=50)
-tree_libros.column("Título", width=250)
-tree_libros.column("Autor", width=150)
-tree_libros.column("Género", width=100)
-tree_libros.column("Año", width=80)
-tree_libros.pack(fill="both", expand=True)
-
-# INTERFAZ USUARIOS
-frame_form_usuario = ttk.LabelFrame(tab_usuarios, text="Gestión de Usuarios", padding=10)
-frame_form_usuario.pack(fill="x", padx=10, p
\ No newline at end of file
+# Protegida: los procesos que generan reportes PDF vuelven a importar este
+# archivo y no deben abrir otra ventana
+if __name__ == "__main__":
+    root = tk.Tk()
+    root.title("Sistema de Gestión de Biblioteca")
+    root.geometry("1200x800")
+    root.configure(bg='white')
+
+    try:
+        root.iconbitmap("favicon.ico")
+    except:
+        pass
+
+    # Crear pestañas
+    notebook = ttk.Notebook(root)
+
+    # Pestaña Libros
+    tab_libros = ttk.Frame(notebook)
+    notebook.add(tab_libros, text="Libros")
+
+    # Pestaña Usuarios
+    tab_usuarios = ttk.Frame(notebook)
+    notebook.add(tab_usuarios, text="Usuarios")
+
+    # Pestaña Préstamos
+    tab_prestamos = ttk.Frame(notebook)
+    notebook.add(tab_prestamos, text="Préstamos")
+
+    # Pestaña Autores
+    tab_autores = ttk.Frame(notebook)
+    notebook.add(tab_autores, text="Autores")
+
+    # Pestaña Estadísticas
+    tab_estadisticas = ttk.Frame(notebook)
+    notebook.add(tab_estadisticas, text="Estadísticas")
+
+    # Pestaña Exportaciones
+    tab_exportaciones = ttk.Frame(notebook)
+    notebook.add(tab_exportaciones, text="Exportaciones")
+
+    # Pestaña Diagnóstico
+    tab_diagnostico = ttk.Frame(notebook)
+    notebook.add(tab_diagnostico, text="Diagnóstico")
+
+    notebook.pack(expand=True, fill="both", padx=10, pady=5)
+
+    # Barra de estado con indicador de actividad
+    barra_estado = ttk.Frame(root)
+    barra_estado.pack(side="bottom", fill="x", padx=10, pady=(0, 5))
+    label_estado = ttk.Label(barra_estado, text="Listo")
+    label_estado.pack(side="left")
+    progreso_estado = ttk.Progressbar(barra_estado, mode="indeterminate", length=150)
+    progreso_estado.pack(side="right")
+    label_sincronizacion = ttk.Label(barra_estado, text="")
+    label_sincronizacion.pack(side="right", padx=10)
+
+
+    def mostrar_ocupado(ocupado):
+        """Indicador de actividad mientras haya consultas en curso"""
+        if ocupado:
+            label_estado.config(text="Consultando la base de datos...")
+            progreso_estado.start(15)
+            root.config(cursor="watch")
+        else:
+            estadisticas = db.cache.estadisticas()
+            label_estado.config(text=f"Listo (caché: {estadisticas['aciertos']} aciertos, "
+                                     f"{estadisticas['fallos']} consultas al servidor)")
+            progreso_estado.stop()
+            root.config(cursor="")
+
+
+    tareas = EjecutorTareas(root, max_hilos=db.tamano_pool, al_cambiar_ocupado=mostrar_ocupado)
+    cola_exportaciones = ColaExportaciones(root, db.config, al_cambiar=mostrar_trabajo)
+
+    # Préstamos, devoluciones y altas se guardan primero en el disco local y se
+    # envían al servidor en segundo plano (también lo que quedó de la sesión anterior)
+    cola_escrituras = ColaEscrituras()
+    sincronizador = Sincronizador(cola_escrituras, db, al_sincronizar=lambda aplicadas, en_linea: tareas.en_hilo_ui(
+        al_sincronizar, aplicadas, en_linea))
+    sincronizador.start()
+    actualizar_sincronizacion()
+
+    # INTERFAZ LIBROS
+    frame_form_libro = ttk.LabelFrame(tab_libros, text="Gestión de Libros", padding=10)
+    frame_form_libro.pack(fill="x", padx=10, pady=5)
+
+    # Formulario
+    frame_izq = ttk.Frame(frame_form_libro)
+    frame_izq.pack(side="left", fill="both", expand=True)
+
+    ttk.Label(frame_izq, text="ID:").grid(row=0, column=0, padx=5, pady=2, sticky="w")
+    libro_id = ttk.Entry(frame_izq, width=10)
+    libro_id.grid(row=0, column=1, padx=5, pady=2)
+    ttk.Button(frame_izq, text="Buscar por ID", command=buscar_libro_por_id).grid(row=0, column=2, padx=5)
+
+    ttk.Label(frame_izq, text="Título:*").grid(row=1, column=0, padx=5, pady=2, sticky="w")
+    libro_titulo = ttk.Entry(frame_izq, width=30)
+    libro_titulo.grid(row=1, column=1, padx=5, pady=2, columnspan=2)
+
+    ttk.Label(frame_izq, text="Autor:*").grid(row=2, column=0, padx=5, pady=2, sticky="w")
+    libro_autor = ttk.Entry(frame_izq, width=30)
+    libro_autor.grid(row=2, column=1, padx=5, pady=2, columnspan=2)
+
+    ttk.Label(frame_izq, text="Género:").grid(row=3, column=0, padx=5, pady=2, sticky="w")
+    libro_genero = ttk.Entry(frame_izq, width=30)
+    libro_genero.grid(row=3, column=1, padx=5, pady=2, columnspan=2)
+
+    ttk.Label(frame_izq, text="Año:").grid(row=4, column=0, padx=5, pady=2, sticky="w")
+    libro_anio = ttk.Entry(frame_izq, width=10)
+    libro_anio.grid(row=4, column=1, padx=5, pady=2, sticky="w")
+    vcmd = (root.register(Validaciones.solo_numeros), '%P')
+    libro_anio.configure(validate="key", validatecommand=vcmd)
+
+    ttk.Label(frame_izq, text="ISBN:").grid(row=4, column=2, padx=5, pady=2, sticky="w")
+    libro_isbn = ttk.Entry(frame_izq, width=20)
+    libro_isbn.grid(row=4, column=3, padx=5, pady=2)
+
+    # Imagen
+    frame_der = ttk.Frame(frame_form_libro)
+    frame_der.pack(side="right", padx=20)
+
+    ttk.Label(frame_der, text="Portada del Libro").pack()
+    label_imagen_libro = tk.Label(frame_der, background="lightgray", width=20, height=10)
+    label_imagen_libro.pack(pady=5)
+    frame_botones_img = ttk.Frame(frame_der)
+    frame_botones_img.pack()
+    ttk.Button(frame_botones_img, text="Seleccionar Imagen",
+               command=seleccionar_imagen_libro).pack(side="left", padx=2)
+    ttk.Button(frame_botones_img, text="Limpiar Imagen",
+               command=limpiar_imagen_libro).pack(side="left", padx=2)
+
+    # Botones
+    frame_botones = ttk.Frame(frame_izq)
+    frame_botones.grid(row=5, column=0, columnspan=4, pady=10)
+    ttk.Button(frame_botones, text="Guardar", command=guardar_libro).pack(side="left", padx=5)
+    ttk.Button(frame_botones, text="Eliminar", command=eliminar_libro).pack(side="left", padx=5)
+    ttk.Button(frame_botones, text="Limpiar", command=limpiar_libro).pack(side="left", padx=5)
+    # Botones de exportación para Libros
+    ttk.Button(frame_botones, text="Exportar a Excel", command=exportar_libros_excel).pack(side="left", padx=5)
+    ttk.Button(frame_botones, text="Exportar a PDF", command=exportar_libros_pdf).pack(side="left", padx=5)
+    ttk.Button(frame_botones, text="Importar...",
+               command=lambda: importar_archivo("libros", lista_libros)).pack(side="left", padx=5)
+
+    # Lista
+    frame_lista_libros = ttk.LabelFrame(tab_libros, text="Lista de Libros", padding=10)
+    frame_lista_libros.pack(fill="both", expand=True, padx=10, pady=5)
+    frame_busqueda_libros = ttk.Frame(frame_lista_libros)
+    frame_busqueda_libros.pack(side="top", fill="x", pady=(0, 5))
+    ttk.Label(frame_busqueda_libros, text="Buscar:").pack(side="left", padx=5)
+    busqueda_libros = ttk.Entry(frame_busqueda_libros, width=40)
+    busqueda_libros.pack(side="left", padx=5)
+    # Una caja por columna, debajo de cada encabezado: filtran (y los encabezados ordenan) en memoria
+    frame_filtros_libros = ttk.Frame(frame_lista_libros)
+    frame_filtros_libros.pack(side="top", fill="x", pady=(0, 2))
+    columns_libros = ("ID", "Título", "Autor", "Género", "Año")
+    tree_libros = ttk.Treeview(frame_lista_libros, columns=columns_libros, show="headings", height=12)
+    for col in columns_libros:
+        tree_libros.heading(col, text=col)
+    tree_libros.column("ID", width=50)
+    tree_libros.column("Título", width=250)
+    tree_libros.column("Autor", width=150)
+    tree_libros.column("Género", width=100)
+    tree_libros.column("Año", width=80)
+    label_vista_libro = ttk.Label(frame_lista_libros)
+    label_vista_libro.pack(side="right", anchor="n", padx=(10, 0))
+    scroll_libros = ttk.Scrollbar(frame_lista_libros, orient="vertical")
+    scroll_libros.pack(side="right", fill="y")
+    tree_libros.pack(side="left", fill="both", expand=True)
+    # La portada viene en la consulta pero no se muestra como columna
+    lista_libros = ListaVirtual(tree_libros, scroll_libros, ConsultaPaginada(**consultas.LISTAS["libros"]),
+                               ejecutar_en_bd, lambda libro: libro[:5], nombre="libros")
+    lista_libros.activar_orden_local(frame_filtros_libros)
+    tree_libros.bind("<<TreeviewSelect>>",
+                     lambda e: mostrar_vista_previa(lista_libros, label_vista_libro, 5, (120, 120)))
+    busqueda.BusquedaDiferida(busqueda_libros, lambda texto: buscar_en_lista(lista_libros, "libros", texto))
+
+    # INTERFAZ USUARIOS
+    def construir_usuarios():
+        """Arma la pestaña Usuarios la primera vez que se abre"""
+        global usuario_id, usuario_nombre, usuario_email, usuario_telefono, label_imagen_usuario
+        global busqueda_usuarios, lista_usuarios
+        frame_form_usuario = ttk.LabelFrame(tab_usuarios, text="Gestión de Usuarios", padding=10)
+        frame_form_usuario.pack(fill="x", padx=10, pady=5)
+
+        frame_izq_usuario = ttk.Frame(frame_form_usuario)
+        frame_izq_usuario.pack(side="left", fill="both", expand=True)
+
+        ttk.Label(frame_izq_usuario, text="ID:").grid(row=0, column=0, padx=5, pady=2, sticky="w")
+        usuario_id = ttk.Entry(frame_izq_usuario, width=10)
+        usuario_id.grid(row=0, column=1, padx=5, pady=2, sticky="w")
+
+        ttk.Label(frame_izq_usuario, text="Nombre:*").grid(row=1, column=0, padx=5, pady=2, sticky="w")
+        usuario_nombre = ttk.Entry(frame_izq_usuario, width=30)
+        usuario_nombre.grid(row=1, column=1, padx=5, pady=2)
+
+        ttk.Label(frame_izq_usuario, text="Email:*").grid(row=2, column=0, padx=5, pady=2, sticky="w")
+        usuario_email = ttk.Entry(frame_izq_usuario, width=30)
+        usuario_email.grid(row=2, column=1, padx=5, pady=2)
+
+        ttk.Label(frame_izq_usuario, text="Teléfono:").grid(row=3, column=0, padx=5, pady=2, sticky="w")
+        usuario_telefono = ttk.Entry(frame_izq_usuario, width=20)
+        usuario_telefono.grid(row=3, column=1, padx=5, pady=2, sticky="w")
+        usuario_telefono.configure(validate="key", validatecommand=vcmd)
+
+        # Foto
+        frame_der_usuario = ttk.Frame(frame_form_usuario)
+        frame_der_usuario.pack(side="right", padx=20)
+
+        ttk.Label(frame_der_usuario, text="Foto del Usuario").pack()
+        label_imagen_usuario = tk.Label(frame_der_usuario, background="lightgray", width=16, height=8)
+        label_imagen_usuario.pack(pady=5)
+        frame_botones_img_usuario = ttk.Frame(frame_der_usuario)
+        frame_botones_img_usuario.pack()
+        ttk.Button(frame_botones_img_usuario, text="Seleccionar Foto",
+                   command=seleccionar_imagen_usuario).pack(side="left", padx=2)
+        ttk.Button(frame_botones_img_usuario, text="Limpiar Foto",
+                   command=limpiar_imagen_usuario).pack(side="left", padx=2)
+
+        # Botones
+        frame_botones_usuario = ttk.Frame(frame_izq_usuario)
+        frame_botones_usuario.grid(row=4, column=0, columnspan=2, pady=10)
+        ttk.Button(frame_botones_usuario, text="Guardar", command=guardar_usuario).pack(side="left", padx=5)
+        ttk.Button(frame_botones_usuario, text="Limpiar", command=limpiar_usuario).pack(side="left", padx=5)
+        ttk.Button(frame_botones_usuario, text="Exportar a Excel", command=exportar_usuarios_excel).pack(side="left", padx=5)
+        ttk.Button(frame_botones_usuario, text="Exportar a PDF", command=exportar_usuarios_pdf).pack(side="left", padx=5)
+        ttk.Button(frame_botones_usuario, text="Importar...",
+                   command=lambda: importar_archivo("usuarios", lista_usuarios)).pack(side="left", padx=5)
+
+        # Lista
+        frame_lista_usuarios = ttk.LabelFrame(tab_usuarios, text="Lista de Usuarios", padding=10)
+        frame_lista_usuarios.pack(fill="both", expand=True, padx=10, pady=5)
+        frame_busqueda_usuarios = ttk.Frame(frame_lista_usuarios)
+        frame_busqueda_usuarios.pack(side="top", fill="x", pady=(0, 5))
+        ttk.Label(frame_busqueda_usuarios, text="Buscar:").pack(side="left", padx=5)
+        busqueda_usuarios = ttk.Entry(frame_busqueda_usuarios, width=40)
+        busqueda_usuarios.pack(side="left", padx=5)
+        # Una caja por columna, debajo de cada encabezado: filtran (y los encabezados ordenan) en memoria
+        frame_filtros_usuarios = ttk.Frame(frame_lista_usuarios)
+        frame_filtros_usuarios.pack(side="top", fill="x", pady=(0, 2))
+        columns_usuarios = ("ID", "Nombre", "Email", "Teléfono")
+        tree_usuarios = ttk.Treeview(frame_lista_usuarios, columns=columns_usuarios, show="headings", height=12)
+        for col in columns_usuarios:
+            tree_usuarios.heading(col, text=col)
+        tree_usuarios.column("ID", width=50)
+        tree_usuarios.column("Nombre", width=200)
+        tree_usuarios.column("Email", width=250)
+        tree_usuarios.column("Teléfono", width=120)
+        label_vista_usuario = ttk.Label(frame_lista_usuarios)
+        label_vista_usuario.pack(side="right", anchor="n", padx=(10, 0))
+        scroll_usuarios = ttk.Scrollbar(frame_lista_usuarios, orient="vertical")
+        scroll_usuarios.pack(side="right", fill="y")
+        tree_usuarios.pack(side="left", fill="both", expand=True)
+        lista_usuarios = ListaVirtual(tree_usuarios, scroll_usuarios, ConsultaPaginada(**consultas.LISTAS["usuarios"]),
+                                     ejecutar_en_bd, lambda usuario: usuario[:4], nombre="usuarios")
+        lista_usuarios.activar_orden_local(frame_filtros_usuarios)
+        tree_usuarios.bind("<<TreeviewSelect>>",
+                           lambda e: mostrar_vista_previa(lista_usuarios, label_vista_usuario, 4, (120, 120)))
+        busqueda.BusquedaDiferida(busqueda_usuarios, lambda texto: buscar_en_lista(lista_usuarios, "usuarios", texto))
+        actualizar_lista_usuarios()
+
+    # INTERFAZ PRÉSTAMOS
+    def construir_prestamos():
+        """Arma la pestaña Préstamos la primera vez que se abre"""
+        global prestamo_libro_id, prestamo_usuario_id, devolucion_id, ids_lote, resultados_lote
+        global lote_escaneo, lote_usuario_id, listbox_lote, label_lote, lista_prestamos, tree_pendientes
+        frame_form_prestamo = ttk.LabelFrame(tab_prestamos, text="Nuevo Préstamo", padding=10)
+        frame_form_prestamo.pack(fill="x", padx=10, pady=5)
+
+        ttk.Label(frame_form_prestamo, text="ID Libro:*").grid(row=0, column=0, padx=5, pady=2, sticky="w")
+        prestamo_libro_id = ttk.Entry(frame_form_prestamo, width=10)
+        prestamo_libro_id.grid(row=0, column=1, padx=5, pady=2)
+        prestamo_libro_id.configure(validate="key", validatecommand=vcmd)
+
+        ttk.Label(frame_form_prestamo, text="ID Usuario:*").grid(row=0, column=2, padx=5, pady=2, sticky="w")
+        prestamo_usuario_id = ttk.Entry(frame_form_prestamo, width=10)
+        prestamo_usuario_id.grid(row=0, column=3, padx=5, pady=2)
+        prestamo_usuario_id.configure(validate="key", validatecommand=vcmd)
+
+        ttk.Button(frame_form_prestamo, text="Realizar Préstamo",
+                   command=realizar_prestamo).grid(row=0, column=4, padx=10)
+
+        frame_form_devolucion = ttk.LabelFrame(tab_prestamos, text="Devolución", padding=10)
+        frame_form_devolucion.pack(fill="x", padx=10, pady=5)
+
+        ttk.Label(frame_form_devolucion, text="ID Préstamo:*").grid(row=0, column=0, padx=5, pady=2, sticky="w")
+        devolucion_id = ttk.Entry(frame_form_devolucion, width=10)
+        devolucion_id.grid(row=0, column=1, padx=5, pady=2)
+        devolucion_id.configure(validate="key", validatecommand=vcmd)
+
+        ttk.Button(frame_form_devolucion, text="Devolver Libro",
+                   command=devolver_libro).grid(row=0, column=2, padx=10)
+        ttk.Button(frame_form_devolucion, text="Exportar a Excel",
+                   command=exportar_prestamos_excel).grid(row=0, column=3, padx=5)
+        ttk.Button(frame_form_devolucion, text="Exportar a PDF",
+                   command=exportar_prestamos_pdf).grid(row=0, column=4, padx=5)
+
+        # Préstamo y devolución de varios libros de una vez (lector de códigos de barras)
+        frame_form_lote = ttk.LabelFrame(tab_prestamos, text="Préstamo / Devolución por Lote", padding=10)
+        frame_form_lote.pack(fill="x", padx=10, pady=5)
+        ids_lote = []
+        resultados_lote = []
+
+        ttk.Label(frame_form_lote, text="Escanear ID Libro:").grid(row=0, column=0, padx=5, pady=2, sticky="w")
+        lote_escaneo = ttk.Entry(frame_form_lote, width=20)
+        lote_escaneo.grid(row=0, column=1, padx=5, pady=2, sticky="w")
+        lote_escaneo.bind("<Return>", escanear_libro)
+        lote_escaneo.bind("<KP_Enter>", escanear_libro)
+
+        ttk.Label(frame_form_lote, text="ID Usuario (préstamo):").grid(row=1, column=0, padx=5, pady=2, sticky="w")
+        lote_usuario_id = ttk.Entry(frame_form_lote, width=10)
+        lote_usuario_id.grid(row=1, column=1, padx=5, pady=2, sticky="w")
+        lote_usuario_id.configure(validate="key", validatecommand=vcmd)
+
+        listbox_lote = tk.Listbox(frame_form_lote, height=5, width=70, selectmode="extended")
+        listbox_lote.grid(row=0, column=2, rowspan=3, padx=5, pady=2, sticky="nsew")
+        scroll_lote = ttk.Scrollbar(frame_form_lote, orient="vertical", command=listbox_lote.yview)
+        scroll_lote.grid(row=0, column=3, rowspan=3, sticky="ns")
+        listbox_lote.configure(yscrollcommand=scroll_lote.set)
+        frame_form_lote.columnconfigure(2, weight=1)
+        label_lote = ttk.Label(frame_form_lote, text="0 libro(s) en el lote")
+        label_lote.grid(row=2, column=0, columnspan=2, padx=5, sticky="w")
+
+        frame_botones_lote = ttk.Frame(frame_form_lote)
+        frame_botones_lote.grid(row=0, column=4, rowspan=3, padx=5)
+        ttk.Button(frame_botones_lote, text="Prestar Lote",
+                   command=lambda: aplicar_lote(False)).pack(fill="x", pady=1)
+        ttk.Button(frame_botones_lote, text="Devolver Lote",
+                   command=lambda: aplicar_lote(True)).pack(fill="x", pady=1)
+        ttk.Button(frame_botones_lote, text="Quitar", command=quitar_del_lote).pack(fill="x", pady=1)
+        ttk.Button(frame_botones_lote, text="Vaciar", command=vaciar_lote).pack(fill="x", pady=1)
+
+        # Operaciones registradas en este equipo que el servidor todavía no aplicó, o rechazó
+        frame_pendientes = ttk.LabelFrame(tab_prestamos, text="Operaciones sin sincronizar", padding=10)
+        frame_pendientes.pack(fill="x", padx=10, pady=5)
+        columns_pendientes = ("Fecha", "Operación", "Estado", "Intentos", "Resultado")
+        tree_pendientes = ttk.Treeview(frame_pendientes, columns=columns_pendientes, show="headings", height=4)
+        for col, ancho in zip(columns_pendientes, (130, 300, 80, 60, 400)):
+            tree_pendientes.heading(col, text=col)
+            tree_pendientes.column(col, width=ancho)
+        tree_pendientes.pack(side="left", fill="both", expand=True)
+        frame_botones_pendientes = ttk.Frame(frame_pendientes)
+        frame_botones_pendientes.pack(side="right", padx=5)
+        ttk.Button(frame_botones_pendientes, text="Sincronizar ahora",
+                   command=sincronizar_ahora).pack(fill="x", pady=1)
+        ttk.Button(frame_botones_pendientes, text="Descartar conflicto",
+                   command=descartar_conflictos).pack(fill="x", pady=1)
+        actualizar_sincronizacion()
+
+        # Lista
+        frame_lista_prestamos = ttk.LabelFrame(tab_prestamos, text="Historial de Préstamos", padding=10)
+        frame_lista_prestamos.pack(fill="both", expand=True, padx=10, pady=5)
+        frame_filtros_prestamos = ttk.Frame(frame_lista_prestamos)
+        frame_filtros_prestamos.pack(side="top", fill="x", pady=(0, 2))
+        columns_prestamos = ("ID", "Libro", "Usuario", "Fecha Préstamo", "Devuelto")
+        tree_prestamos = ttk.Treeview(frame_lista_prestamos, columns=columns_prestamos, show="headings", height=12)
+        for col in columns_prestamos:
+            tree_prestamos.heading(col, text=col)
+        tree_prestamos.column("ID", width=50)
+        tree_prestamos.column("Libro", width=250)
+        tree_prestamos.column("Usuario", width=200)
+        tree_prestamos.column("Fecha Préstamo", width=120)
+        tree_prestamos.column("Devuelto", width=80)
+        scroll_prestamos = ttk.Scrollbar(frame_lista_prestamos, orient="vertical")
+        scroll_prestamos.pack(side="right", fill="y")
+        tree_prestamos.pack(side="left", fill="both", expand=True)
+        lista_prestamos = ListaVirtual(tree_prestamos, scroll_prestamos, ConsultaPaginada(**consultas.LISTAS["prestamos"]),
+                                      ejecutar_en_bd, nombre="prestamos")
+        lista_prestamos.activar_orden_local(frame_filtros_prestamos)
+        actualizar_lista_prestamos()
+
+    # INTERFAZ AUTORES
+    def construir_autores():
+        """Arma la pestaña Autores la primera vez que se abre"""
+        global autor_id, autor_nombre, autor_nacionalidad, autor_fecha_nacimiento, busqueda_autores
+        global lista_autores
+        # tkcalendar solo se carga si se abre esta pestaña
+        from tkcalendar import DateEntry
+
+        frame_form_autor = ttk.LabelFrame(tab_autores, text="Gestión de Autores", padding=10)
+        frame_form_autor.pack(fill="x", padx=10, pady=5)
+
+        ttk.Label(frame_form_autor, text="ID:").grid(row=0, column=0, padx=5, pady=2, sticky="w")
+        autor_id = ttk.Entry(frame_form_autor, width=10)
+        autor_id.grid(row=0, column=1, padx=5, pady=2, sticky="w")
+
+        ttk.Label(frame_form_autor, text="Nombre:*").grid(row=1, column=0, padx=5, pady=2, sticky="w")
+        autor_nombre = ttk.Entry(frame_form_autor, width=30)
+        autor_nombre.grid(row=1, column=1, padx=5, pady=2)
+
+        ttk.Label(frame_form_autor, text="Nacionalidad:").grid(row=2, column=0, padx=5, pady=2, sticky="w")
+        autor_nacionalidad = ttk.Entry(frame_form_autor, width=30)
+        autor_nacionalidad.grid(row=2, column=1, padx=5, pady=2)
+
+        ttk.Label(frame_form_autor, text="Fecha Nacimiento:").grid(row=3, column=0, padx=5, pady=2, sticky="w")
+        autor_fecha_nacimiento = DateEntry(frame_form_autor, width=12, date_pattern="dd/mm/yyyy")
+        autor_fecha_nacimiento.grid(row=3, column=1, padx=5, pady=2, sticky="w")
+
+        # Botones
+        frame_botones_autor = ttk.Frame(frame_form_autor)
+        frame_botones_autor.grid(row=4, column=0, columnspan=2, pady=10)
+        ttk.Button(frame_botones_autor, text="Guardar", command=guardar_autor).pack(side="left", padx=5)
+        ttk.Button(frame_botones_autor, text="Eliminar", command=eliminar_autor).pack(side="left", padx=5)
+        ttk.Button(frame_botones_autor, text="Limpiar", command=limpiar_autor).pack(side="left", padx=5)
+        ttk.Button(frame_botones_autor, text="Exportar a Excel", command=exportar_autores_excel).pack(side="left", padx=5)
+        ttk.Button(frame_botones_autor, text="Exportar a PDF", command=exportar_autores_pdf).pack(side="left", padx=5)
+
+        # Lista
+        frame_lista_autores = ttk.LabelFrame(tab_autores, text="Lista de Autores", padding=10)
+        frame_lista_autores.pack(fill="both", expand=True, padx=10, pady=5)
+        frame_busqueda_autores = ttk.Frame(frame_lista_autores)
+        frame_busqueda_autores.pack(side="top", fill="x", pady=(0, 5))
+        ttk.Label(frame_busqueda_autores, text="Buscar:").pack(side="left", padx=5)
+        busqueda_autores = ttk.Entry(frame_busqueda_autores, width=40)
+        busqueda_autores.pack(side="left", padx=5)
+        # Una caja por columna, debajo de cada encabezado: filtran (y los encabezados ordenan) en memoria
+        frame_filtros_autores = ttk.Frame(frame_lista_autores)
+        frame_filtros_autores.pack(side="top", fill="x", pady=(0, 2))
+        columns_autores = ("ID", "Nombre", "Nacionalidad", "Fecha Nacimiento")
+        tree_autores = ttk.Treeview(frame_lista_autores, columns=columns_autores, show="headings", height=12)
+        for col in columns_autores:
+            tree_autores.heading(col, text=col)
+        tree_autores.column("ID", width=50)
+        tree_autores.column("Nombre", width=250)
+        tree_autores.column("Nacionalidad", width=150)
+        tree_autores.column("Fecha Nacimiento", width=120)
+        scroll_autores = ttk.Scrollbar(frame_lista_autores, orient="vertical")
+        scroll_autores.pack(side="right", fill="y")
+        tree_autores.pack(side="left", fill="both", expand=True)
+        lista_autores = ListaVirtual(tree_autores, scroll_autores, ConsultaPaginada(**consultas.LISTAS["autores"]),
+                                    ejecutar_en_bd, formatear_autor, nombre="autores")
+        lista_autores.activar_orden_local(frame_filtros_autores)
+        busqueda.BusquedaDiferida(busqueda_autores, lambda texto: buscar_en_lista(lista_autores, "autores", texto))
+        actualizar_lista_autores()
+
+    # INTERFAZ ESTADÍSTICAS
+    def construir_estadisticas():
+        """Arma la pestaña Estadísticas la primera vez que se abre"""
+        global estadisticas_mes, label_prestamos_mes, label_devoluciones_mes, label_prestamos_activos
+        global label_usuarios_activos, canvas_libros, canvas_generos, canvas_usuarios, canvas_circulacion
+        global graficos_estadisticas
+        frame_est_controles = ttk.Frame(tab_estadisticas)
+        frame_est_controles.pack(fill="x", padx=10, pady=5)
+        ttk.Label(frame_est_controles, text="Mes:").pack(side="left", padx=5)
+        meses = meses_recientes()
+        estadisticas_mes = ttk.Combobox(frame_est_controles, values=meses, width=10, state="readonly")
+        estadisticas_mes.set(meses[0])
+        estadisticas_mes.pack(side="left", padx=5)
+        estadisticas_mes.bind("<<ComboboxSelected>>", actualizar_estadisticas)
+        ttk.Button(frame_est_controles, text="Actualizar", command=actualizar_estadisticas).pack(side="left", padx=5)
+        ttk.Button(frame_est_controles, text="Recalcular", command=recalcular_estadisticas).pack(side="left", padx=5)
+
+        frame_est_totales = ttk.Frame(tab_estadisticas)
+        frame_est_totales.pack(fill="x", padx=10, pady=5)
+        label_prestamos_mes = ttk.Label(frame_est_totales, font=("Arial", 11, "bold"))
+        label_devoluciones_mes = ttk.Label(frame_est_totales, font=("Arial", 11, "bold"))
+        label_prestamos_activos = ttk.Label(frame_est_totales, font=("Arial", 11, "bold"))
+        label_usuarios_activos = ttk.Label(frame_est_totales, font=("Arial", 11, "bold"))
+        for label in (label_prestamos_mes, label_devoluciones_mes, label_prestamos_activos, label_usuarios_activos):
+            label.pack(side="left", padx=15)
+
+        frame_est_graficos = ttk.Frame(tab_estadisticas)
+        frame_est_graficos.pack(fill="both", expand=True, padx=10, pady=5)
+        frame_est_graficos.columnconfigure((0, 1), weight=1, uniform="graficos")
+        frame_est_graficos.rowconfigure((0, 1), weight=1, uniform="graficos")
+        graficos_estadisticas = {}
+        canvases = []
+        for n, titulo in enumerate(("Libros más prestados del mes", "Préstamos por género del mes",
+                                    "Usuarios con más préstamos activos",
+                                    "Circulación diaria (azul: préstamos, naranja: devoluciones)")):
+            frame_grafico = ttk.LabelFrame(frame_est_graficos, text=titulo, padding=5)
+            frame_grafico.grid(row=n // 2, column=n % 2, sticky="nsew", padx=5, pady=5)
+            canvas = tk.Canvas(frame_grafico, background="white", highlightthickness=0, height=200)
+            canvas.pack(fill="both", expand=True)
+            canvas.bind("<Configure>", lambda e: redibujar_grafico(e.widget))
+            canvases.append(canvas)
+        canvas_libros, canvas_generos, canvas_usuarios, canvas_circulacion = canvases
+        actualizar_estadisticas()
+
+    # INTERFAZ EXPORTACIONES
+    frame_respaldo = ttk.LabelFrame(tab_exportaciones, text="Respaldo completo", padding=10)
+    frame_respaldo.pack(fill="x", padx=10, pady=5)
+    ttk.Label(frame_respaldo, text="Formatos:").pack(side="left", padx=5)
+    formatos_respaldo = {}
+    for formato, texto in (("excel", "Excel"), ("pdf", "PDF"), ("csv", "CSV")):
+        formatos_respaldo[formato] = tk.BooleanVar(value=True)
+        ttk.Checkbutton(frame_respaldo, text=texto, variable=formatos_respaldo[formato]).pack(side="left", padx=5)
+    ttk.Button(frame_respaldo, text="Exportar todo...", command=exportar_todo).pack(side="left", padx=15)
+
+    frame_lista_exportaciones = ttk.LabelFrame(tab_exportaciones, text="Exportaciones", padding=10)
+    frame_lista_exportaciones.pack(fill="both", expand=True, padx=10, pady=5)
+    frame_botones_exportaciones = ttk.Frame(frame_lista_exportaciones)
+    frame_botones_exportaciones.pack(side="top", fill="x", pady=(0, 5))
+    ttk.Button(frame_botones_exportaciones, text="Cancelar seleccionadas",
+               command=cancelar_exportacion).pack(side="left", padx=5)
+    ttk.Button(frame_botones_exportaciones, text="Cancelar todas",
+               command=lambda: cola_exportaciones.cancelar_todo()).pack(side="left", padx=5)
+    ttk.Button(frame_botones_exportaciones, text="Quitar terminadas",
+               command=limpiar_exportaciones).pack(side="left", padx=5)
+    columns_exportaciones = ("ID", "Exportación", "Estado", "Progreso", "Filas/s", "Restante", "Archivo")
+    tree_exportaciones = ttk.Treeview(frame_lista_exportaciones, columns=columns_exportaciones,
+                                      show="headings", height=12)
+    for col in columns_exportaciones:
+        tree_exportaciones.heading(col, text=col)
+    tree_exportaciones.column("ID", width=40)
+    tree_exportaciones.column("Exportación", width=150)
+    tree_exportaciones.column("Estado", width=90)
+    tree_exportaciones.column("Progreso", width=160)
+    tree_exportaciones.column("Filas/s", width=80)
+    tree_exportaciones.column("Restante", width=70)
+    tree_exportaciones.column("Archivo", width=400)
+    scroll_exportaciones = ttk.Scrollbar(frame_lista_exportaciones, orient="vertical",
+                                         command=tree_exportaciones.yview)
+    tree_exportaciones.configure(yscrollcommand=scroll_exportaciones.set)
+    scroll_exportaciones.pack(side="right", fill="y")
+    tree_exportaciones.pack(side="left", fill="both", expand=True)
+
+    # INTERFAZ DIAGNÓSTICO
+    def construir_diagnostico():
+        """Arma la pestaña Diagnóstico la primera vez que se abre"""
+        global diag_umbral, tree_diag_consultas, tree_diag_interfaz, tree_diag_eventos
+        global texto_diag_detalle, detalles_diagnostico
+        frame_diag_controles = ttk.Frame(tab_diagnostico)
+        frame_diag_controles.pack(fill="x", padx=10, pady=5)
+        ttk.Label(frame_diag_controles, text="Consulta lenta desde (ms):").pack(side="left", padx=5)
+        diag_umbral = ttk.Entry(frame_diag_controles, width=8)
+        diag_umbral.insert(0, f"{METRICAS.umbral_lenta * 1000:.0f}")
+        diag_umbral.pack(side="left", padx=5)
+        diag_umbral.configure(validate="key", validatecommand=vcmd)
+        ttk.Button(frame_diag_controles, text="Aplicar", command=aplicar_umbral_lenta).pack(side="left", padx=5)
+        ttk.Button(frame_diag_controles, text="Actualizar", command=actualizar_diagnostico).pack(side="left", padx=15)
+        ttk.Button(frame_diag_controles, text="Guardar métricas", command=guardar_metricas).pack(side="left", padx=5)
+        ttk.Button(frame_diag_controles, text="Reiniciar", command=reiniciar_metricas).pack(side="left", padx=5)
+
+        frame_diag_consultas = ttk.LabelFrame(tab_diagnostico, text="Sentencias SQL", padding=10)
+        frame_diag_consultas.pack(fill="both", expand=True, padx=10, pady=5)
+        columns_diag_consultas = ("Consulta", "Llamadas", "Filas", "Errores", "Lentas", "Prom. ms", "p95 ms", "Máx. ms")
+        tree_diag_consultas = ttk.Treeview(frame_diag_consultas, columns=columns_diag_consultas,
+                                           show="headings", height=8)
+        for col in columns_diag_consultas:
+            tree_diag_consultas.heading(col, text=col)
+            tree_diag_consultas.column(col, width=80, anchor="e")
+        tree_diag_consultas.column("Consulta", width=250, anchor="w")
+        scroll_diag_consultas = ttk.Scrollbar(frame_diag_consultas, orient="vertical",
+                                              command=tree_diag_consultas.yview)
+        tree_diag_consultas.configure(yscrollcommand=scroll_diag_consultas.set)
+        scroll_diag_consultas.pack(side="right", fill="y")
+        tree_diag_consultas.pack(side="left", fill="both", expand=True)
+
+        frame_diag_inferior = ttk.Frame(tab_diagnostico)
+        frame_diag_inferior.pack(fill="both", expand=True, padx=10, pady=5)
+        frame_diag_interfaz = ttk.LabelFrame(frame_diag_inferior, text="Interfaz y exportaciones", padding=10)
+        frame_diag_interfaz.pack(side="left", fill="both", expand=True, padx=(0, 5))
+        columns_diag_interfaz = ("Tipo", "Nombre", "Veces", "Filas", "Prom. ms", "p95 ms", "Máx. ms")
+        tree_diag_interfaz = ttk.Treeview(frame_diag_interfaz, columns=columns_diag_interfaz,
+                                          show="headings", height=8)
+        for col in columns_diag_interfaz:
+            tree_diag_interfaz.heading(col, text=col)
+            tree_diag_interfaz.column(col, width=70, anchor="e")
+        tree_diag_interfaz.column("Tipo", width=90, anchor="w")
+        tree_diag_interfaz.column("Nombre", width=110, anchor="w")
+        tree_diag_interfaz.pack(fill="both", expand=True)
+
+        frame_diag_eventos = ttk.LabelFrame(frame_diag_inferior, text="Eventos recientes", padding=10)
+        frame_diag_eventos.pack(side="left", fill="both", expand=True, padx=(5, 0))
+        detalles_diagnostico = {}
+        tree_diag_eventos = ttk.Treeview(frame_diag_eventos, columns=("Hora", "Tipo", "Detalle"),
+                                         show="headings", height=5)
+        for col, ancho in (("Hora", 70), ("Tipo", 120), ("Detalle", 300)):
+            tree_diag_eventos.heading(col, text=col)
+            tree_diag_eventos.column(col, width=ancho)
+        tree_diag_eventos.pack(fill="both", expand=True)
+        tree_diag_eventos.bind("<<TreeviewSelect>>", mostrar_detalle_evento)
+        texto_diag_detalle = tk.Text(frame_diag_eventos, height=6, wrap="none", font=("Courier", 9))
+        texto_diag_detalle.pack(fill="both", expand=True, pady=(5, 0))
+        actualizar_diagnostico()
+
+
+    def cerrar_aplicacion():
+        if cola_exportaciones.activos and not messagebox.askyesno(
+                "Exportaciones en curso", "Hay exportaciones sin terminar. ¿Cancelarlas y salir?"):
+            return
+        cola_exportaciones.cerrar()
+        tareas.cerrar()
+        vigilante.detener()
+        METRICAS.volcar()
+        # Lo que no se llegó a enviar queda en la cola local para la próxima sesión
+        sincronizador.detener()
+        cola_escrituras.cerrar()
+        db.disconnect()
+        root.destroy()
+
+
+    root.protocol("WM_DELETE_WINDOW", cerrar_aplicacion)
+
+    # Detección de bloqueos de la ventana y métricas periódicas
+    vigilante = VigilanteBucle(root)
+    root.after(INTERVALO_DIAGNOSTICO, refrescar_diagnostico_periodico)
+    root.after(INTERVALO_VOLCADO, volcar_metricas_periodico)
+
+    # Usuarios, Préstamos, Autores, Estadísticas y Diagnóstico se arman (y cargan su lista) al elegirlas
+    pestañas_pendientes = {str(tab_usuarios): construir_usuarios, str(tab_prestamos): construir_prestamos,
+                           str(tab_autores): construir_autores, str(tab_estadisticas): construir_estadisticas,
+                           str(tab_diagnostico): construir_diagnostico}
+    notebook.bind("<<NotebookTabChanged>>", al_cambiar_pestaña)
+
+    # Carga inicial de datos: en segundo plano, cuando la ventana ya se ve
+    root.bind("<Map>", al_mostrar_ventana)
+
+    root.mainloop()
+    if MEDIR_ARRANQUE:
+        sys.exit(1 if arranque_excedido() else 0)
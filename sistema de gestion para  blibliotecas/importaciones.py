@@ -0,0 +1,244 @@
+import csv
+import os
+from importlib.util import find_spec
+from itertools import islice
+
+import mysql.connector
+
+from paginacion import normalizar
+from validaciones import Validaciones
+
+# openpyxl se importa recién al leer el primer XLSX
+OPENPYXL_DISPONIBLE = find_spec("openpyxl") is not None
+
+# Filas que se validan e insertan juntas, en una sola transacción
+TAMANO_LOTE_IMPORTACION = 1000
+
+# Por tabla: columnas en el orden del INSERT, nombres aceptados en el
+# encabezado del archivo (sin acentos ni mayúsculas) y largo máximo de
+# cada columna según el esquema
+IMPORTACIONES = {
+    "libros": {
+        "columnas": ("titulo", "autor", "genero", "año_publicacion", "isbn"),
+        "alias": {
+            "titulo": "titulo", "autor": "autor", "genero": "genero",
+            "ano": "año_publicacion", "anio": "año_publicacion",
+            "ano publicacion": "año_publicacion", "anio publicacion": "año_publicacion",
+            "isbn": "isbn",
+        },
+        "largos": {"titulo": 100, "autor": 100, "genero": 50, "isbn": 20},
+    },
+    "usuarios": {
+        "columnas": ("nombre", "email", "telefono"),
+        "alias": {
+            "nombre": "nombre", "email": "email", "correo": "email",
+            "telefono": "telefono", "tel": "telefono",
+        },
+        "largos": {"nombre": 100, "email": 100, "telefono": 15},
+    },
+}
+
+
+def _texto(valor):
+    """Valor de una celda como texto; los números enteros de Excel pierden el .0"""
+    if valor is None:
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def leer_filas(nombre_archivo):
+    """Recorre un CSV o XLSX devolviendo (encabezados, iterador de filas)
+
+    Los archivos se leen por partes; un XLSX se abre en modo solo lectura.
+    """
+    if os.path.splitext(nombre_archivo)[1].lower() in (".xlsx", ".xlsm"):
+        if not OPENPYXL_DISPONIBLE:
+            raise ValueError("Instala 'openpyxl': pip install openpyxl")
+        from openpyxl import load_workbook
+
+        wb = load_workbook(nombre_archivo, read_only=True, data_only=True)
+        filas = wb.worksheets[0].iter_rows(values_only=True)
+        encabezados = [_texto(valor) for valor in next(filas, ())]
+
+        def recorrer():
+            try:
+                for fila in filas:
+                    yield [_texto(valor) for valor in fila]
+            finally:
+                wb.close()
+        return encabezados, recorrer()
+
+    archivo = open(nombre_archivo, newline="", encoding="utf-8-sig")
+    try:
+        dialecto = csv.Sniffer().sniff(archivo.read(4096), delimiters=",;\t")
+    except csv.Error:
+        dialecto = csv.excel
+    archivo.seek(0)
+    lector = csv.reader(archivo, dialecto)
+    encabezados = [_texto(valor) for valor in next(lector, [])]
+
+    def recorrer():
+        with archivo:
+            for fila in lector:
+                yield [_texto(valor) for valor in fila]
+    return encabezados, recorrer()
+
+
+def _mapear_columnas(tabla, encabezados):
+    """Posición en el archivo de cada columna de la tabla (None si falta)"""
+    alias = IMPORTACIONES[tabla]["alias"]
+    posiciones = {}
+    for n, encabezado in enumerate(encabezados):
+        columna = alias.get(" ".join(normalizar(encabezado).replace("_", " ").split()))
+        if columna and columna not in posiciones:
+            posiciones[columna] = n
+    return [posiciones.get(columna) for columna in IMPORTACIONES[tabla]["columnas"]]
+
+
+def _validar_lote(bd, tabla, lote):
+    """Separa el lote en ([(fila, valores a insertar)], [(fila, motivo)] rechazadas)"""
+    largos = IMPORTACIONES[tabla]["largos"]
+    columnas = IMPORTACIONES[tabla]["columnas"]
+    if tabla == "libros":
+        errores = [Validaciones.error_libro(titulo, autor, año) for _, (titulo, autor, _, año, _) in lote]
+    else:
+        errores = [Validaciones.error_usuario(*valores) for _, valores in lote]
+
+    for n, (_, valores) in enumerate(lote):
+        if errores[n] is None:
+            for columna, valor in zip(columnas, valores):
+                if columna in largos and len(valor) > largos[columna]:
+                    errores[n] = f"{columna} supera los {largos[columna]} caracteres"
+                    break
+
+    if tabla == "usuarios":
+        # El email es único: se revisan juntos los del lote contra la tabla y entre sí
+        emails = [valores[1] for (_, valores), error in zip(lote, errores) if error is None]
+        existentes = set()
+        if emails:
+            marcas = ", ".join(["%s"] * len(emails))
+            success, result = bd.execute_query(f"SELECT email FROM usuarios WHERE email IN ({marcas})",
+                                               tuple(emails))
+            if not success:
+                raise mysql.connector.Error(result)
+            existentes = {normalizar(email) for (email,) in result}
+        for n, (_, valores) in enumerate(lote):
+            if errores[n] is None:
+                email = normalizar(valores[1])
+                if email in existentes:
+                    errores[n] = f"El email {valores[1]} ya está registrado"
+                existentes.add(email)
+
+    aceptadas, rechazadas = [], []
+    for (fila, valores), error in zip(lote, errores):
+        if error:
+            rechazadas.append((fila, error))
+        else:
+            # Vacíos como NULL, igual que los formularios
+            aceptadas.append((fila, tuple(
+                (int(valor) if columna == "año_publicacion" else valor) if valor else None
+                for columna, valor in zip(columnas, valores))))
+    return aceptadas, rechazadas
+
+
+def _insertar_lote(bd, query, valores):
+    """Inserta el lote en una transacción; devuelve [(posición, motivo)] de las filas que fallaron
+
+    executemany arma un único INSERT de varias filas. Si el lote falla
+    entero (p. ej. un email duplicado que otro usuario cargó recién) se
+    repite fila por fila para quedarse con las que sí se pueden insertar.
+    """
+    with bd.conexion() as conexion:
+        cursor = conexion.cursor()
+        try:
+            conexion.start_transaction()
+            try:
+                cursor.executemany(query, valores)
+                conexion.commit()
+                return []
+            except (mysql.connector.IntegrityError, mysql.connector.DataError):
+                conexion.rollback()
+
+            fallidas = []
+            conexion.start_transaction()
+            for n, fila in enumerate(valores):
+                try:
+                    cursor.execute(query, fila)
+                except (mysql.connector.IntegrityError, mysql.connector.DataError) as error:
+                    fallidas.append((n, str(error)))
+            conexion.commit()
+            return fallidas
+        except mysql.connector.Error:
+            # Que la conexión no vuelva al pool con una transacción abierta
+            try:
+                conexion.rollback()
+            except mysql.connector.Error:
+                pass
+            raise
+        finally:
+            cursor.close()
+
+
+def importar(bd, tabla, nombre_archivo, tamano_lote=TAMANO_LOTE_IMPORTACION, al_avanzar=None):
+    """Importa libros o usuarios desde un CSV/XLSX por lotes
+
+    Las filas que no pasan las validaciones, o que la base rechaza, se
+    escriben con su motivo en <archivo>_rechazados.csv. al_avanzar(leidas,
+    importadas, rechazadas) se llama después de cada lote. Devuelve
+    (success, resumen) con resumen = (leidas, importadas, rechazadas,
+    archivo de rechazadas o None) o el mensaje de error.
+    """
+    if tabla not in IMPORTACIONES:
+        return False, f"No se puede importar la tabla {tabla}"
+    columnas = IMPORTACIONES[tabla]["columnas"]
+    query = f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join(['%s'] * len(columnas))})"
+
+    try:
+        encabezados, filas = leer_filas(nombre_archivo)
+    except Exception as e:
+        return False, f"No se pudo leer el archivo: {e}"
+    posiciones = _mapear_columnas(tabla, encabezados)
+    faltantes = [columna for columna, posicion in zip(columnas, posiciones)
+                 if posicion is None and columna in ("titulo", "autor", "nombre", "email")]
+    if faltantes:
+        filas.close()
+        return False, f"Faltan columnas en el archivo: {', '.join(faltantes)}"
+
+    archivo_rechazadas = os.path.splitext(nombre_archivo)[0] + "_rechazados.csv"
+    salida = escritor = None
+    leidas = importadas = rechazadas = 0
+    try:
+        while True:
+            lote = [(fila, tuple(fila[p] if p is not None and p < len(fila) else "" for p in posiciones))
+                    for fila in islice(filas, tamano_lote)]
+            # Las filas totalmente vacías (típicas al final de un Excel) no cuentan
+            lote = [(fila, valores) for fila, valores in lote if any(fila)]
+            if not lote:
+                break
+            aceptadas, rechazos = _validar_lote(bd, tabla, lote)
+            if aceptadas:
+                fallidas = _insertar_lote(bd, query, [valores for _, valores in aceptadas])
+                bd.invalidar(tabla)
+                rechazos.extend((aceptadas[n][0], motivo) for n, motivo in fallidas)
+                importadas += len(aceptadas) - len(fallidas)
+
+            if rechazos:
+                if escritor is None:
+                    salida = open(archivo_rechazadas, "w", newline="", encoding="utf-8-sig")
+                    escritor = csv.writer(salida)
+                    escritor.writerow(list(encabezados) + ["motivo"])
+                escritor.writerows(list(fila) + [motivo] for fila, motivo in rechazos)
+            leidas += len(lote)
+            rechazadas += len(rechazos)
+            if al_avanzar:
+                al_avanzar(leidas, importadas, rechazadas)
+    except mysql.connector.Error as error:
+        return False, f"Error al importar (se guardaron {importadas} filas): {error}"
+    finally:
+        filas.close()
+        if salida is not None:
+            salida.close()
+
+    return True, (leidas, importadas, rechazadas, archivo_rechazadas if escritor is not None else None)
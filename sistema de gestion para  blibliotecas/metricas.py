@@ -0,0 +1,365 @@
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler
+
+CARPETA_METRICAS = os.path.join(os.path.expanduser("~"), ".biblioteca_personal")
+ARCHIVO_LENTAS = os.path.join(CARPETA_METRICAS, "consultas_lentas.log")
+# Tamaño máximo del registro de consultas lentas y copias anteriores que se conservan
+BYTES_REGISTRO = 1024 * 1024
+COPIAS_REGISTRO = 3
+
+# Límites superiores (segundos) de las cubetas de los histogramas de latencia
+CUBETAS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Una sentencia que tarda más que esto va al registro de consultas lentas
+UMBRAL_LENTA = 0.5
+# Consultas lentas, errores y bloqueos recientes que se guardan para la pestaña Diagnóstico
+MAXIMO_RECIENTES = 100
+# Largo máximo del SQL y de los parámetros que se guardan de una consulta lenta
+LARGO_TEXTO = 500
+
+# Vigilancia del bucle de Tk: cada cuánto se espera un latido y cuánto atraso es un bloqueo
+INTERVALO_VIGILANCIA_MS = 100
+UMBRAL_BLOQUEO = 0.25
+
+PATRON_TABLA = re.compile(r"\b(?:FROM|INTO|UPDATE|CALL)\s+`?(\w+)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def _etiqueta_texto(query):
+    verbo = query.split(None, 1)[0].lower() if query.strip() else "vacia"
+    tabla = PATRON_TABLA.search(query)
+    return f"{verbo} {tabla.group(1).lower()}" if tabla else verbo
+
+
+def etiqueta(query):
+    """Nombre de una Consulta registrada, o "verbo tabla" para el SQL armado a mano
+
+    Las consultas de las listas cambian de texto según la página; así
+    quedan agrupadas por tabla y no crece sin límite la cantidad de series.
+    """
+    nombre = getattr(query, "nombre", None)
+    return nombre if nombre is not None else _etiqueta_texto(str(query))
+
+
+def _recortar(texto):
+    texto = " ".join(str(texto).split())
+    return texto if len(texto) <= LARGO_TEXTO else texto[:LARGO_TEXTO] + "..."
+
+
+# HISTOGRAMAS
+class Histograma:
+    """Cantidad de mediciones por cubeta de CUBETAS (la última, sin límite), más suma y máximo"""
+
+    def __init__(self):
+        self.cubetas = [0] * (len(CUBETAS) + 1)
+        self.cantidad = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+
+    def observar(self, segundos):
+        n = 0
+        while n < len(CUBETAS) and segundos > CUBETAS[n]:
+            n += 1
+        self.cubetas[n] += 1
+        self.cantidad += 1
+        self.suma += segundos
+        if segundos > self.maximo:
+            self.maximo = segundos
+
+    def percentil(self, fraccion):
+        """Límite de la cubeta donde cae el percentil (una cota, no el valor exacto)"""
+        if not self.cantidad:
+            return 0.0
+        objetivo = fraccion * self.cantidad
+        acumulado = 0
+        for n, cantidad in enumerate(self.cubetas):
+            acumulado += cantidad
+            if acumulado >= objetivo:
+                return min(CUBETAS[n], self.maximo) if n < len(CUBETAS) else self.maximo
+        return self.maximo
+
+    @property
+    def promedio(self):
+        return self.suma / self.cantidad if self.cantidad else 0.0
+
+
+class Serie:
+    """Histograma de una sentencia o de una operación de la interfaz, con filas y errores"""
+
+    def __init__(self):
+        self.histograma = Histograma()
+        self.filas = 0
+        self.errores = 0
+        self.lentas = 0
+
+    def resumen(self):
+        h = self.histograma
+        return {"llamadas": h.cantidad, "filas": self.filas, "errores": self.errores, "lentas": self.lentas,
+                "ms_promedio": h.promedio * 1000, "ms_p50": h.percentil(0.5) * 1000,
+                "ms_p95": h.percentil(0.95) * 1000, "ms_maximo": h.maximo * 1000,
+                "cubetas": list(h.cubetas), "segundos_total": h.suma}
+
+
+# REGISTRO DE MÉTRICAS
+class Metricas:
+    """Tiempos de las sentencias SQL y de la interfaz, consultas lentas, errores y bloqueos de Tk
+
+    Se puede usar desde cualquier hilo. Las consultas se agrupan por
+    etiqueta(query); las operaciones de la interfaz por (tipo, nombre),
+    p. ej. ("treeview", "libros") o ("exportacion", "libros_pdf").
+    """
+
+    def __init__(self, umbral_lenta=UMBRAL_LENTA, archivo_lentas=ARCHIVO_LENTAS):
+        self.umbral_lenta = umbral_lenta
+        self.archivo_lentas = archivo_lentas
+        self._lock = threading.Lock()
+        self._registro = None
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.consultas = {}
+            self.interfaz = {}
+            self.lentas = deque(maxlen=MAXIMO_RECIENTES)
+            self.errores = deque(maxlen=MAXIMO_RECIENTES)
+            self.bloqueos = deque(maxlen=MAXIMO_RECIENTES)
+            self.desde = time.time()
+
+    def configurar(self, umbral_lenta=None, archivo_lentas=None):
+        """Cambia el umbral de consulta lenta (segundos) o el archivo del registro"""
+        if umbral_lenta is not None:
+            self.umbral_lenta = umbral_lenta
+        if archivo_lentas is not None and archivo_lentas != self.archivo_lentas:
+            with self._lock:
+                self.archivo_lentas = archivo_lentas
+                if self._registro is not None:
+                    for handler in self._registro.handlers[:]:
+                        self._registro.removeHandler(handler)
+                        handler.close()
+                    self._registro = None
+
+    # ---- Registro ----
+    def registrar_consulta(self, query, segundos, filas=0, error=None, parametros=None):
+        nombre = etiqueta(query)
+        lenta = segundos >= self.umbral_lenta
+        with self._lock:
+            serie = self.consultas.get(nombre)
+            if serie is None:
+                serie = self.consultas[nombre] = Serie()
+            serie.histograma.observar(segundos)
+            serie.filas += filas
+            if error is not None:
+                serie.errores += 1
+                self.errores.append((time.time(), nombre, str(error)))
+            if lenta:
+                serie.lentas += 1
+                self.lentas.append((time.time(), nombre, segundos, _recortar(query),
+                                    _recortar(parametros) if parametros else ""))
+        if lenta:
+            self._escribir_lenta(nombre, segundos, filas, query, parametros, error)
+
+    def registrar_interfaz(self, tipo, nombre, segundos, filas=0):
+        with self._lock:
+            serie = self.interfaz.get((tipo, nombre))
+            if serie is None:
+                serie = self.interfaz[(tipo, nombre)] = Serie()
+            serie.histograma.observar(segundos)
+            serie.filas += filas
+
+    def registrar_bloqueo(self, segundos, pila=None):
+        """Un atraso del bucle de Tk; pila es lo que ejecutaba el hilo de Tk mientras tanto"""
+        self.registrar_interfaz("bloqueo", "tk", segundos)
+        with self._lock:
+            self.bloqueos.append((time.time(), segundos, pila or ""))
+
+    def _escribir_lenta(self, nombre, segundos, filas, query, parametros, error):
+        try:
+            registro = self._registro_lentas()
+            registro.warning("%.1f ms | %s | %d filas%s | %s | %s", segundos * 1000, nombre, filas,
+                             " | ERROR" if error is not None else "", _recortar(query),
+                             _recortar(parametros) if parametros else "")
+        except OSError:
+            # Sin permiso de escritura: la consulta lenta igual queda en memoria
+            pass
+
+    def _registro_lentas(self):
+        with self._lock:
+            if self._registro is None:
+                os.makedirs(os.path.dirname(self.archivo_lentas), exist_ok=True)
+                registro = logging.getLogger(f"biblioteca.consultas_lentas.{id(self)}")
+                registro.propagate = False
+                registro.setLevel(logging.WARNING)
+                handler = RotatingFileHandler(self.archivo_lentas, maxBytes=BYTES_REGISTRO,
+                                              backupCount=COPIAS_REGISTRO, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(asctime)s | %(process)d | %(message)s"))
+                registro.addHandler(handler)
+                self._registro = registro
+            return self._registro
+
+    # ---- Consulta ----
+    def resumen_consultas(self):
+        """[(etiqueta, resumen)] de las sentencias, las de más tiempo total primero"""
+        with self._lock:
+            filas = [(nombre, serie.resumen()) for nombre, serie in self.consultas.items()]
+        return sorted(filas, key=lambda fila: fila[1]["segundos_total"], reverse=True)
+
+    def resumen_interfaz(self):
+        """[((tipo, nombre), resumen)] de las operaciones de la interfaz, ordenadas por tipo"""
+        with self._lock:
+            filas = [(clave, serie.resumen()) for clave, serie in self.interfaz.items()]
+        return sorted(filas)
+
+    def recientes(self):
+        """(consultas lentas, errores, bloqueos) recientes, los últimos primero"""
+        with self._lock:
+            return list(reversed(self.lentas)), list(reversed(self.errores)), list(reversed(self.bloqueos))
+
+    def a_dict(self):
+        lentas, errores, bloqueos = self.recientes()
+        fecha = lambda t: datetime.fromtimestamp(t).isoformat(timespec="seconds")
+        return {
+            "desde": fecha(self.desde),
+            "generado": fecha(time.time()),
+            "umbral_lenta_ms": self.umbral_lenta * 1000,
+            "cubetas_segundos": list(CUBETAS),
+            "consultas": dict(self.resumen_consultas()),
+            "interfaz": {f"{tipo}:{nombre}": resumen for (tipo, nombre), resumen in self.resumen_interfaz()},
+            "consultas_lentas": [{"fecha": fecha(t), "consulta": nombre, "ms": segundos * 1000,
+                                  "sql": sql, "parametros": parametros}
+                                 for t, nombre, segundos, sql, parametros in lentas],
+            "errores": [{"fecha": fecha(t), "consulta": nombre, "error": error} for t, nombre, error in errores],
+            "bloqueos_tk": [{"fecha": fecha(t), "ms": segundos * 1000, "pila": pila}
+                            for t, segundos, pila in bloqueos],
+        }
+
+    def a_prometheus(self):
+        """Las métricas en el formato de texto de Prometheus (para node_exporter o similar)"""
+        lineas = []
+
+        def histograma(metrica, ayuda, series):
+            lineas.append(f"# HELP {metrica} {ayuda}")
+            lineas.append(f"# TYPE {metrica} histogram")
+            for etiquetas, resumen in series:
+                acumulado = 0
+                for limite, cantidad in zip(CUBETAS + ("+Inf",), resumen["cubetas"]):
+                    acumulado += cantidad
+                    lineas.append(f'{metrica}_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+                lineas.append(f"{metrica}_sum{{{etiquetas}}} {resumen['segundos_total']:.6f}")
+                lineas.append(f"{metrica}_count{{{etiquetas}}} {resumen['llamadas']}")
+
+        def contador(metrica, ayuda, series, campo):
+            lineas.append(f"# HELP {metrica} {ayuda}")
+            lineas.append(f"# TYPE {metrica} counter")
+            for etiquetas, resumen in series:
+                lineas.append(f"{metrica}{{{etiquetas}}} {resumen[campo]}")
+
+        consultas = [(f'consulta="{_escapar(nombre)}"', resumen) for nombre, resumen in self.resumen_consultas()]
+        interfaz = [(f'tipo="{_escapar(tipo)}",nombre="{_escapar(nombre)}"', resumen)
+                    for (tipo, nombre), resumen in self.resumen_interfaz()]
+        histograma("biblioteca_consulta_segundos", "Latencia de las sentencias SQL.", consultas)
+        contador("biblioteca_consulta_filas_total", "Filas leídas o modificadas.", consultas, "filas")
+        contador("biblioteca_consulta_errores_total", "Sentencias que fallaron.", consultas, "errores")
+        contador("biblioteca_consultas_lentas_total", "Sentencias sobre el umbral de lentitud.", consultas, "lentas")
+        histograma("biblioteca_interfaz_segundos", "Duración de operaciones de la interfaz.", interfaz)
+        contador("biblioteca_interfaz_filas_total", "Filas mostradas o exportadas.", interfaz, "filas")
+        return "\n".join(lineas) + "\n"
+
+    def volcar(self, carpeta=CARPETA_METRICAS):
+        """Escribe metricas.json y metricas.prom en la carpeta; devuelve (success, mensaje)"""
+        try:
+            os.makedirs(carpeta, exist_ok=True)
+            rutas = []
+            for nombre, contenido in (("metricas.json", json.dumps(self.a_dict(), indent=2, ensure_ascii=False)),
+                                      ("metricas.prom", self.a_prometheus())):
+                ruta = os.path.join(carpeta, nombre)
+                temporal = ruta + ".tmp"
+                with open(temporal, "w", encoding="utf-8") as archivo:
+                    archivo.write(contenido)
+                # Quien lea el archivo (p. ej. un recolector) nunca lo ve a medio escribir
+                os.replace(temporal, ruta)
+                rutas.append(ruta)
+        except OSError as error:
+            return False, f"No se pudieron guardar las métricas: {error}"
+        return True, f"Métricas guardadas en {rutas[0]} y {rutas[1]}"
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+METRICAS = Metricas()
+
+
+class Cronometro:
+    """with Cronometro(tipo, nombre) as c: ... ; c.filas = n — registra la duración en la interfaz"""
+
+    def __init__(self, tipo, nombre, metricas=METRICAS):
+        self.tipo = tipo
+        self.nombre = nombre
+        self.metricas = metricas
+        self.filas = 0
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *error):
+        self.metricas.registrar_interfaz(self.tipo, self.nombre, time.perf_counter() - self.inicio, self.filas)
+        return False
+
+
+# VIGILANCIA DEL BUCLE DE TK
+class VigilanteBucle:
+    """Detecta cuándo el hilo de Tk deja de atender eventos (la ventana se "congela")
+
+    Un latido con root.after mide cuánto se atrasa respecto de lo esperado;
+    un hilo aparte, si el latido no llega a tiempo, guarda la pila del hilo
+    de Tk en ese momento para saber qué lo tenía ocupado.
+    """
+
+    def __init__(self, root, metricas=METRICAS, intervalo_ms=INTERVALO_VIGILANCIA_MS, umbral=UMBRAL_BLOQUEO):
+        self.root = root
+        self.metricas = metricas
+        self.intervalo = intervalo_ms / 1000
+        self.intervalo_ms = intervalo_ms
+        self.umbral = umbral
+        self._hilo_tk = threading.get_ident()
+        self._esperado = time.perf_counter() + self.intervalo
+        self._pila = None
+        self._detenido = threading.Event()
+        self._lock = threading.Lock()
+        self.root.after(intervalo_ms, self._latido)
+        threading.Thread(target=self._vigilar, name="vigilante_tk", daemon=True).start()
+
+    def detener(self):
+        self._detenido.set()
+
+    def _latido(self):
+        if self._detenido.is_set():
+            return
+        ahora = time.perf_counter()
+        atraso = ahora - self._esperado
+        with self._lock:
+            pila, self._pila = self._pila, None
+            self._esperado = ahora + self.intervalo
+        if atraso >= self.umbral:
+            self.metricas.registrar_bloqueo(atraso, pila)
+        self.root.after(self.intervalo_ms, self._latido)
+
+    def _vigilar(self):
+        while not self._detenido.wait(self.umbral / 2):
+            with self._lock:
+                if self._pila is not None or time.perf_counter() - self._esperado < self.umbral:
+                    continue
+                marco = sys._current_frames().get(self._hilo_tk)
+                if marco is not None:
+                    self._pila = "".join(traceback.format_stack(marco))
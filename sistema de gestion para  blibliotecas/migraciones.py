@@ -0,0 +1,210 @@
+import hashlib
+import os
+import re
+
+import mysql.connector
+
+import estadisticas
+
+# Script con las tablas y procedimientos de la base (también sirve para instalarla a mano)
+ARCHIVO_ESQUEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bliblioteca personal.sql")
+
+# Bloqueo con nombre: si dos equipos abren la aplicación a la vez, solo uno migra
+NOMBRE_BLOQUEO = "biblioteca_personal.migraciones"
+SEGUNDOS_BLOQUEO = 60
+# Espera máxima de un ALTER por el bloqueo de la tabla; si otro equipo la tiene
+# ocupada, la migración queda pendiente para el próximo inicio en lugar de trabar a todos
+SEGUNDOS_ESPERA_DDL = 10
+
+# Errores del servidor cuando un ALTER no admite el algoritmo/bloqueo pedido
+ERRORES_DDL_EN_LINEA = (1845, 1846)
+
+PATRON_TABLA = re.compile(r"^CREATE TABLE (\w+) \(.*?^\);", re.MULTILINE | re.DOTALL)
+PATRON_PROCEDIMIENTO = re.compile(r"^(CREATE PROCEDURE (\w+)\(.*?^END) //", re.MULTILINE | re.DOTALL)
+
+
+def leer_esquema(archivo=ARCHIVO_ESQUEMA):
+    """Tablas y procedimientos del script: ([(tabla, CREATE TABLE)], {procedimiento: CREATE PROCEDURE})"""
+    with open(archivo, encoding="utf-8") as script:
+        texto = script.read()
+    tablas = [(tabla.group(1), tabla.group(0).rstrip(";")) for tabla in PATRON_TABLA.finditer(texto)]
+    procedimientos = {nombre: cuerpo for cuerpo, nombre in PATRON_PROCEDIMIENTO.findall(texto)}
+    return tablas, procedimientos
+
+
+def _existe_columna(cursor, tabla, columna):
+    cursor.execute("""SELECT 1 FROM information_schema.COLUMNS
+                      WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s""",
+                   (tabla, columna))
+    return bool(cursor.fetchall())
+
+
+def _existe_indice(cursor, tabla, indice):
+    cursor.execute("""SELECT 1 FROM information_schema.STATISTICS
+                      WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s LIMIT 1""",
+                   (tabla, indice))
+    return bool(cursor.fetchall())
+
+
+def _alterar_en_linea(cursor, alter, bloqueo="NONE"):
+    """Ejecuta el ALTER sin bloquear la tabla (DDL en línea); si el servidor no puede, lo hace normal"""
+    try:
+        cursor.execute(f"{alter}, ALGORITHM=INPLACE, LOCK={bloqueo}")
+    except mysql.connector.Error as error:
+        if error.errno not in ERRORES_DDL_EN_LINEA:
+            raise
+        cursor.execute(alter)
+
+
+def agregar_columna(tabla, columna, definicion):
+    def paso(cursor, esquema):
+        if not _existe_columna(cursor, tabla, columna):
+            _alterar_en_linea(cursor, f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+    return paso
+
+
+def crear_indice(tabla, indice, columnas, tipo="INDEX"):
+    """Paso que crea el índice si falta; los FULLTEXT permiten lecturas mientras se construyen"""
+    def paso(cursor, esquema):
+        if not _existe_indice(cursor, tabla, indice):
+            _alterar_en_linea(cursor, f"ALTER TABLE {tabla} ADD {tipo} {indice} ({columnas})",
+                              "SHARED" if tipo == "FULLTEXT" else "NONE")
+    return paso
+
+
+def crear_tablas(cursor, esquema):
+    for _, crear in esquema[0]:
+        cursor.execute(crear.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1))
+
+
+def llenar_resumenes(cursor, esquema):
+    """Resume los préstamos hechos antes de que los procedimientos mantuvieran las tablas de resumen"""
+    estadisticas.recalcular(cursor)
+
+
+# MIGRACIONES
+# (versión, descripción, pasos). Cada paso revisa antes de cambiar, así una
+# migración cortada a medias (el DDL de MySQL no es transaccional) se puede
+# repetir. Las versiones ya publicadas no se modifican: los cambios nuevos
+# van en una versión nueva al final.
+MIGRACIONES = (
+    (1, "Tablas base", (crear_tablas,)),
+    (2, "Portadas y fotos en el almacén de imágenes", (
+        agregar_columna("libros", "portada", "VARCHAR(80)"),
+        agregar_columna("usuarios", "foto", "VARCHAR(80)"),
+    )),
+    (3, "Índices de texto completo para las búsquedas", (
+        crear_indice("libros", "ft_libros", "titulo, autor, genero, isbn", "FULLTEXT"),
+        crear_indice("usuarios", "ft_usuarios", "nombre, email", "FULLTEXT"),
+        crear_indice("autores", "ft_autores", "nombre", "FULLTEXT"),
+    )),
+    (4, "Índices de las listas y de los préstamos", (
+        # Orden de las listas (paginación por clave: columna de orden más id)
+        crear_indice("libros", "idx_libros_titulo", "titulo, id"),
+        crear_indice("usuarios", "idx_usuarios_nombre", "nombre, id"),
+        crear_indice("autores", "idx_autores_nombre", "nombre, id"),
+        crear_indice("prestamos", "idx_prestamos_fecha", "fecha_prestamo, id"),
+        # JOIN del historial y búsqueda del préstamo activo de un libro o usuario
+        crear_indice("prestamos", "idx_prestamos_libro", "libro_id, devuelto"),
+        crear_indice("prestamos", "idx_prestamos_usuario", "usuario_id, devuelto"),
+    )),
+    (5, "Tablas de resumen de la pestaña Estadísticas", (
+        crear_tablas,
+        crear_indice("resumen_prestamos_libro", "idx_resumen_libro_ranking", "mes, prestamos"),
+        crear_indice("resumen_prestamos_genero", "idx_resumen_genero_ranking", "mes, prestamos"),
+        crear_indice("resumen_usuarios", "idx_resumen_usuarios_activos", "prestamos_activos"),
+        llenar_resumenes,
+    )),
+    (6, "Versión de cada libro para los préstamos concurrentes", (
+        agregar_columna("libros", "version", "INT NOT NULL DEFAULT 0"),
+    )),
+    (7, "Claves de idempotencia de la cola de escrituras de los mostradores", (
+        crear_tablas,
+        crear_indice("operaciones_aplicadas", "idx_operaciones_aplicada", "aplicada"),
+    )),
+)
+
+
+def _sincronizar_procedimientos(cursor, procedimientos):
+    """Vuelve a crear los procedimientos que faltan o cambiaron en el script; devuelve sus nombres"""
+    cursor.execute("SELECT ROUTINE_NAME FROM information_schema.ROUTINES "
+                   "WHERE ROUTINE_SCHEMA = DATABASE() AND ROUTINE_TYPE = 'PROCEDURE'")
+    existentes = {nombre.lower() for (nombre,) in cursor.fetchall()}
+    cursor.execute("SELECT nombre, huella FROM procedimientos_esquema")
+    huellas = dict(cursor.fetchall())
+
+    recreados = []
+    for nombre, cuerpo in procedimientos.items():
+        huella = hashlib.sha1(" ".join(cuerpo.split()).encode("utf-8")).hexdigest()
+        if nombre.lower() in existentes and huellas.get(nombre) == huella:
+            continue
+        cursor.execute(f"DROP PROCEDURE IF EXISTS {nombre}")
+        cursor.execute(cuerpo)
+        cursor.execute("REPLACE INTO procedimientos_esquema (nombre, huella) VALUES (%s, %s)", (nombre, huella))
+        recreados.append(nombre)
+    return recreados
+
+
+def migrar(conexion, archivo=ARCHIVO_ESQUEMA):
+    """Lleva la base a la última versión del esquema; devuelve (ok, mensaje)
+
+    Se llama al abrir la primera conexión. Aplica en orden las
+    migraciones pendientes (registradas en migraciones_esquema) y vuelve a
+    crear los procedimientos que cambiaron. Con la base al día solo cuesta
+    unas pocas consultas.
+    """
+    try:
+        esquema = leer_esquema(archivo)
+    except OSError as error:
+        return False, f"No se pudo leer el esquema: {error}"
+
+    cursor = conexion.cursor(buffered=True)
+    version = None
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (NOMBRE_BLOQUEO, SEGUNDOS_BLOQUEO))
+        if cursor.fetchall()[0][0] != 1:
+            return False, "Otro equipo está actualizando la base de datos; se reintentará al reiniciar"
+        try:
+            cursor.execute("SET SESSION lock_wait_timeout = %s", (SEGUNDOS_ESPERA_DDL,))
+            cursor.execute("""CREATE TABLE IF NOT EXISTS migraciones_esquema (
+                                  version INT PRIMARY KEY,
+                                  descripcion VARCHAR(200) NOT NULL,
+                                  aplicada TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                              )""")
+            cursor.execute("""CREATE TABLE IF NOT EXISTS procedimientos_esquema (
+                                  nombre VARCHAR(64) PRIMARY KEY,
+                                  huella CHAR(40) NOT NULL
+                              )""")
+            cursor.execute("SELECT version FROM migraciones_esquema")
+            aplicadas = {v for (v,) in cursor.fetchall()}
+
+            nuevas = []
+            for version, descripcion, pasos in MIGRACIONES:
+                if version in aplicadas:
+                    continue
+                for paso in pasos:
+                    paso(cursor, esquema)
+                cursor.execute("INSERT INTO migraciones_esquema (version, descripcion) VALUES (%s, %s)",
+                               (version, descripcion))
+                nuevas.append(version)
+            version = None
+            recreados = _sincronizar_procedimientos(cursor, esquema[1])
+        finally:
+            try:
+                cursor.execute("SET SESSION lock_wait_timeout = DEFAULT")
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (NOMBRE_BLOQUEO,))
+                cursor.fetchall()
+            except mysql.connector.Error:
+                # Conexión caída: el servidor libera el bloqueo solo
+                pass
+    except mysql.connector.Error as error:
+        if version is not None:
+            return False, f"No se pudo aplicar la migración {version} (se reintentará al reiniciar): {error}"
+        return False, f"No se pudo actualizar el esquema: {error}"
+    finally:
+        cursor.close()
+
+    if not nuevas and not recreados:
+        return True, "Esquema al día"
+    return True, (f"Migraciones aplicadas: {', '.join(map(str, nuevas)) or 'ninguna'}; "
+                  f"procedimientos actualizados: {len(recreados)}")
@@ -0,0 +1,98 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+# PIL se importa dentro de las funciones: la ventana abre sin cargarlo y
+# recién se usa al mostrar la primera imagen
+# Carpeta de datos locales de la aplicación
+CARPETA_DATOS = os.path.join(os.path.expanduser("~"), ".biblioteca_personal")
+CARPETA_MINIATURAS = os.path.join(CARPETA_DATOS, "miniaturas")
+# Miniaturas ya convertidas a PhotoImage que se mantienen en memoria
+MAXIMO_EN_MEMORIA = 64
+
+
+def reducir(imagen, tamaño):
+    """Achica la imagen a tamaño decodificando lo mínimo posible
+
+    En JPEG, draft() hace que el decodificador entregue directamente la
+    imagen a 1/2, 1/4 u 1/8; en otros formatos reduce() promedia bloques
+    enteros, que es mucho más barato que un LANCZOS sobre el original.
+    """
+    from PIL import Image
+
+    if imagen.format == "JPEG":
+        imagen.draft("RGB", tamaño)
+    if imagen.mode not in ("RGB", "RGBA", "L"):
+        # Paletas (GIF) y otros modos no admiten reduce ni LANCZOS
+        imagen = imagen.convert("RGBA")
+    factor = min(imagen.width // tamaño[0], imagen.height // tamaño[1])
+    if factor > 1:
+        imagen = imagen.reduce(factor)
+    return imagen.resize(tamaño, Image.LANCZOS)
+
+
+# CACHÉ DE MINIATURAS
+class CacheMiniaturas:
+    """Miniaturas en memoria (LRU de PhotoImage) y en disco, por (ruta, mtime, tamaño de archivo)
+
+    obtener/guardar usan Tk y se llaman en el hilo de la interfaz;
+    decodificar es seguro en un hilo de fondo.
+    """
+
+    def __init__(self, carpeta=CARPETA_MINIATURAS, maximo=MAXIMO_EN_MEMORIA):
+        self.carpeta = carpeta
+        self.maximo = maximo
+        self._fotos = OrderedDict()
+
+    @staticmethod
+    def clave(ruta, tamaño):
+        """Cambia si el archivo se modifica o se reemplaza por otro"""
+        estado = os.stat(ruta)
+        return os.path.abspath(ruta), estado.st_mtime_ns, estado.st_size, tuple(tamaño)
+
+    def _archivo(self, clave):
+        nombre = hashlib.sha1(repr(clave).encode("utf-8")).hexdigest()
+        return os.path.join(self.carpeta, nombre[:2], nombre + ".png")
+
+    def obtener(self, clave):
+        foto = self._fotos.get(clave)
+        if foto is not None:
+            self._fotos.move_to_end(clave)
+        return foto
+
+    def guardar(self, clave, imagen):
+        """Convierte la imagen a PhotoImage y la deja en la LRU"""
+        from PIL import ImageTk
+
+        foto = ImageTk.PhotoImage(imagen)
+        self._fotos[clave] = foto
+        self._fotos.move_to_end(clave)
+        while len(self._fotos) > self.maximo:
+            self._fotos.popitem(last=False)
+        return foto
+
+    def decodificar(self, clave):
+        """Devuelve la miniatura como imagen PIL, leyéndola del disco o generándola"""
+        from PIL import Image
+
+        archivo = self._archivo(clave)
+        try:
+            with Image.open(archivo) as guardada:
+                guardada.load()
+                return guardada
+        except (OSError, ValueError):
+            pass
+
+        ruta, _, _, tamaño = clave
+        with Image.open(ruta) as original:
+            imagen = reducir(original, tamaño)
+
+        # Se escribe aparte y se renombra: otro hilo nunca ve un archivo a medias
+        try:
+            os.makedirs(os.path.dirname(archivo), exist_ok=True)
+            temporal = f"{archivo}.{os.getpid()}.{id(imagen)}.tmp"
+            imagen.save(temporal, "PNG")
+            os.replace(temporal, archivo)
+        except OSError:
+            pass
+        return imagen
@@ -0,0 +1,507 @@
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, datetime
+from functools import lru_cache
+
+import mysql.connector
+
+# Archivo de la base local si CONFIG_BD no indica otro ("archivo")
+ARCHIVO_SQLITE = os.path.join(os.path.expanduser("~"), ".biblioteca_personal", "biblioteca_personal.db")
+# Bytes del archivo que se leen por mapeo de memoria en lugar de read()
+TAMANO_MMAP = 256 * 1024 * 1024
+# Milisegundos que espera una escritura mientras otra conexión tiene el bloqueo
+ESPERA_BLOQUEO_MS = 5000
+
+# Se aplican a cada conexión. Con WAL los lectores no esperan a los
+# escritores, y synchronous=NORMAL es seguro en ese modo (solo se
+# sincroniza el disco en los checkpoints).
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA mmap_size = {TAMANO_MMAP}",
+    f"PRAGMA busy_timeout = {ESPERA_BLOQUEO_MS}",
+    "PRAGMA foreign_keys = ON",
+)
+
+PATRON_CALL = re.compile(r"^\s*CALL\s+(\w+)\s*\(", re.IGNORECASE)
+# SQLite no tiene bloqueos de fila: una transacción de escritura (BEGIN
+# IMMEDIATE) ya tiene toda la base, así que FOR UPDATE se quita
+PATRON_BLOQUEO_FILAS = re.compile(r"\s+FOR\s+UPDATE(\s+(SKIP\s+LOCKED|NOWAIT))?\s*$", re.IGNORECASE)
+
+# Fechas como texto ISO, igual que las devuelve MySQL (datetime.date)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda momento: momento.isoformat(" "))
+
+
+def _convertir_fecha(valor):
+    try:
+        return date.fromisoformat(valor.decode("utf-8")[:10])
+    except ValueError:
+        return valor.decode("utf-8")
+
+
+sqlite3.register_converter("DATE", _convertir_fecha)
+
+
+# ESQUEMA
+# (versión, script); cada versión se aplica en una transacción y queda
+# anotada en PRAGMA user_version. Las versiones publicadas no se modifican.
+# AUTOINCREMENT: los ids nunca se reutilizan, como en MySQL (las listas
+# cargan las filas nuevas por id mayor al último conocido).
+MIGRACIONES_SQLITE = (
+    (1, """
+CREATE TABLE IF NOT EXISTS autores (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL COLLATE NOCASE,
+    nacionalidad TEXT,
+    fecha_nacimiento DATE
+);
+CREATE TABLE IF NOT EXISTS libros (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    titulo TEXT NOT NULL COLLATE NOCASE,
+    autor TEXT NOT NULL COLLATE NOCASE,
+    genero TEXT COLLATE NOCASE,
+    año_publicacion INTEGER,
+    isbn TEXT,
+    disponible BOOLEAN DEFAULT TRUE,
+    portada TEXT
+);
+CREATE TABLE IF NOT EXISTS usuarios (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL COLLATE NOCASE,
+    email TEXT UNIQUE NOT NULL COLLATE NOCASE,
+    telefono TEXT,
+    fecha_registro DATE DEFAULT (date('now', 'localtime')),
+    foto TEXT
+);
+CREATE TABLE IF NOT EXISTS prestamos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    libro_id INTEGER REFERENCES libros(id) ON DELETE CASCADE,
+    usuario_id INTEGER REFERENCES usuarios(id) ON DELETE CASCADE,
+    fecha_prestamo DATE DEFAULT (date('now', 'localtime')),
+    fecha_devolucion DATE,
+    devuelto BOOLEAN DEFAULT FALSE
+);
+CREATE TABLE IF NOT EXISTS reseñas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    libro_id INTEGER REFERENCES libros(id) ON DELETE CASCADE,
+    usuario_id INTEGER REFERENCES usuarios(id) ON DELETE CASCADE,
+    calificacion INTEGER CHECK (calificacion >= 1 AND calificacion <= 5),
+    comentario TEXT,
+    fecha_reseña DATE DEFAULT (date('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS idx_libros_titulo ON libros (titulo, id);
+CREATE INDEX IF NOT EXISTS idx_usuarios_nombre ON usuarios (nombre, id);
+CREATE INDEX IF NOT EXISTS idx_autores_nombre ON autores (nombre, id);
+CREATE INDEX IF NOT EXISTS idx_prestamos_fecha ON prestamos (fecha_prestamo, id);
+CREATE INDEX IF NOT EXISTS idx_prestamos_libro ON prestamos (libro_id, devuelto);
+CREATE INDEX IF NOT EXISTS idx_prestamos_usuario ON prestamos (usuario_id, devuelto);
+"""),
+    (2, """
+CREATE TABLE IF NOT EXISTS resumen_prestamos_libro (
+    mes DATE NOT NULL,
+    libro_id INTEGER NOT NULL,
+    prestamos INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (mes, libro_id)
+);
+CREATE TABLE IF NOT EXISTS resumen_prestamos_genero (
+    mes DATE NOT NULL,
+    genero TEXT NOT NULL,
+    prestamos INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (mes, genero)
+);
+CREATE TABLE IF NOT EXISTS resumen_usuarios (
+    usuario_id INTEGER PRIMARY KEY,
+    prestamos_activos INTEGER NOT NULL DEFAULT 0,
+    prestamos_total INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS resumen_circulacion_diaria (
+    fecha DATE PRIMARY KEY,
+    prestamos INTEGER NOT NULL DEFAULT 0,
+    devoluciones INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_resumen_libro_ranking ON resumen_prestamos_libro (mes, prestamos);
+CREATE INDEX IF NOT EXISTS idx_resumen_genero_ranking ON resumen_prestamos_genero (mes, prestamos);
+CREATE INDEX IF NOT EXISTS idx_resumen_usuarios_activos ON resumen_usuarios (prestamos_activos);
+-- Los préstamos anteriores a esta versión
+INSERT INTO resumen_prestamos_libro (mes, libro_id, prestamos)
+SELECT strftime('%Y-%m-01', fecha_prestamo), libro_id, COUNT(*) FROM prestamos GROUP BY 1, 2;
+INSERT INTO resumen_prestamos_genero (mes, genero, prestamos)
+SELECT strftime('%Y-%m-01', p.fecha_prestamo), COALESCE(NULLIF(l.genero, ''), 'Sin género'), COUNT(*)
+FROM prestamos p JOIN libros l ON p.libro_id = l.id GROUP BY 1, 2;
+INSERT INTO resumen_usuarios (usuario_id, prestamos_activos, prestamos_total)
+SELECT usuario_id, SUM(CASE WHEN devuelto THEN 0 ELSE 1 END), COUNT(*)
+FROM prestamos WHERE usuario_id IS NOT NULL GROUP BY usuario_id;
+INSERT INTO resumen_circulacion_diaria (fecha, prestamos, devoluciones)
+SELECT fecha, SUM(prestamos), SUM(devoluciones) FROM (
+    SELECT fecha_prestamo AS fecha, 1 AS prestamos, 0 AS devoluciones FROM prestamos
+    UNION ALL
+    SELECT fecha_devolucion, 0, 1 FROM prestamos WHERE devuelto = TRUE AND fecha_devolucion IS NOT NULL
+) GROUP BY fecha;
+"""),
+    (3, """
+ALTER TABLE libros ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+"""),
+    (4, """
+CREATE TABLE IF NOT EXISTS operaciones_aplicadas (
+    clave TEXT PRIMARY KEY,
+    operacion TEXT NOT NULL,
+    resultado TEXT,
+    aplicada DATETIME NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_operaciones_aplicada ON operaciones_aplicadas (aplicada);
+"""),
+)
+
+
+# PROCEDIMIENTOS
+# Equivalentes de los sp_* de "bliblioteca personal.sql": reciben un
+# cursor sqlite3 y los parámetros del CALL, y devuelven las filas que
+# devolvería el procedimiento (los mensajes "Error: ..." incluidos).
+def sp_insertar_libro(cursor, titulo, autor, genero, anio, isbn, portada=None):
+    cursor.execute("""INSERT INTO libros (titulo, autor, genero, año_publicacion, isbn, portada)
+                      VALUES (?, ?, ?, ?, ?, ?)""", (titulo, autor, genero, anio, isbn, portada))
+    return [(f'Libro "{titulo}" insertado correctamente',)]
+
+
+def sp_actualizar_libro(cursor, id_libro, titulo, autor, genero, anio, isbn):
+    cursor.execute("""UPDATE libros SET titulo = ?, autor = ?, genero = ?, año_publicacion = ?, isbn = ?,
+                                        version = version + 1
+                      WHERE id = ?""", (titulo, autor, genero, anio, isbn, id_libro))
+    return [(f"Libro ID {id_libro} actualizado correctamente",)]
+
+
+def sp_eliminar_libro(cursor, id_libro):
+    if cursor.execute("SELECT 1 FROM libros WHERE id = ?", (id_libro,)).fetchone() is None:
+        return [(f"Error: No existe el libro con ID {id_libro}",)]
+    if cursor.execute("SELECT 1 FROM prestamos WHERE libro_id = ? AND devuelto = FALSE",
+                      (id_libro,)).fetchone() is not None:
+        return [("Error: No se puede eliminar un libro que está prestado",)]
+    cursor.execute("DELETE FROM libros WHERE id = ?", (id_libro,))
+    return [(f"Libro ID {id_libro} eliminado correctamente",)]
+
+
+def sp_insertar_usuario(cursor, nombre, email, telefono, foto=None):
+    if cursor.execute("SELECT 1 FROM usuarios WHERE email = ?", (email,)).fetchone() is not None:
+        return [(f"Error: El email {email} ya está registrado",)]
+    cursor.execute("INSERT INTO usuarios (nombre, email, telefono, foto) VALUES (?, ?, ?, ?)",
+                   (nombre, email, telefono, foto))
+    return [(f'Usuario "{nombre}" registrado correctamente',)]
+
+
+def sp_realizar_prestamo(cursor, libro_id, usuario_id):
+    libro = cursor.execute("SELECT disponible, titulo, genero, version FROM libros WHERE id = ?",
+                           (libro_id,)).fetchone()
+    usuario = cursor.execute("SELECT nombre FROM usuarios WHERE id = ?", (usuario_id,)).fetchone()
+    if libro is None:
+        return [(f"Error: No existe el libro con ID {libro_id}",)]
+    if usuario is None:
+        return [(f"Error: No existe el usuario con ID {usuario_id}",)]
+    if not libro[0]:
+        return [(f'Error: El libro "{libro[1]}" no está disponible',)]
+    cursor.execute("UPDATE libros SET disponible = FALSE, version = version + 1 "
+                   "WHERE id = ? AND version = ? AND disponible = TRUE", (libro_id, libro[3]))
+    if cursor.rowcount == 0:
+        return [(f'Error: Conflicto: otro mostrador cambió el libro "{libro[1]}"; reintente',)]
+    cursor.execute("INSERT INTO prestamos (libro_id, usuario_id) VALUES (?, ?)", (libro_id, usuario_id))
+    hoy = date.today()
+    cursor.execute("""INSERT INTO resumen_prestamos_libro (mes, libro_id, prestamos) VALUES (?, ?, 1)
+                      ON CONFLICT (mes, libro_id) DO UPDATE SET prestamos = prestamos + 1""",
+                   (hoy.replace(day=1), libro_id))
+    cursor.execute("""INSERT INTO resumen_prestamos_genero (mes, genero, prestamos) VALUES (?, ?, 1)
+                      ON CONFLICT (mes, genero) DO UPDATE SET prestamos = prestamos + 1""",
+                   (hoy.replace(day=1), libro[2] or "Sin género"))
+    cursor.execute("""INSERT INTO resumen_usuarios (usuario_id, prestamos_activos, prestamos_total) VALUES (?, 1, 1)
+                      ON CONFLICT (usuario_id) DO UPDATE SET prestamos_activos = prestamos_activos + 1,
+                                                             prestamos_total = prestamos_total + 1""",
+                   (usuario_id,))
+    cursor.execute("""INSERT INTO resumen_circulacion_diaria (fecha, prestamos, devoluciones) VALUES (?, 1, 0)
+                      ON CONFLICT (fecha) DO UPDATE SET prestamos = prestamos + 1""", (hoy,))
+    return [(f"Préstamo realizado: {usuario[0]} -> {libro[1]}",)]
+
+
+def sp_devolver_libro(cursor, prestamo_id):
+    prestamo = cursor.execute("""SELECT p.libro_id, p.usuario_id, l.titulo, p.devuelto FROM prestamos p
+                                 JOIN libros l ON p.libro_id = l.id WHERE p.id = ?""",
+                              (prestamo_id,)).fetchone()
+    if prestamo is None:
+        return [(f"Error: No existe el préstamo con ID {prestamo_id}",)]
+    libro_id, usuario_id, titulo, devuelto = prestamo
+    if devuelto:
+        return [("Error: Este préstamo ya fue devuelto",)]
+    hoy = date.today()
+    cursor.execute("UPDATE prestamos SET devuelto = TRUE, fecha_devolucion = ? WHERE id = ? AND devuelto = FALSE",
+                   (hoy, prestamo_id))
+    if cursor.rowcount == 0:
+        return [("Error: Este préstamo ya fue devuelto",)]
+    cursor.execute("UPDATE libros SET disponible = TRUE, version = version + 1 WHERE id = ?", (libro_id,))
+    cursor.execute("""UPDATE resumen_usuarios SET prestamos_activos = prestamos_activos - 1
+                      WHERE usuario_id = ? AND prestamos_activos > 0""", (usuario_id,))
+    cursor.execute("""INSERT INTO resumen_circulacion_diaria (fecha, prestamos, devoluciones) VALUES (?, 0, 1)
+                      ON CONFLICT (fecha) DO UPDATE SET devoluciones = devoluciones + 1""", (hoy,))
+    return [(f'Libro "{titulo}" devuelto correctamente',)]
+
+
+def sp_insertar_autor(cursor, nombre, nacionalidad, fecha_nacimiento):
+    cursor.execute("INSERT INTO autores (nombre, nacionalidad, fecha_nacimiento) VALUES (?, ?, ?)",
+                   (nombre, nacionalidad, fecha_nacimiento))
+    return [(f'Autor "{nombre}" insertado correctamente',)]
+
+
+def sp_eliminar_autor(cursor, id_autor):
+    if cursor.execute("SELECT 1 FROM autores WHERE id = ?", (id_autor,)).fetchone() is None:
+        return [(f"Error: No existe el autor con ID {id_autor}",)]
+    cursor.execute("DELETE FROM autores WHERE id = ?", (id_autor,))
+    return [(f"Autor ID {id_autor} eliminado correctamente",)]
+
+
+def sp_obtener_estadisticas(cursor):
+    return cursor.execute("""SELECT
+        (SELECT COUNT(*) FROM libros),
+        (SELECT COUNT(*) FROM libros WHERE disponible = TRUE),
+        (SELECT COUNT(*) FROM usuarios),
+        (SELECT COUNT(*) FROM prestamos WHERE devuelto = FALSE),
+        (SELECT COUNT(*) FROM autores),
+        (SELECT COUNT(*) FROM reseñas)""").fetchall()
+
+
+def sp_buscar_libros_por_titulo(cursor, titulo):
+    return cursor.execute("""SELECT id, titulo, autor, genero, año_publicacion,
+                                    CASE WHEN disponible THEN 'Sí' ELSE 'No' END
+                             FROM libros WHERE titulo LIKE '%' || ? || '%' ORDER BY titulo""",
+                          (titulo,)).fetchall()
+
+
+def sp_obtener_prestamos_activos(cursor):
+    return cursor.execute("""SELECT p.id, l.titulo, u.nombre, p.fecha_prestamo,
+                                    CAST(julianday('now', 'localtime') - julianday(p.fecha_prestamo) AS INTEGER)
+                             FROM prestamos p
+                             JOIN libros l ON p.libro_id = l.id
+                             JOIN usuarios u ON p.usuario_id = u.id
+                             WHERE p.devuelto = FALSE
+                             ORDER BY p.fecha_prestamo""").fetchall()
+
+
+def sp_insertar_reseña(cursor, libro_id, usuario_id, calificacion, comentario):
+    if calificacion < 1 or calificacion > 5:
+        return [("Error: La calificación debe ser entre 1 y 5",)]
+    cursor.execute("INSERT INTO reseñas (libro_id, usuario_id, calificacion, comentario) VALUES (?, ?, ?, ?)",
+                   (libro_id, usuario_id, calificacion, comentario))
+    return [("Reseña agregada correctamente",)]
+
+
+# Por nombre en minúsculas, como los compara MySQL
+PROCEDIMIENTOS = {
+    "sp_insertarlibro": sp_insertar_libro,
+    "sp_actualizarlibro": sp_actualizar_libro,
+    "sp_eliminarlibro": sp_eliminar_libro,
+    "sp_insertarusuario": sp_insertar_usuario,
+    "sp_realizarprestamo": sp_realizar_prestamo,
+    "sp_devolverlibro": sp_devolver_libro,
+    "sp_insertarautor": sp_insertar_autor,
+    "sp_eliminarautor": sp_eliminar_autor,
+    "sp_obtenerestadisticas": sp_obtener_estadisticas,
+    "sp_buscarlibrosportitulo": sp_buscar_libros_por_titulo,
+    "sp_obtenerprestamosactivos": sp_obtener_prestamos_activos,
+    "sp_insertarreseña": sp_insertar_reseña,
+}
+
+
+@lru_cache(maxsize=1024)
+def traducir(query):
+    """Marcadores de mysql.connector (%s) al estilo de sqlite3 (?); una vez por texto"""
+    return PATRON_BLOQUEO_FILAS.sub("", query).replace("%s", "?")
+
+
+@contextmanager
+def _errores_mysql():
+    """Convierte los errores de sqlite3 a las clases de mysql.connector que maneja la aplicación
+
+    Solo "database is locked" se informa como OperationalError (el pool
+    descarta la conexión y reintenta las lecturas); los errores de
+    sintaxis o de columnas inexistentes no son problemas de conexión.
+    """
+    try:
+        yield
+    except sqlite3.IntegrityError as error:
+        raise mysql.connector.IntegrityError(msg=str(error)) from error
+    except sqlite3.OperationalError as error:
+        if "locked" in str(error) or "busy" in str(error):
+            raise mysql.connector.OperationalError(msg=str(error)) from error
+        raise mysql.connector.ProgrammingError(msg=str(error)) from error
+    except sqlite3.ProgrammingError as error:
+        raise mysql.connector.InterfaceError(msg=str(error)) from error
+    except sqlite3.DataError as error:
+        raise mysql.connector.DataError(msg=str(error)) from error
+    except sqlite3.Error as error:
+        raise mysql.connector.DatabaseError(msg=str(error)) from error
+
+
+# CONEXIÓN CON LA INTERFAZ DE MYSQL.CONNECTOR
+class CursorSQLite:
+    """Cursor con los métodos de mysql.connector que usa la aplicación; CALL ejecuta los procedimientos en Python"""
+
+    def __init__(self, conexion):
+        self._conexion = conexion
+        self._cursor = conexion.sqlite.cursor()
+        self._filas = None
+
+    def execute(self, query, parametros=None):
+        llamada = PATRON_CALL.match(query)
+        with _errores_mysql():
+            if llamada:
+                self._filas = self._conexion.llamar(llamada.group(1), parametros or ())
+            else:
+                self._filas = None
+                self._cursor.execute(traducir(query), parametros or ())
+
+    def executemany(self, query, filas):
+        self._filas = None
+        with _errores_mysql():
+            self._cursor.executemany(traducir(query), filas)
+
+    def fetchall(self):
+        if self._filas is not None:
+            filas, self._filas = self._filas, []
+            return filas
+        with _errores_mysql():
+            return self._cursor.fetchall()
+
+    def fetchone(self):
+        if self._filas is not None:
+            return self._filas.pop(0) if self._filas else None
+        with _errores_mysql():
+            return self._cursor.fetchone()
+
+    def fetchmany(self, cantidad):
+        if self._filas is not None:
+            filas, self._filas = self._filas[:cantidad], self._filas[cantidad:]
+            return filas
+        with _errores_mysql():
+            return self._cursor.fetchmany(cantidad)
+
+    def nextset(self):
+        # Los procedimientos en Python devuelven un único resultado
+        return None
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+class ConexionSQLite:
+    """Conexión sqlite3 que se usa como una de mysql.connector (pool, transacciones, CALL)"""
+
+    def __init__(self, archivo):
+        # isolation_level=None: autocommit, las transacciones se abren explícitamente
+        self.sqlite = sqlite3.connect(archivo, isolation_level=None, check_same_thread=False,
+                                      detect_types=sqlite3.PARSE_DECLTYPES)
+        self._abierta = True
+        for pragma in PRAGMAS:
+            self.sqlite.execute(pragma)
+
+    def cursor(self, buffered=None, prepared=None, dictionary=None):
+        # sqlite3 ya guarda compiladas las sentencias recientes de cada conexión
+        return CursorSQLite(self)
+
+    @property
+    def in_transaction(self):
+        return self.sqlite.in_transaction
+
+    def start_transaction(self):
+        # IMMEDIATE toma el bloqueo de escritura al empezar: evita que dos
+        # transacciones que leyeron se traben al querer escribir
+        with _errores_mysql():
+            self.sqlite.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        with _errores_mysql():
+            self.sqlite.commit()
+
+    def rollback(self):
+        with _errores_mysql():
+            self.sqlite.rollback()
+
+    def llamar(self, nombre, parametros):
+        """Ejecuta un sp_* de forma atómica: en su propia transacción, o en un savepoint si ya hay una abierta"""
+        procedimiento = PROCEDIMIENTOS.get(nombre.lower())
+        if procedimiento is None:
+            raise mysql.connector.ProgrammingError(msg=f"PROCEDURE {nombre} does not exist")
+        propia = not self.sqlite.in_transaction
+        cursor = self.sqlite.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE" if propia else "SAVEPOINT procedimiento")
+            try:
+                filas = procedimiento(cursor, *parametros)
+            except BaseException:
+                if propia:
+                    cursor.execute("ROLLBACK")
+                else:
+                    cursor.execute("ROLLBACK TO procedimiento")
+                    cursor.execute("RELEASE procedimiento")
+                raise
+            cursor.execute("COMMIT" if propia else "RELEASE procedimiento")
+            return filas
+        finally:
+            cursor.close()
+
+    def is_connected(self):
+        return self._abierta
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        # Un archivo local no se desconecta
+        if not self._abierta:
+            raise mysql.connector.InterfaceError(msg="La conexión SQLite está cerrada")
+
+    def close(self):
+        self._abierta = False
+        self.sqlite.close()
+
+
+# MOTOR
+class MotorSQLite:
+    """Base embebida en un archivo local: no necesita servidor
+
+    Para bibliotecas pequeñas y pruebas automáticas. Usa WAL y lectura
+    por mapeo de memoria, y ejecuta en Python los procedimientos sp_*.
+    """
+
+    nombre = "sqlite"
+    # Sin MATCH ... AGAINST: las búsquedas usan LIKE
+    fulltext = False
+
+    def __init__(self, config):
+        self.archivo = config.get("archivo") or ARCHIVO_SQLITE
+
+    def conectar(self, crear_base=False):
+        if self.archivo != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.archivo)), exist_ok=True)
+        with _errores_mysql():
+            return ConexionSQLite(self.archivo)
+
+    def migrar(self, conexion):
+        """Aplica las versiones de MIGRACIONES_SQLITE posteriores a PRAGMA user_version"""
+        sqlite = conexion.sqlite
+        nuevas = []
+        try:
+            version = sqlite.execute("PRAGMA user_version").fetchone()[0]
+            for numero, script in MIGRACIONES_SQLITE:
+                if numero > version:
+                    sqlite.executescript(f"BEGIN IMMEDIATE;\n{script}\nPRAGMA user_version = {numero};\nCOMMIT;")
+                    nuevas.append(numero)
+        except sqlite3.Error as error:
+            if sqlite.in_transaction:
+                sqlite.rollback()
+            return False, f"No se pudo actualizar el esquema: {error}"
+        if not nuevas:
+            return True, "Esquema al día"
+        return True, f"Migraciones aplicadas: {', '.join(map(str, nuevas))}"
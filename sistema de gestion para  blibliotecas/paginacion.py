@@ -0,0 +1,898 @@
+import time
+from array import array
+from bisect import bisect_left, insort
+import tkinter.font as tkfont
+import unicodedata
+from tkinter import ttk
+
+import mysql.connector
+
+from metricas import METRICAS
+from tabla_columnar import TablaColumnar, ColumnaEnteros, ColumnaObjetos, ColumnaTextos
+
+# Filas que se mantienen cargadas por encima y por debajo de las visibles
+MARGEN_PRECARGA = 200
+# Alto aproximado de la fila de encabezados de un Treeview, en píxeles
+ALTO_ENCABEZADO = 25
+# Marcas que se agregan al encabezado de la columna por la que se ordena en memoria
+FLECHA_ASCENDENTE = " ▲"
+FLECHA_DESCENDENTE = " ▼"
+# Píxeles de columna por carácter de ancho de su caja de filtro
+PIXELES_POR_CARACTER = 8
+
+
+def _quitar_acentos(texto):
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+# Letras latinas acentuadas (Latin-1 y Latin extendido A) -> su forma normalizada, para str.translate
+SIN_ACENTOS = {codigo: _quitar_acentos(chr(codigo)) for codigo in range(0xC0, 0x180)
+               if _quitar_acentos(chr(codigo)).isascii()}
+
+
+def normalizar(texto):
+    """Minúsculas y sin acentos, para comparar como lo hace la colación de MySQL"""
+    if texto.isascii():
+        # La mayoría de los textos: sin acentos que quitar
+        return texto.lower()
+    traducido = texto.translate(SIN_ACENTOS)
+    if traducido.isascii():
+        return traducido.lower()
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+# CONSULTAS CON PAGINACIÓN POR CLAVE (KEYSET)
+class ConsultaPaginada:
+    """Genera las consultas de una lista ordenada por una clave única
+
+    En lugar de OFFSET se usa la última fila cargada como punto de partida,
+    así cada página cuesta lo mismo sin importar cuán abajo esté en la lista.
+    """
+
+    def __init__(self, select, desde, claves, indices_clave, descendente=False, columna_id="id"):
+        self.select = select
+        self.desde = desde
+        self.claves = claves
+        self.indices_clave = indices_clave
+        self.descendente = descendente
+        self.columna_id = columna_id
+        self.filtro = None
+        self.parametros_filtro = ()
+
+    def filtrar(self, condicion=None, parametros=()):
+        """Restringe la lista con una condición WHERE (None la quita)"""
+        self.filtro = condicion
+        self.parametros_filtro = tuple(parametros)
+
+    def _orden(self, invertido=False):
+        descendente = self.descendente != invertido
+        sentido = " DESC" if descendente else ""
+        return "ORDER BY " + ", ".join(clave + sentido for clave in self.claves)
+
+    def _condicion_clave(self, fila, despues):
+        """Condición (k1, k2, ...) > / < valores, expandida para que use el índice"""
+        mayor = despues != self.descendente
+        operador = ">" if mayor else "<"
+        valores = [fila[i] for i in self.indices_clave]
+        partes = []
+        parametros = []
+        for n, clave in enumerate(self.claves):
+            iguales = [f"{anterior} = %s" for anterior in self.claves[:n]]
+            partes.append("(" + " AND ".join(iguales + [f"{clave} {operador} %s"]) + ")")
+            parametros.extend(valores[:n] + [valores[n]])
+        return "(" + " OR ".join(partes) + ")", parametros
+
+    def _where(self, condiciones, parametros):
+        if self.filtro:
+            condiciones = [f"({self.filtro})"] + condiciones
+            parametros = list(self.parametros_filtro) + parametros
+        if not condiciones:
+            return "", parametros
+        return "WHERE " + " AND ".join(condiciones), parametros
+
+    def contar(self):
+        """Total de filas y mayor id (marca de agua para cargar solo las nuevas)"""
+        where, parametros = self._where([], [])
+        query = f"SELECT COUNT(*), MAX({self.columna_id}) {self.desde} {where}"
+        return query, tuple(parametros)
+
+    def donde(self, condicion, parametros=()):
+        """Filas de la lista que cumplen una condición adicional"""
+        where, parametros = self._where([f"({condicion})"], list(parametros))
+        return f"{self.select} {self.desde} {where}", tuple(parametros)
+
+    def por_ids(self, ids):
+        marcadores = ", ".join(["%s"] * len(ids))
+        return self.donde(f"{self.columna_id} IN ({marcadores})", ids)
+
+    def posteriores_a_id(self, ultimo_id):
+        return self.donde(f"{self.columna_id} > %s", (ultimo_id,))
+
+    def todas(self):
+        """Todas las filas de la lista, en su orden (para ordenarlas y filtrarlas en memoria)"""
+        where, parametros = self._where([], [])
+        return f"{self.select} {self.desde} {where} {self._orden()}", tuple(parametros)
+
+    def desde_posicion(self, posicion, limite):
+        """Ventana a partir de una posición absoluta (para saltos de la barra)"""
+        where, parametros = self._where([], [])
+        query = f"{self.select} {self.desde} {where} {self._orden()} LIMIT %s OFFSET %s"
+        return query, tuple(parametros + [limite, posicion])
+
+    def siguientes(self, fila, limite):
+        condicion, valores = self._condicion_clave(fila, despues=True)
+        where, parametros = self._where([condicion], valores)
+        query = f"{self.select} {self.desde} {where} {self._orden()} LIMIT %s"
+        return query, tuple(parametros + [limite])
+
+    def anteriores(self, fila, limite):
+        """Filas previas a fila, en orden inverso (el llamador las invierte)"""
+        condicion, valores = self._condicion_clave(fila, despues=False)
+        where, parametros = self._where([condicion], valores)
+        query = f"{self.select} {self.desde} {where} {self._orden(invertido=True)} LIMIT %s"
+        return query, tuple(parametros + [limite])
+
+
+# ORDEN Y FILTROS EN MEMORIA
+def _clave_orden(valor):
+    return normalizar(valor) if isinstance(valor, str) else valor
+
+
+def _texto_filtro(valor):
+    return normalizar(str(valor)) if valor is not None else ""
+
+
+def _convertir(valores, convertir):
+    """convertir(valor) para cada valor, una sola vez por valor distinto (géneros, autores, fechas)"""
+    vistos = {}
+    resultado = []
+    for valor in valores:
+        convertido = vistos.get(valor)
+        if convertido is None:
+            convertido = vistos[valor] = convertir(valor)
+        resultado.append(convertido)
+    return resultado
+
+
+class TablaLocal:
+    """Copia en memoria de las filas de una lista, para ordenarla y filtrarla por columna sin consultar la base
+
+    Las filas se guardan en una TablaColumnar. Las claves de orden de una
+    columna se calculan una sola vez, con la misma normalización que la
+    colación de la base (en las columnas de texto, una vez por texto
+    distinto del diccionario), y el orden resultante se guarda como una
+    permutación de índices: volver a ordenar por una columna ya usada (en
+    cualquier sentido) solo recorre esa lista. Los filtros buscan en el
+    texto que muestra la lista; si el texto nuevo contiene al anterior (el
+    usuario sigue escribiendo) solo se revisan las filas que ya pasaban.
+    Se supone, como en las pestañas, que el texto mostrado de una columna
+    depende solo de su valor.
+
+    Los cambios de actualizar() corrigen esas permutaciones, textos y
+    filtros en su lugar (búsqueda binaria por la clave de la fila), sin
+    volver a ordenar. Las filas borradas quedan en la tabla, pero ninguna
+    permutación las nombra.
+    """
+
+    def __init__(self, filas, formatear=None):
+        self.filas = TablaColumnar(filas)
+        self.formatear = formatear or (lambda fila: fila)
+        # Posiciones de las filas no borradas, en el orden original
+        self._vivas = array("l", range(len(self.filas)))
+        self._ids = None
+        self._permutaciones = {}
+        self._textos = {}
+        # Columna -> (texto normalizado, índices de las filas que lo contienen, ascendentes)
+        self._filtros = {}
+
+    def __len__(self):
+        return len(self._vivas)
+
+    def permutacion(self, columna):
+        """Índices de las filas ordenados por la columna, ascendente y con los vacíos primero"""
+        permutacion = self._permutaciones.get(columna)
+        if permutacion is None:
+            # array de enteros: 8 bytes por fila en lugar de un objeto int por índice
+            claves = self._claves(columna)
+            permutacion = array("l", sorted(self._vivas, key=claves.__getitem__))
+            self._permutaciones[columna] = permutacion
+        return permutacion
+
+    def _claves(self, columna):
+        """Clave de orden de cada fila; los vacíos quedan antes que cualquier valor"""
+        datos = self.filas.columnas[columna] if self.filas.columnas else None
+        if isinstance(datos, ColumnaTextos):
+            # Se ordena el diccionario y cada fila toma el rango de su texto (iguales sin acentos, mismo rango)
+            claves = [normalizar(texto) for texto in datos.textos]
+            rangos = [0] * len(claves)
+            rango, anterior = -1, None
+            for codigo in sorted(range(len(claves)), key=claves.__getitem__):
+                if claves[codigo] != anterior:
+                    rango, anterior = rango + 1, claves[codigo]
+                rangos[codigo] = rango
+            # El código de "sin texto" es -1: toma el último elemento
+            rangos.append(-1)
+            return [rangos[codigo] for codigo in datos.codigos]
+        if isinstance(datos, ColumnaEnteros):
+            # Enteros y fechas (número de día); el valor nulo es el menor entero
+            return datos.valores
+        if isinstance(datos, ColumnaObjetos):
+            claves = _convertir(datos.valores, _clave_orden)
+            return [(clave is not None, clave) for clave in claves]
+        return range(len(self.filas))
+
+    def _clave(self, columna, n):
+        """Clave de la fila n en la permutación de la columna: el mismo orden que _claves, desempatado por posición"""
+        valor = self.filas.valor(n, columna)
+        return (valor is not None, _clave_orden(valor)), n
+
+    def _buscar(self, permutacion, columna, clave):
+        """Primer lugar de la permutación cuya clave no es menor que clave"""
+        bajo, alto = 0, len(permutacion)
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            if self._clave(columna, permutacion[medio]) < clave:
+                bajo = medio + 1
+            else:
+                alto = medio
+        return bajo
+
+    def _indice_ids(self):
+        """id -> posición de las filas no borradas"""
+        if self._ids is None:
+            ids = self.filas.valores(0) if self.filas.ancho else []
+            self._ids = {ids[n]: n for n in self._vivas}
+        return self._ids
+
+    def preparar(self, columnas):
+        """Calcula de antemano el orden de esas columnas y el índice por id (p. ej. en el hilo que trajo las filas)"""
+        self._indice_ids()
+        for columna in columnas:
+            self.permutacion(columna)
+
+    def _texto(self, columna):
+        textos = self._textos.get(columna)
+        if textos is None:
+            # El texto mostrado se calcula una vez por valor distinto (por código en las de texto)
+            datos = self.filas.columnas[columna] if self.filas.columnas else None
+            if isinstance(datos, ColumnaTextos):
+                crudos = datos.codigos
+            elif isinstance(datos, ColumnaEnteros):
+                crudos = datos.valores
+            else:
+                crudos = self.filas.valores(columna)
+            formatear, filas = self.formatear, self.filas
+            vistos = {}
+            textos = []
+            for n, crudo in enumerate(crudos):
+                texto = vistos.get(crudo)
+                if texto is None:
+                    texto = vistos[crudo] = _texto_filtro(formatear(filas[n])[columna])
+                textos.append(texto)
+            self._textos[columna] = textos
+        return textos
+
+    def filtrar(self, columna, texto):
+        """Deja solo las filas cuyo valor en la columna contiene el texto (vacío: quita el filtro)"""
+        texto = normalizar(texto.strip())
+        if not texto:
+            self._filtros.pop(columna, None)
+            return
+        anterior, coinciden = self._filtros.get(columna, (None, None))
+        if anterior == texto:
+            return
+        candidatas = coinciden if anterior is not None and anterior in texto else self._vivas
+        textos = self._texto(columna)
+        self._filtros[columna] = (texto, [n for n in candidatas if texto in textos[n]])
+
+    def vista(self, columna=None, descendente=False):
+        """Las filas que pasan los filtros, ordenadas por la columna (None: en el orden original)"""
+        orden = self._vivas if columna is None else self.permutacion(columna)
+        if descendente:
+            orden = orden[::-1]
+        filtros = [coinciden for _, coinciden in self._filtros.values()]
+        if filtros:
+            # Una marca por filtro que pasa cada fila; quedan las que pasan todos
+            marcas = bytearray(len(self.filas))
+            for coinciden in filtros:
+                for n in coinciden:
+                    marcas[n] += 1
+            requeridas = len(filtros)
+            orden = [n for n in orden if marcas[n] == requeridas]
+        # Sin copiar filas: la lista crea una vista solo para las que muestra
+        return self.filas.seleccion(orden)
+
+    def actualizar(self, filas, ids_borrados=(), agregar=True):
+        """Reemplaza por id las filas cambiadas (y agrega las nuevas) y quita las borradas
+
+        Cada fila tocada sale de las permutaciones y filtros ya calculados
+        y vuelve a entrar en su lugar: unas pocas búsquedas binarias por
+        fila, sin recorrer la tabla (se llama desde el hilo de Tk).
+        """
+        posiciones = self._indice_ids()
+        for fila in filas:
+            n = posiciones.get(fila[0])
+            if n is not None:
+                self._sacar(n)
+                self.filas.reemplazar(n, fila)
+            elif agregar:
+                n = posiciones[fila[0]] = len(self.filas)
+                self.filas.agregar(fila)
+                self._vivas.append(n)
+            else:
+                continue
+            self._poner(n)
+        for id_fila in ids_borrados:
+            n = posiciones.pop(id_fila, None)
+            if n is not None:
+                self._sacar(n)
+                del self._vivas[bisect_left(self._vivas, n)]
+
+    def _sacar(self, n):
+        """Quita la fila n de las permutaciones y filtros (antes de cambiarla o borrarla)"""
+        for columna, permutacion in self._permutaciones.items():
+            try:
+                i = self._buscar(permutacion, columna, self._clave(columna, n))
+            except TypeError:
+                # Claves que no se comparan (tipos mezclados): se busca recorriendo
+                i = None
+            if i is not None and i < len(permutacion) and permutacion[i] == n:
+                del permutacion[i]
+            else:
+                permutacion.remove(n)
+        for _, coinciden in self._filtros.values():
+            i = bisect_left(coinciden, n)
+            if i < len(coinciden) and coinciden[i] == n:
+                del coinciden[i]
+
+    def _poner(self, n):
+        """Pone la fila n (nueva o cambiada) en los textos, permutaciones y filtros ya calculados"""
+        mostrado = self.formatear(self.filas[n]) if self._textos else None
+        for columna, textos in self._textos.items():
+            texto = _texto_filtro(mostrado[columna])
+            if n < len(textos):
+                textos[n] = texto
+            else:
+                textos.append(texto)
+        for columna, permutacion in self._permutaciones.items():
+            try:
+                permutacion.insert(self._buscar(permutacion, columna, self._clave(columna, n)), n)
+            except TypeError:
+                # Un valor que no se compara con los de la columna: queda al final
+                permutacion.append(n)
+        for columna, (texto, coinciden) in self._filtros.items():
+            if texto in self._textos[columna][n]:
+                insort(coinciden, n)
+
+
+# LISTA VIRTUAL SOBRE UN TREEVIEW
+class ListaVirtual:
+    """Muestra en un Treeview solo las filas visibles de una lista paginada
+
+    El Treeview nunca contiene más filas de las que caben en pantalla; se
+    mantiene en memoria una ventana con un margen de precarga a cada lado
+    que se va desplazando con consultas por clave en segundo plano.
+
+    ejecutar_en_bd(trabajo, al_terminar, clave, al_fallar=None) corre
+    trabajo(bd) en segundo plano y llama en el hilo de Tk a al_terminar con
+    el resultado, o a al_fallar si no hubo resultado.
+    """
+
+    def __init__(self, tree, scrollbar, consulta, ejecutar_en_bd, formatear=None,
+                 margen=MARGEN_PRECARGA, nombre="lista"):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.consulta = consulta
+        self.ejecutar_en_bd = ejecutar_en_bd
+        self.formatear = formatear or (lambda fila: fila)
+        self.margen = margen
+        self.clave = f"lista_{id(self)}"
+        # Nombre con que aparecen sus tiempos en las métricas
+        self.nombre = nombre
+
+        self.total = 0
+        self.ultimo_id = 0
+        self.inicio = 0
+        self.buffer = []
+        self.posicion = 0
+        self.visibles = int(tree.cget("height"))
+        self.fijo = False
+        self._en_curso = False
+        # Cambios (filas, ids borrados) que llegaron con una carga en camino: se aplican al terminarla
+        self._cambios_pendientes = []
+        # Resultados fijos (búsqueda) que se están mostrando, o None en modo paginado
+        self.resultados = None
+        # Orden y filtros en memoria (activar_orden_local): (columna, descendente) o None, y columna -> texto
+        self.tabla = None
+        self.orden_local = None
+        self.filtros_local = {}
+        self._titulos = {}
+        self._cargando_tabla = False
+
+        scrollbar.config(command=self._al_desplazar_barra)
+        tree.bind("<MouseWheel>", self._al_rueda)
+        tree.bind("<Button-4>", lambda e: self._desplazar_filas(-3))
+        tree.bind("<Button-5>", lambda e: self._desplazar_filas(3))
+        tree.bind("<Prior>", lambda e: self._desplazar_filas(-self.visibles))
+        tree.bind("<Next>", lambda e: self._desplazar_filas(self.visibles))
+        tree.bind("<Configure>", self._al_redimensionar)
+
+    # ---- Carga de datos ----
+    def recargar(self, al_mostrar=None):
+        """Vuelve a contar y carga la ventana alrededor de la posición actual
+
+        al_mostrar() se llama en el hilo de Tk una vez que las filas están a la vista.
+        Con orden o filtros en memoria activos se vuelve a traer la lista entera.
+        """
+        self.resultados = None
+        self._cargando_tabla = False
+        if self._local_activo():
+            self.tabla = None
+            self._cargar_tabla(al_mostrar)
+            return
+        consulta = self.consulta
+        posicion = max(0, self.posicion - self.margen)
+        limite = self.visibles + 2 * self.margen
+        inicio = time.perf_counter()
+
+        def trabajo(bd):
+            ok, conteo = bd.execute_query(*consulta.contar())
+            if not ok:
+                return None
+            ok, filas = bd.execute_query(*consulta.desde_posicion(posicion, limite))
+            if not ok:
+                return None
+            return conteo[0], filas
+
+        def al_terminar(resultado):
+            self._en_curso = False
+            if resultado is None:
+                return
+            (self.total, ultimo_id), filas = resultado
+            self.ultimo_id = ultimo_id or 0
+            self.fijo = False
+            self.inicio = posicion
+            self.buffer = list(filas)
+            self.desplazar_a(self.posicion)
+            # Lo que espera el usuario: desde que pide la lista hasta que la ve
+            METRICAS.registrar_interfaz("lista", self.nombre, time.perf_counter() - inicio, len(filas))
+            if al_mostrar:
+                al_mostrar()
+
+        self._en_curso = True
+        self._cargar(trabajo, al_terminar)
+
+    def _saltar(self, posicion):
+        """Reemplaza la ventana cargada por una centrada en la nueva posición"""
+        desde = max(0, posicion - self.margen)
+        query, parametros = self.consulta.desde_posicion(desde, self.visibles + 2 * self.margen)
+
+        def al_terminar(resultado):
+            self._en_curso = False
+            ok, filas = resultado
+            if ok:
+                self.inicio = desde
+                self.buffer = list(filas)
+                self._mostrar()
+                self._asegurar_datos()
+
+        self._en_curso = True
+        self._cargar(lambda bd: bd.execute_query(query, parametros), al_terminar)
+
+    def _cargar_siguientes(self):
+        query, parametros = self.consulta.siguientes(self.buffer[-1], self.margen)
+
+        def al_terminar(resultado):
+            self._en_curso = False
+            ok, filas = resultado
+            if not ok:
+                return
+            self.buffer.extend(filas)
+            if len(filas) < self.margen:
+                # Se llegó al final: corregir el total si cambió desde el conteo
+                self.total = self.inicio + len(self.buffer)
+            self._recortar(desde_el_final=False)
+            self._mostrar()
+            if filas:
+                self._asegurar_datos()
+
+        self._en_curso = True
+        self._cargar(lambda bd: bd.execute_query(query, parametros), al_terminar)
+
+    def _cargar_anteriores(self):
+        query, parametros = self.consulta.anteriores(self.buffer[0], self.margen)
+
+        def al_terminar(resultado):
+            self._en_curso = False
+            ok, filas = resultado
+            if not ok:
+                return
+            filas = list(reversed(filas))
+            self.buffer[:0] = filas
+            self.inicio -= len(filas)
+            if len(filas) < self.margen and self.inicio != 0:
+                # Se llegó al principio: reajustar las posiciones absolutas
+                self.posicion -= self.inicio
+                self.total -= self.inicio
+                self.inicio = 0
+            self._recortar(desde_el_final=True)
+            self._mostrar()
+            if filas:
+                self._asegurar_datos()
+
+        self._en_curso = True
+        self._cargar(lambda bd: bd.execute_query(query, parametros), al_terminar)
+
+    def fijar_resultados(self, filas):
+        """Muestra un conjunto cerrado de filas (p. ej. resultados de búsqueda) sin paginar
+
+        Para que una carga de página en curso no pise los resultados, la
+        consulta que los obtiene debe ejecutarse con la misma clave de tarea
+        (self.clave). recargar() vuelve al modo paginado. Con orden o
+        filtros en memoria activos se aplican a estos resultados.
+        """
+        # La consulta con self.clave canceló la carga que estaba en camino:
+        # sus cambios pendientes van a estos resultados
+        self._en_curso = False
+        self._cargando_tabla = False
+        self._mostrar_resultados(filas)
+
+    def _mostrar_resultados(self, filas):
+        """Como fijar_resultados, pero sin dar por cancelada la carga en camino"""
+        self.resultados = list(filas)
+        if self._local_activo():
+            self.tabla = TablaLocal(self.resultados, self.formatear)
+            self._aplicar_local()
+        else:
+            self.fijo = True
+            self.buffer = list(filas)
+            self.inicio = 0
+            self.total = len(self.buffer)
+            self.desplazar_a(0)
+        self._aplicar_pendientes()
+
+    # ---- Cambios puntuales ----
+    def cargar_nuevos(self):
+        """Agrega las filas con id mayor al último conocido (altas de cualquier terminal)"""
+        ultimo_id = self.ultimo_id
+        query, parametros = self.consulta.posteriores_a_id(ultimo_id)
+
+        def al_terminar(resultado):
+            ok, filas = resultado
+            if ok:
+                self._aplicar(filas, [])
+
+        self.ejecutar_en_bd(lambda bd: bd.execute_query(query, parametros), al_terminar)
+
+    def refrescar_ids(self, ids):
+        """Vuelve a leer esas filas por id: se actualizan, o se quitan si ya no existen"""
+        ids = [int(i) for i in ids]
+        query, parametros = self.consulta.por_ids(ids)
+
+        def al_terminar(resultado):
+            ok, filas = resultado
+            if ok:
+                encontrados = {fila[0] for fila in filas}
+                self._aplicar(filas, [i for i in ids if i not in encontrados])
+
+        self.ejecutar_en_bd(lambda bd: bd.execute_query(query, parametros), al_terminar)
+
+    def refrescar_donde(self, condicion, parametros=()):
+        """Vuelve a leer las filas que cumplen la condición (sin quitar ninguna)"""
+        query, parametros = self.consulta.donde(condicion, parametros)
+
+        def al_terminar(resultado):
+            ok, filas = resultado
+            if ok:
+                self._aplicar(filas, [])
+
+        self.ejecutar_en_bd(lambda bd: bd.execute_query(query, parametros), al_terminar)
+
+    def _clave_orden(self, fila):
+        clave = []
+        for i in self.consulta.indices_clave:
+            valor = fila[i]
+            if isinstance(valor, str):
+                valor = normalizar(valor)
+            clave.append((valor is not None, valor))
+        return tuple(clave)
+
+    def _antes(self, clave_a, clave_b):
+        """True si clave_a va antes que clave_b en el orden de la lista"""
+        if self.consulta.descendente:
+            return clave_a > clave_b
+        return clave_a < clave_b
+
+    def _cargar(self, trabajo, al_terminar):
+        """Pide una ventana (o la lista entera) con la clave de la lista
+
+        Después de al_terminar se aplican los cambios que llegaron mientras
+        la carga estaba en camino. Si la carga no trae resultado (sin
+        conexión, la consulta falló o trabajo lanzó una excepción) la lista
+        deja de esperarla igual: si no, quedaría en curso para siempre.
+        """
+        def terminar(resultado):
+            try:
+                al_terminar(resultado)
+            finally:
+                self._aplicar_pendientes()
+
+        self.ejecutar_en_bd(trabajo, terminar, self.clave, al_fallar=self._carga_fallida)
+
+    def _carga_fallida(self, error=None):
+        self._en_curso = False
+        self._cargando_tabla = False
+        self._aplicar_pendientes()
+
+    def _aplicar_pendientes(self):
+        if self._en_curso:
+            return
+        cambios, self._cambios_pendientes = self._cambios_pendientes, []
+        for filas, ids_borrados in cambios:
+            self._aplicar(filas, ids_borrados)
+
+    def _aplicar(self, filas, ids_borrados):
+        """Inserta, reemplaza o quita filas de la ventana cargada según su id"""
+        if self._en_curso:
+            # La ventana (o la lista entera) en camino pudo leerse antes del cambio: se aplica al llegar
+            self._cambios_pendientes.append((list(filas), list(ids_borrados)))
+            return
+        if self.tabla is not None:
+            # Las altas solo entran si la tabla es la lista entera, no resultados de búsqueda
+            self.tabla.actualizar(filas, ids_borrados, agregar=self.resultados is None)
+            self.ultimo_id = max([self.ultimo_id] + [fila[0] for fila in filas])
+            self._aplicar_local(self.posicion)
+            return
+        cambiados = set()
+        for id_fila in ids_borrados:
+            if self._quitar(id_fila):
+                self.total -= 1
+            cambiados.add(str(id_fila))
+        for fila in filas:
+            if self.fijo:
+                # En resultados fijos solo se actualizan, en su lugar, las filas ya mostradas
+                for n, actual in enumerate(self.buffer):
+                    if actual[0] == fila[0]:
+                        self.buffer[n] = fila
+                        cambiados.add(str(fila[0]))
+                continue
+            if not self._quitar(fila[0]):
+                self.total += 1
+            self.ultimo_id = max(self.ultimo_id, fila[0])
+            self._ubicar(fila)
+            cambiados.add(str(fila[0]))
+        self.total = max(self.total, self.inicio + len(self.buffer))
+        self.desplazar_a(self.posicion, cambiados)
+
+    def _quitar(self, id_fila):
+        """Quita la fila de la ventana; True si estaba cargada"""
+        for n, fila in enumerate(self.buffer):
+            if fila[0] == id_fila:
+                del self.buffer[n]
+                return True
+        return False
+
+    def _ubicar(self, fila):
+        """Coloca la fila en su lugar dentro de la ventana, si le corresponde estar en ella"""
+        clave = self._clave_orden(fila)
+        if not self.buffer:
+            if self.inicio == 0:
+                self.buffer.append(fila)
+            return
+        if self._antes(clave, self._clave_orden(self.buffer[0])) and self.inicio > 0:
+            # Queda antes de la ventana: todo se corre una posición
+            self.inicio += 1
+            self.posicion += 1
+            return
+        fin_cargado = self.inicio + len(self.buffer)
+        if not self._antes(clave, self._clave_orden(self.buffer[-1])) and fin_cargado < self.total:
+            return
+        n = 0
+        while n < len(self.buffer) and not self._antes(clave, self._clave_orden(self.buffer[n])):
+            n += 1
+        self.buffer.insert(n, fila)
+
+    def _recortar(self, desde_el_final):
+        """Mantiene acotada la ventana en memoria"""
+        maximo = self.visibles + 4 * self.margen
+        sobrante = len(self.buffer) - maximo
+        if sobrante <= 0:
+            return
+        if desde_el_final:
+            del self.buffer[-sobrante:]
+        else:
+            del self.buffer[:sobrante]
+            self.inicio += sobrante
+
+    def _asegurar_datos(self):
+        """Pide la siguiente ventana si lo visible se acerca al borde de lo cargado"""
+        if self._en_curso or self.fijo:
+            return
+        fin_cargado = self.inicio + len(self.buffer)
+        fin_visible = self.posicion + self.visibles
+        if (not self.buffer or self.posicion >= fin_cargado + self.margen
+                or fin_visible <= self.inicio - self.margen):
+            if self.total:
+                self._saltar(self.posicion)
+        elif fin_visible + self.margen // 2 > fin_cargado and fin_cargado < self.total:
+            self._cargar_siguientes()
+        elif self.posicion - self.margen // 2 < self.inicio and self.inicio > 0:
+            self._cargar_anteriores()
+
+    # ---- Orden y filtros en memoria ----
+    def activar_orden_local(self, frame_filtros=None):
+        """Ordena al hacer clic en los encabezados y, con frame_filtros, agrega una caja de filtro por columna
+
+        El primer clic (o la primera letra de un filtro) trae la lista entera
+        una vez; a partir de ahí ordenar y filtrar no consultan la base. Cada
+        clic en el mismo encabezado alterna ascendente, descendente y el
+        orden original.
+        """
+        for n, columna in enumerate(self.tree["columns"]):
+            self._titulos[columna] = self.tree.heading(columna, "text")
+            self.tree.heading(columna, command=lambda n=n: self.ordenar_por(n))
+            if frame_filtros is not None:
+                ancho = max(4, int(self.tree.column(columna, "width")) // PIXELES_POR_CARACTER)
+                caja = ttk.Entry(frame_filtros, width=ancho)
+                caja.pack(side="left", padx=(0, 2))
+                caja.bind("<KeyRelease>", lambda e, n=n: self.filtrar_columna(n, e.widget.get()))
+
+    def ordenar_por(self, columna):
+        """columna es la posición en la fila: las listas muestran las columnas en el orden de la consulta"""
+        if self.orden_local == (columna, False):
+            self.orden_local = (columna, True)
+        elif self.orden_local == (columna, True):
+            self.orden_local = None
+        else:
+            self.orden_local = (columna, False)
+        for n, nombre in enumerate(self.tree["columns"]):
+            flecha = ""
+            if self.orden_local and self.orden_local[0] == n:
+                flecha = FLECHA_DESCENDENTE if self.orden_local[1] else FLECHA_ASCENDENTE
+            self.tree.heading(nombre, text=self._titulos.get(nombre, nombre) + flecha)
+        self._aplicar_local()
+
+    def filtrar_columna(self, columna, texto):
+        if texto.strip():
+            self.filtros_local[columna] = texto
+        elif self.filtros_local.pop(columna, None) is None:
+            return
+        self._aplicar_local()
+
+    def _local_activo(self):
+        return self.orden_local is not None or bool(self.filtros_local)
+
+    def _cargar_tabla(self, al_mostrar=None):
+        """Trae la lista entera (o toma los resultados fijos) y aplica el orden y los filtros"""
+        if self.resultados is not None:
+            self.tabla = TablaLocal(self.resultados, self.formatear)
+            self._aplicar_local()
+            return
+        if self._cargando_tabla:
+            return
+        query, parametros = self.consulta.todas()
+        inicio = time.perf_counter()
+
+        columnas = range(len(self.tree["columns"]))
+        formatear = self.formatear
+
+        def trabajo(bd):
+            # Sin pasar por la caché de consultas: no tiene sentido guardar una segunda copia
+            try:
+                tabla = TablaLocal(bd.iterar_consulta(query, parametros), formatear)
+            except mysql.connector.Error:
+                return None
+            # Fuera del hilo de Tk: después cada clic en un encabezado solo recorre su permutación
+            tabla.preparar(columnas)
+            return tabla
+
+        def al_terminar(tabla):
+            self._en_curso = False
+            self._cargando_tabla = False
+            # Llegaron resultados fijos mientras tanto: la lista entera ya no se muestra
+            if tabla is None or not self._local_activo() or self.resultados is not None:
+                return
+            self.tabla = tabla
+            self.ultimo_id = max([self.ultimo_id] + tabla.filas.valores(0))
+            METRICAS.registrar_interfaz("lista_completa", self.nombre, time.perf_counter() - inicio, len(tabla))
+            self._aplicar_local()
+            if al_mostrar:
+                al_mostrar()
+
+        # Con la misma clave que las páginas: una ventana en camino queda descartada
+        self._en_curso = True
+        self._cargando_tabla = True
+        self._cargar(trabajo, al_terminar)
+
+    def _aplicar_local(self, posicion=0):
+        """Muestra la tabla en memoria con el orden y los filtros elegidos"""
+        if not self._local_activo():
+            # Sin orden ni filtros: vuelve la lista del servidor (o los resultados de la búsqueda)
+            self.tabla = None
+            self.posicion = 0
+            if self.resultados is not None:
+                # Una carga de la lista entera en camino sigue pendiente: al llegar se descarta
+                self._mostrar_resultados(self.resultados)
+            else:
+                self.recargar()
+            return
+        if self.tabla is None:
+            self._cargar_tabla()
+            return
+        inicio = time.perf_counter()
+        for columna in range(len(self.tree["columns"])):
+            self.tabla.filtrar(columna, self.filtros_local.get(columna, ""))
+        columna, descendente = self.orden_local or (None, False)
+        self.fijo = True
+        self.buffer = self.tabla.vista(columna, descendente)
+        self.inicio = 0
+        self.total = len(self.buffer)
+        self.desplazar_a(posicion)
+        METRICAS.registrar_interfaz("orden_local", self.nombre, time.perf_counter() - inicio, len(self.buffer))
+
+    # ---- Desplazamiento ----
+    def desplazar_a(self, posicion, cambiados=None):
+        maximo = max(0, self.total - self.visibles)
+        self.posicion = max(0, min(int(posicion), maximo))
+        self._mostrar(cambiados)
+        self._asegurar_datos()
+
+    def _desplazar_filas(self, filas):
+        self.desplazar_a(self.posicion + filas)
+        return "break"
+
+    def _al_rueda(self, event):
+        return self._desplazar_filas(-3 if event.delta > 0 else 3)
+
+    def _al_desplazar_barra(self, accion, cantidad, unidad=None):
+        if accion == "moveto":
+            self.desplazar_a(float(cantidad) * self.total)
+        elif accion == "scroll":
+            paso = self.visibles if unidad == "pages" else 1
+            self._desplazar_filas(int(cantidad) * paso)
+
+    def _al_redimensionar(self, event):
+        alto_fila = tkfont.nametofont("TkDefaultFont").metrics("linespace") + 4
+        visibles = max(1, (event.height - ALTO_ENCABEZADO) // alto_fila)
+        if visibles != self.visibles:
+            self.visibles = visibles
+            self.desplazar_a(self.posicion)
+
+    def fila(self, iid):
+        """Fila completa en memoria para un iid del Treeview (una de las que se ven), o None"""
+        # Las mismas filas que pinta _mostrar (en memoria, el buffer puede ser la lista entera)
+        desde = self.posicion - self.inicio
+        for fila in self.buffer[max(0, desde):max(0, desde + self.visibles)]:
+            if str(fila[0]) == iid:
+                return fila
+        return None
+
+    # ---- Dibujo ----
+    def _mostrar(self, cambiados=None):
+        inicio = time.perf_counter()
+        desde = self.posicion - self.inicio
+        visibles = self.buffer[max(0, desde):max(0, desde + self.visibles)]
+        iids = [str(fila[0]) for fila in visibles]
+
+        if cambiados is not None and list(self.tree.get_children()) == iids:
+            # Mismas filas en pantalla: solo se tocan las que cambiaron
+            for fila, iid in zip(visibles, iids):
+                if iid in cambiados:
+                    self.tree.item(iid, values=self.formatear(fila))
+        else:
+            seleccion = self.tree.selection()
+            self.tree.delete(*self.tree.get_children())
+            for fila, iid in zip(visibles, iids):
+                self.tree.insert("", "end", iid=iid, values=self.formatear(fila))
+            seleccion = [iid for iid in seleccion if self.tree.exists(iid)]
+            if seleccion:
+                self.tree.selection_set(seleccion)
+
+        if self.total:
+            self.scrollbar.set(self.posicion / self.total,
+                               min(1.0, (self.posicion + self.visibles) / self.total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        METRICAS.registrar_interfaz("treeview", self.nombre, time.perf_counter() - inicio, len(visibles))
@@ -0,0 +1,183 @@
+import re
+
+import mysql.connector
+
+import consultas
+import reservas
+
+PATRON_SEPARADOR = re.compile(r"[\s,;]+")
+
+
+def leer_ids(texto):
+    """Separa los IDs escaneados o pegados (espacios, comas o saltos de línea)
+
+    Devuelve (ids válidos sin repetir, en orden; textos que no son un ID).
+    """
+    ids, invalidos = [], []
+    for parte in PATRON_SEPARADOR.split(texto.strip()):
+        if not parte:
+            continue
+        if parte.isdigit() and int(parte) > 0:
+            if int(parte) not in ids:
+                ids.append(int(parte))
+        else:
+            invalidos.append(parte)
+    return ids, invalidos
+
+
+def llamar(cursor, query, parametros):
+    """Ejecuta un procedimiento en el cursor de la transacción y devuelve su mensaje"""
+    cursor.execute(query, parametros)
+    filas = cursor.fetchall()
+    cursor.nextset()
+    return filas[0][0] if filas else ""
+
+
+def en_transaccion(bd, aplicar):
+    """Corre aplicar(cursor) en una sola conexión y transacción; cualquier excepción deshace todo el lote"""
+    conexion = bd._obtener_conexion()
+    descartar = False
+    try:
+        cursor = conexion.cursor(buffered=True)
+        try:
+            conexion.start_transaction()
+            resultados = aplicar(cursor)
+            conexion.commit()
+            return resultados
+        except BaseException:
+            # Que la conexión no vuelva al pool con una transacción abierta
+            try:
+                conexion.rollback()
+            except mysql.connector.Error:
+                # No se sabe en qué quedó la transacción: la conexión se cierra
+                descartar = True
+            raise
+        finally:
+            try:
+                cursor.close()
+            except mysql.connector.Error:
+                descartar = True
+    except (mysql.connector.InterfaceError, mysql.connector.OperationalError):
+        # Como en DatabaseConnection.conexion(): una conexión caída no vuelve al pool
+        descartar = True
+        raise
+    finally:
+        bd._devolver_conexion(conexion, descartar)
+
+
+def _prestamos_activos(cursor, libro_ids):
+    """{libro_id: id de su préstamo activo} con una sola consulta, dentro de la transacción del cursor"""
+    if not libro_ids:
+        return {}
+    marcas = ", ".join(["%s"] * len(libro_ids))
+    cursor.execute(f"""SELECT libro_id, MAX(id) FROM prestamos
+                       WHERE devuelto = FALSE AND libro_id IN ({marcas})
+                       GROUP BY libro_id""", tuple(libro_ids))
+    return dict(cursor.fetchall())
+
+
+def _con_reservas(bd, libro_ids, procesar):
+    """Aplica procesar(cursor, ids) a los libros del lote reservándolos primero (reservas.reservar)
+
+    Los libros que otro mostrador tiene tomados, o cuyo procedimiento
+    informa un conflicto, se reintentan en una transacción nueva después de
+    una espera. Devuelve una tupla (libro_id, ok, mensaje, prestamo_id) por
+    libro, en el orden pedido. Un error de la base se propaga si todavía no
+    se confirmó ningún libro; si no, solo afecta a los pendientes.
+    """
+    resultados = {}
+    pendientes = list(libro_ids)
+    for intento in range(reservas.REINTENTOS + 1):
+        if intento:
+            reservas.esperar(intento - 1, "lote")
+
+        def aplicar(cursor):
+            _, ocupados = reservas.reservar(cursor, pendientes)
+            libres = [libro_id for libro_id in pendientes if libro_id not in ocupados]
+            return procesar(cursor, libres), ocupados
+
+        try:
+            hechos, ocupados = en_transaccion(bd, aplicar)
+        except mysql.connector.Error as error:
+            if reservas.es_conflicto(error) and intento < reservas.REINTENTOS:
+                continue
+            if not resultados:
+                raise
+            for libro_id in pendientes:
+                resultados[libro_id] = (libro_id, False, f"Error: {error}", None)
+            pendientes = []
+            break
+        for resultado in hechos:
+            if reservas.es_conflicto(resultado[2]):
+                ocupados.append(resultado[0])
+            else:
+                resultados[resultado[0]] = resultado
+        pendientes = ocupados
+        if not pendientes:
+            break
+
+    for libro_id in pendientes:
+        resultados[libro_id] = (libro_id, False,
+                                f"Error: El libro {libro_id} está ocupado en otro mostrador; intente de nuevo", None)
+    return [resultados[libro_id] for libro_id in libro_ids]
+
+
+def prestar_lote(bd, usuario_id, libro_ids):
+    """Presta varios libros a un usuario en una sola transacción
+
+    Devuelve (success, resultados) con una tupla (libro_id, ok, mensaje,
+    prestamo_id) por libro, o el mensaje de error si se deshizo el lote
+    entero; prestamo_id es None si el libro no se prestó.
+    Un libro que no se puede prestar (no existe, ya está prestado) se
+    informa y no impide prestar los demás. Los libros que en ese momento
+    presta otro mostrador se reintentan en una transacción aparte.
+    """
+    def procesar(cursor, ids):
+        mensajes = [(libro_id, llamar(cursor, consultas.REALIZAR_PRESTAMO, (libro_id, usuario_id)))
+                    for libro_id in ids]
+        # Los préstamos recién creados son los activos de esos libros (uno por libro)
+        prestados = [libro_id for libro_id, mensaje in mensajes if not mensaje.startswith("Error")]
+        activos = _prestamos_activos(cursor, prestados)
+        return [(libro_id, not mensaje.startswith("Error"), mensaje, activos.get(libro_id))
+                for libro_id, mensaje in mensajes]
+
+    if not libro_ids:
+        return True, []
+    try:
+        resultados = _con_reservas(bd, libro_ids, procesar)
+    except mysql.connector.Error as error:
+        return False, f"No se realizó ningún préstamo: {error}"
+    bd.invalidar("libros", "prestamos", *consultas.TABLAS_RESUMEN)
+    return True, resultados
+
+
+def devolver_lote(bd, libro_ids):
+    """Devuelve varios libros (por ID de libro, como se escanean) en una sola transacción
+
+    El préstamo activo de cada libro se busca con una sola consulta.
+    Devuelve (success, resultados) con una tupla (libro_id, ok, mensaje,
+    prestamo_id) por libro; prestamo_id es None si no tenía uno activo.
+    """
+    def procesar(cursor, ids):
+        if not ids:
+            return []
+        activos = _prestamos_activos(cursor, ids)
+
+        resultados = []
+        for libro_id in ids:
+            prestamo_id = activos.get(libro_id)
+            if prestamo_id is None:
+                resultados.append((libro_id, False, f"Error: El libro {libro_id} no tiene un préstamo activo", None))
+                continue
+            mensaje = llamar(cursor, consultas.DEVOLVER_LIBRO, (prestamo_id,))
+            resultados.append((libro_id, not mensaje.startswith("Error"), mensaje, prestamo_id))
+        return resultados
+
+    if not libro_ids:
+        return True, []
+    try:
+        resultados = _con_reservas(bd, libro_ids, procesar)
+    except mysql.connector.Error as error:
+        return False, f"No se realizó ninguna devolución: {error}"
+    bd.invalidar("libros", "prestamos", *consultas.TABLAS_RESUMEN)
+    return True, resultados
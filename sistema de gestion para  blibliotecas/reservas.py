@@ -0,0 +1,74 @@
+"""Préstamos seguros cuando varios mostradores prestan a la vez
+
+Cada libro tiene un número de versión que sube con cada cambio de la
+fila. sp_RealizarPrestamo marca el libro como prestado solo si sigue en
+la versión que leyó; si otro mostrador se adelantó, responde con un
+mensaje de conflicto en lugar de registrar un segundo préstamo. Nadie
+espera un bloqueo para leer: el único bloqueo es el del UPDATE, que dura
+lo que dura el procedimiento.
+
+Los lotes reservan sus libros al empezar con SELECT ... FOR UPDATE SKIP
+LOCKED: los que otro mostrador tiene tomados no se esperan, se reintentan
+después. Los conflictos se reintentan con una espera exponencial y al
+azar, para que dos mostradores que chocaron no vuelvan a chocar juntos.
+"""
+import random
+import time
+
+from metricas import METRICAS
+
+# Reintentos de una operación que chocó con otro mostrador
+REINTENTOS = 5
+# Espera antes del primer reintento (segundos); se duplica en cada uno hasta ESPERA_MAXIMA
+ESPERA_INICIAL = 0.005
+ESPERA_MAXIMA = 0.2
+# Comienzo del mensaje de los procedimientos cuando la versión del libro cambió
+PREFIJO_CONFLICTO = "Error: Conflicto"
+# Errores del servidor que se resuelven reintentando: espera de bloqueo agotada y deadlock
+ERRORES_CONFLICTO = ("1205", "1213")
+
+RESERVAR_LIBROS = "SELECT id FROM libros WHERE id IN ({}) ORDER BY id FOR UPDATE SKIP LOCKED"
+LIBROS_EXISTENTES = "SELECT id FROM libros WHERE id IN ({})"
+
+
+def es_conflicto(mensaje):
+    """True si el mensaje (del procedimiento o de un error) indica un choque con otro mostrador"""
+    texto = str(mensaje)
+    return (texto.startswith(PREFIJO_CONFLICTO) or texto.split(" ", 1)[0] in ERRORES_CONFLICTO
+            or "database is locked" in texto)
+
+
+def esperar(intento, operacion="prestamo"):
+    """Espera antes del reintento número intento (desde 0): al azar entre 0 y el tope de ese intento"""
+    espera = random.uniform(0, min(ESPERA_MAXIMA, ESPERA_INICIAL * 2 ** intento))
+    time.sleep(espera)
+    METRICAS.registrar_interfaz("reintento", operacion, espera)
+
+
+def con_reintentos(operacion, *argumentos, reintentos=REINTENTOS, nombre="prestamo"):
+    """Llama a operacion(*argumentos) -> (success, result) y la repite mientras el resultado sea un conflicto"""
+    for intento in range(reintentos + 1):
+        success, result = operacion(*argumentos)
+        if not es_conflicto(result) or intento == reintentos:
+            return success, result
+        esperar(intento, nombre)
+
+
+def reservar(cursor, libro_ids):
+    """Bloquea los libros que nadie más tiene tomados, dentro de la transacción del cursor
+
+    Devuelve (reservados, ocupados): los ids bloqueados por esta
+    transacción y los que existen pero tiene otro mostrador. Los que no
+    existen no están en ninguno de los dos.
+    """
+    if not libro_ids:
+        return set(), []
+    marcas = ", ".join(["%s"] * len(libro_ids))
+    cursor.execute(RESERVAR_LIBROS.format(marcas), tuple(libro_ids))
+    reservados = {libro_id for (libro_id,) in cursor.fetchall()}
+    faltan = [libro_id for libro_id in libro_ids if libro_id not in reservados]
+    if not faltan:
+        return reservados, []
+    cursor.execute(LIBROS_EXISTENTES.format(", ".join(["%s"] * len(faltan))), tuple(faltan))
+    existentes = {libro_id for (libro_id,) in cursor.fetchall()}
+    return reservados, [libro_id for libro_id in faltan if libro_id in existentes]
@@ -0,0 +1,291 @@
+"""Operaciones de la biblioteca sin interfaz: las usan la ventana y la API HTTP
+
+Cada función recibe la DatabaseConnection y devuelve (success, result).
+Los datos llegan como texto o números, sin importar si vienen de un
+formulario de Tk o de un JSON; las validaciones son las mismas en ambos
+casos. Los errores de los procedimientos ("Error: ...") vuelven con
+success False. Las funciones parametros_* solo validan y arman los
+parámetros del procedimiento: las usan también las escrituras que la
+ventana deja en la cola local (encolar).
+"""
+from datetime import date
+
+import busqueda
+import cola_escrituras
+import consultas
+import prestamos_lote
+import reservas
+from cola_exportaciones import EXPORTACIONES, FORMATOS
+from paginacion import ConsultaPaginada
+from validaciones import Validaciones
+
+# Filas por página cuando no se indica un límite, y máximo que se entrega de una vez
+LIMITE_LISTA = 50
+LIMITE_MAXIMO = 1000
+
+_listas = {tabla: ConsultaPaginada(**argumentos) for tabla, argumentos in consultas.LISTAS.items()}
+
+
+def _texto(valor):
+    return "" if valor is None else str(valor).strip()
+
+
+def _id(valor):
+    """Entero positivo a partir de un número o un texto; None si no es un ID válido"""
+    if isinstance(valor, bool):
+        return None
+    if isinstance(valor, int):
+        return valor if valor > 0 else None
+    texto = _texto(valor)
+    return int(texto) if texto.isdigit() and int(texto) > 0 else None
+
+
+def _mensaje(respuesta, por_defecto):
+    """Mensaje del procedimiento almacenado como resultado; success False si informa un error"""
+    success, result = respuesta
+    if not success:
+        return False, result
+    mensaje = result[0][0] if result else por_defecto
+    return not str(mensaje).startswith("Error"), mensaje
+
+
+def _con_reintentos(bd, query, parametros, por_defecto):
+    """_mensaje del procedimiento, repitiéndolo si chocó con otro mostrador (ver reservas)"""
+    return reservas.con_reintentos(lambda: _mensaje(bd.execute_query(query, parametros), por_defecto))
+
+
+def _guardar_imagen(almacen, ruta):
+    """Copia la imagen elegida al almacén; devuelve (success, referencia o None)"""
+    if not ruta:
+        return True, None
+    try:
+        return True, almacen.guardar(ruta)
+    except (OSError, ValueError) as error:
+        return False, f"No se pudo guardar la imagen: {error}"
+
+
+# LIBROS
+def parametros_libro(titulo, autor, genero=None, año=None, isbn=None, imagen=None, almacen=None):
+    """Valida el libro y copia la portada al almacén: (True, parámetros de sp_InsertarLibro) o (False, motivo)"""
+    titulo, autor, año = _texto(titulo), _texto(autor), _texto(año)
+    error = Validaciones.error_libro(titulo, autor, año)
+    if error:
+        return False, error
+    ok, portada = _guardar_imagen(almacen, imagen)
+    if not ok:
+        return False, portada
+    return True, (titulo, autor, _texto(genero), int(año) if año else None, _texto(isbn), portada)
+
+
+def guardar_libro(bd, titulo, autor, genero=None, año=None, isbn=None, imagen=None, almacen=None):
+    """Registra un libro; imagen es la ruta de una portada que se copia al almacén"""
+    success, parametros = parametros_libro(titulo, autor, genero, año, isbn, imagen, almacen)
+    if not success:
+        return False, parametros
+    return _mensaje(bd.execute_query(consultas.INSERTAR_LIBRO, parametros),
+                    "Libro guardado (mensaje no devuelto por SP)")
+
+
+def obtener_libro(bd, libro_id):
+    """(True, fila de LIBRO_POR_ID) o (False, motivo)"""
+    libro_id = _id(libro_id)
+    if libro_id is None:
+        return False, "Ingrese un ID válido"
+    success, result = bd.execute_query(consultas.LIBRO_POR_ID, (libro_id,))
+    if not success:
+        return False, result
+    if not result:
+        return False, "Libro no encontrado"
+    return True, result[0]
+
+
+def eliminar_libro(bd, libro_id):
+    libro_id = _id(libro_id)
+    if libro_id is None:
+        return False, "ID de libro inválido"
+    return _mensaje(bd.execute_query(consultas.ELIMINAR_LIBRO, (libro_id,)),
+                    "Libro eliminado (mensaje no devuelto por SP)")
+
+
+# USUARIOS
+def parametros_usuario(nombre, email, telefono=None, imagen=None, almacen=None):
+    nombre, email, telefono = _texto(nombre), _texto(email), _texto(telefono)
+    error = Validaciones.error_usuario(nombre, email, telefono)
+    if error:
+        return False, error
+    ok, foto = _guardar_imagen(almacen, imagen)
+    if not ok:
+        return False, foto
+    return True, (nombre, email, telefono or None, foto)
+
+
+def guardar_usuario(bd, nombre, email, telefono=None, imagen=None, almacen=None):
+    success, parametros = parametros_usuario(nombre, email, telefono, imagen, almacen)
+    if not success:
+        return False, parametros
+    return _mensaje(bd.execute_query(consultas.INSERTAR_USUARIO, parametros),
+                    "Usuario guardado (mensaje no devuelto por SP)")
+
+
+# AUTORES
+def parametros_autor(nombre, nacionalidad=None, fecha_nacimiento=None):
+    """fecha_nacimiento es una date o un texto AAAA-MM-DD"""
+    nombre = _texto(nombre)
+    if not nombre:
+        return False, "El nombre del autor es obligatorio"
+    if fecha_nacimiento and not isinstance(fecha_nacimiento, date):
+        try:
+            fecha_nacimiento = date.fromisoformat(_texto(fecha_nacimiento))
+        except ValueError:
+            return False, "La fecha de nacimiento debe tener el formato AAAA-MM-DD"
+    return True, (nombre, _texto(nacionalidad) or None, fecha_nacimiento or None)
+
+
+def guardar_autor(bd, nombre, nacionalidad=None, fecha_nacimiento=None):
+    success, parametros = parametros_autor(nombre, nacionalidad, fecha_nacimiento)
+    if not success:
+        return False, parametros
+    return _mensaje(bd.execute_query(consultas.INSERTAR_AUTOR, parametros),
+                    "Autor guardado (mensaje no devuelto por SP)")
+
+
+def eliminar_autor(bd, autor_id):
+    autor_id = _id(autor_id)
+    if autor_id is None:
+        return False, "ID de autor inválido"
+    return _mensaje(bd.execute_query(consultas.ELIMINAR_AUTOR, (autor_id,)), "Autor eliminado")
+
+
+# PRÉSTAMOS
+def parametros_prestamo(libro_id, usuario_id):
+    libro_id, usuario_id = _id(libro_id), _id(usuario_id)
+    if libro_id is None:
+        return False, "ID de libro inválido"
+    if usuario_id is None:
+        return False, "ID de usuario inválido"
+    return True, (libro_id, usuario_id)
+
+
+def realizar_prestamo(bd, libro_id, usuario_id):
+    success, parametros = parametros_prestamo(libro_id, usuario_id)
+    if not success:
+        return False, parametros
+    return _con_reintentos(bd, consultas.REALIZAR_PRESTAMO, parametros,
+                           "Préstamo realizado (mensaje no devuelto por SP)")
+
+
+def parametros_devolucion(prestamo_id):
+    prestamo_id = _id(prestamo_id)
+    if prestamo_id is None:
+        return False, "ID de préstamo inválido"
+    return True, (prestamo_id,)
+
+
+def devolver_libro(bd, prestamo_id):
+    success, parametros = parametros_devolucion(prestamo_id)
+    if not success:
+        return False, parametros
+    return _con_reintentos(bd, consultas.DEVOLVER_LIBRO, parametros,
+                           "Libro devuelto (mensaje no devuelto por SP)")
+
+
+def prestar_lote(bd, usuario_id, libro_ids):
+    """Como prestamos_lote.prestar_lote, validando los IDs recibidos"""
+    usuario_id = _id(usuario_id)
+    if usuario_id is None:
+        return False, "ID de usuario inválido"
+    success, ids = _ids_lote(libro_ids)
+    if not success:
+        return False, ids
+    return prestamos_lote.prestar_lote(bd, usuario_id, ids)
+
+
+def devolver_lote(bd, libro_ids):
+    success, ids = _ids_lote(libro_ids)
+    if not success:
+        return False, ids
+    return prestamos_lote.devolver_lote(bd, ids)
+
+
+def _ids_lote(libro_ids):
+    """IDs de libros de un lote, sin repetir; una cadena o un número suelto no es una lista"""
+    if not isinstance(libro_ids, (list, tuple)):
+        return False, "libro_ids debe ser una lista"
+    ids = [_id(libro_id) for libro_id in libro_ids]
+    if not ids or None in ids:
+        return False, "La lista de IDs de libros está vacía o tiene IDs inválidos"
+    return True, list(dict.fromkeys(ids))
+
+
+# ESCRITURAS EN LA COLA LOCAL
+# Operación de cola_escrituras.OPERACIONES -> función que valida y arma sus parámetros
+PARAMETROS = {
+    "guardar_libro": parametros_libro,
+    "guardar_usuario": parametros_usuario,
+    "guardar_autor": parametros_autor,
+    "realizar_prestamo": parametros_prestamo,
+    "devolver_libro": parametros_devolucion,
+}
+
+
+def encolar(cola, operacion, *args, **kwargs):
+    """Valida la operación y la guarda en la cola local sin esperar al servidor; devuelve (success, mensaje)
+
+    El Sincronizador de cola_escrituras la aplica después; si el servidor
+    la rechaza queda como conflicto en la cola.
+    """
+    success, parametros = PARAMETROS[operacion](*args, **kwargs)
+    if not success:
+        return False, parametros
+    cola.agregar(operacion, parametros)
+    return True, f"{cola_escrituras.describir(operacion, parametros)}: registrado, se enviará al servidor en segundo plano"
+
+
+# LISTAS
+def listar(bd, tabla, posicion=0, limite=LIMITE_LISTA, texto=None):
+    """Una página de la lista de la pestaña: (True, (total, filas))
+
+    Con texto se devuelven los mejores resultados de la búsqueda (como la
+    caja Buscar); total es entonces la cantidad encontrada, a lo sumo
+    posicion + limite.
+    """
+    consulta = _listas.get(tabla)
+    if consulta is None:
+        return False, f"Lista desconocida: {tabla}"
+    try:
+        posicion = max(0, int(posicion or 0))
+        limite = min(LIMITE_MAXIMO, max(1, int(limite or LIMITE_LISTA)))
+    except (TypeError, ValueError):
+        return False, "posicion y limite deben ser números"
+
+    texto = _texto(texto)
+    if texto:
+        if tabla not in busqueda.CAMPOS_BUSQUEDA:
+            return False, f"La lista {tabla} no admite búsqueda"
+        success, filas = busqueda.buscar(bd, consulta, tabla, texto, limite=posicion + limite)
+        if not success:
+            return False, filas
+        return True, (len(filas), filas[posicion:])
+
+    success, conteo = bd.execute_query(*consulta.contar())
+    if not success:
+        return False, conteo
+    success, filas = bd.execute_query(*consulta.desde_posicion(posicion, limite))
+    if not success:
+        return False, filas
+    return True, (conteo[0][0], filas)
+
+
+# EXPORTACIONES
+def exportar(bd, tabla, formato, nombre_archivo):
+    """Exporta la tabla en este proceso (la ventana usa ColaExportaciones); devuelve (success, mensaje)"""
+    if tabla not in EXPORTACIONES:
+        return False, f"Tabla desconocida: {tabla}"
+    if formato not in FORMATOS:
+        return False, f"Formato desconocido: {formato}"
+    query, _, encabezados, titulo = EXPORTACIONES[tabla]
+    exportador, _ = FORMATOS[formato]
+    filas = bd.iterar_consulta(query)
+    if formato == "pdf":
+        return exportador(filas, nombre_archivo, encabezados, titulo)
+    return exportador(filas, nombre_archivo, encabezados)
@@ -0,0 +1,335 @@
+"""Filas de una consulta guardadas por columnas, con mucha menos memoria que una lista de tuplas
+
+Cada fila de fetchall() es una tupla (56 bytes más 8 por columna) que
+apunta a un objeto por valor: un int de 28 bytes, una date de 32, un
+str por cada género o nombre de autor repetido. Aquí cada columna es un
+solo arreglo:
+    - enteros y fechas en un array de 8 bytes por fila (las fechas como
+      número de día)
+    - textos codificados con un diccionario: cada texto distinto se guarda
+      una vez (géneros, nacionalidades, autores, "Sí"/"No") y cada fila
+      lleva un código de 4 bytes
+    - cualquier otro tipo (o una columna con tipos mezclados) en una lista
+
+Las filas se leen como vistas FilaColumnar, que no copian los valores. La
+usan la lista en memoria de las pestañas (paginacion.TablaLocal) y las
+secciones de los reportes PDF que se envían a otros procesos.
+"""
+from array import array
+from datetime import date
+from itertools import islice
+
+# Marca de "sin valor" en las columnas de enteros y de fechas (el menor entero de 8 bytes)
+NULO = -2 ** 63
+# Código de "sin valor" en las columnas de texto
+SIN_TEXTO = -1
+# Filas que se pasan a columnas de una vez al construir la tabla
+FILAS_POR_LOTE = 1024
+
+
+def _solo(valores, tipo):
+    """True si todos los valores son de exactamente ese tipo o None"""
+    tipos = set(map(type, valores))
+    tipos.discard(type(None))
+    return tipos <= {tipo}
+
+
+# COLUMNAS
+class ColumnaEnteros:
+    __slots__ = ("valores",)
+
+    def __init__(self, valores=()):
+        self.valores = array("q", valores)
+
+    @staticmethod
+    def admite(valor):
+        # bool es un int, pero volvería como 0/1
+        return valor is None or (type(valor) is int and NULO < valor < 2 ** 63)
+
+    def codificar(self, valor):
+        return NULO if valor is None else valor
+
+    def valor(self, n):
+        valor = self.valores[n]
+        return None if valor == NULO else valor
+
+    def extender(self, valores):
+        """Agrega los valores; False (sin agregar nada) si alguno no entra en esta columna"""
+        if not _solo(valores, int):
+            return False
+        try:
+            nuevos = array("q", [NULO if valor is None else valor for valor in valores])
+        except OverflowError:
+            return False
+        self.valores.extend(nuevos)
+        return True
+
+    def reemplazar(self, n, valor):
+        self.valores[n] = self.codificar(valor)
+
+
+class ColumnaFechas(ColumnaEnteros):
+    __slots__ = ()
+
+    @staticmethod
+    def admite(valor):
+        # datetime también es una date: perdería la hora
+        return valor is None or type(valor) is date
+
+    def codificar(self, valor):
+        return NULO if valor is None else valor.toordinal()
+
+    def valor(self, n):
+        valor = self.valores[n]
+        return None if valor == NULO else date.fromordinal(valor)
+
+    def extender(self, valores):
+        if not _solo(valores, date):
+            return False
+        self.valores.extend([NULO if valor is None else valor.toordinal() for valor in valores])
+        return True
+
+
+class ColumnaTextos:
+    __slots__ = ("codigos", "textos", "_indice")
+
+    def __init__(self):
+        self.codigos = array("i")
+        self.textos = []
+        # Texto -> código; solo mientras se agregan filas (compactar() lo suelta)
+        self._indice = {}
+
+    @staticmethod
+    def admite(valor):
+        return valor is None or type(valor) is str
+
+    def codificar(self, valor):
+        if valor is None:
+            return SIN_TEXTO
+        if self._indice is None:
+            self._indice = {texto: codigo for codigo, texto in enumerate(self.textos)}
+        codigo = self._indice.get(valor)
+        if codigo is None:
+            codigo = self._indice[valor] = len(self.textos)
+            self.textos.append(valor)
+        return codigo
+
+    def valor(self, n):
+        codigo = self.codigos[n]
+        return None if codigo == SIN_TEXTO else self.textos[codigo]
+
+    def extender(self, valores):
+        if not _solo(valores, str):
+            return False
+        if self._indice is None:
+            self._indice = {texto: codigo for codigo, texto in enumerate(self.textos)}
+        indice = self._indice
+        codificar = self.codificar
+        self.codigos.extend([indice[valor] if valor in indice else codificar(valor) for valor in valores])
+        return True
+
+    def reemplazar(self, n, valor):
+        self.codigos[n] = self.codificar(valor)
+
+
+class ColumnaObjetos:
+    __slots__ = ("valores",)
+
+    def __init__(self, valores=()):
+        self.valores = list(valores)
+
+    @staticmethod
+    def admite(valor):
+        return True
+
+    def valor(self, n):
+        return self.valores[n]
+
+    def extender(self, valores):
+        self.valores.extend(valores)
+        return True
+
+    def reemplazar(self, n, valor):
+        self.valores[n] = valor
+
+
+def _columna_para(valor):
+    """Columna vacía del tipo que corresponde al primer valor no nulo"""
+    for tipo in (ColumnaEnteros, ColumnaFechas, ColumnaTextos):
+        if tipo.admite(valor):
+            return tipo()
+    return ColumnaObjetos()
+
+
+# TABLA
+class TablaColumnar:
+    """Filas con la misma cantidad de columnas, guardadas columna por columna
+
+    El tipo de cada columna se elige con su primer valor no nulo; si
+    después llega un valor de otro tipo la columna pasa a ser una lista
+    común, sin perder nada.
+    """
+    __slots__ = ("columnas", "_largo")
+
+    def __init__(self, filas=()):
+        self.columnas = None
+        self._largo = 0
+        filas = iter(filas)
+        lote = list(islice(filas, FILAS_POR_LOTE))
+        while lote:
+            self.agregar_lote(lote)
+            lote = list(islice(filas, FILAS_POR_LOTE))
+        self.compactar()
+
+    def __len__(self):
+        return self._largo
+
+    @property
+    def ancho(self):
+        return len(self.columnas) if self.columnas is not None else 0
+
+    def agregar(self, fila):
+        self.agregar_lote([fila])
+
+    def agregar_lote(self, filas):
+        """Agrega varias filas, columna por columna"""
+        if not filas:
+            return
+        if self.columnas is None:
+            # Columna None: todavía sin valores no nulos (se cuentan con _largo)
+            self.columnas = [None] * len(filas[0])
+        for c, valores in enumerate(zip(*filas)):
+            columna = self.columnas[c]
+            if columna is None:
+                primero = next((valor for valor in valores if valor is not None), None)
+                if primero is None:
+                    continue
+                columna = self.columnas[c] = _columna_para(primero)
+                # Las filas anteriores no tenían valor en esta columna
+                columna.extender([None] * self._largo)
+            if not columna.extender(valores):
+                columna = self.columnas[c] = ColumnaObjetos(self.valores(c))
+                columna.extender(valores)
+        self._largo += len(filas)
+
+    def reemplazar(self, n, fila):
+        for c, valor in enumerate(fila):
+            self._columna_que_admite(c, valor).reemplazar(n, valor)
+
+    def _columna_que_admite(self, c, valor):
+        columna = self.columnas[c]
+        if columna is None:
+            if valor is None:
+                return _Nulos
+            columna = self.columnas[c] = _columna_para(valor)
+            columna.extender([None] * self._largo)
+        elif not columna.admite(valor):
+            columna = self.columnas[c] = ColumnaObjetos(self.valores(c))
+        return columna
+
+    def compactar(self):
+        """Suelta los índices que solo sirven mientras se agregan filas"""
+        for columna in self.columnas or ():
+            if isinstance(columna, ColumnaTextos):
+                columna._indice = None
+
+    def valor(self, n, c):
+        columna = self.columnas[c]
+        return None if columna is None else columna.valor(n)
+
+    def valores(self, c):
+        """Los valores de una columna, en orden de fila"""
+        columna = self.columnas[c] if self.columnas is not None else None
+        if columna is None:
+            return [None] * self._largo
+        if isinstance(columna, ColumnaObjetos):
+            return list(columna.valores)
+        return [columna.valor(n) for n in range(self._largo)]
+
+    def tupla(self, n):
+        return tuple(self.valor(n, c) for c in range(len(self.columnas)))
+
+    def tuplas(self, desde=0, hasta=None):
+        """Las filas de desde a hasta como tuplas (p. ej. una página de un reporte)"""
+        return [self.tupla(n) for n in range(*slice(desde, hasta).indices(self._largo))]
+
+    def __getitem__(self, n):
+        if isinstance(n, slice):
+            return [FilaColumnar(self, i) for i in range(*n.indices(self._largo))]
+        if n < 0:
+            n += self._largo
+        if not 0 <= n < self._largo:
+            raise IndexError("fila fuera de la tabla")
+        return FilaColumnar(self, n)
+
+    def __iter__(self):
+        for n in range(self._largo):
+            yield FilaColumnar(self, n)
+
+    def seleccion(self, posiciones):
+        """Vista de las filas en esas posiciones y en ese orden, sin copiarlas"""
+        return VistaFilas(self, posiciones)
+
+
+class _ColumnaNula:
+    """Destino de los None de una columna que todavía no tiene tipo"""
+
+    @staticmethod
+    def reemplazar(n, valor):
+        pass
+
+
+_Nulos = _ColumnaNula()
+
+
+# FILAS
+class FilaColumnar:
+    """Una fila de la tabla; se usa como una tupla (índices, porciones, len, iteración)"""
+    __slots__ = ("tabla", "n")
+
+    def __init__(self, tabla, n):
+        self.tabla = tabla
+        self.n = n
+
+    def __getitem__(self, c):
+        if isinstance(c, slice):
+            return tuple(self.tabla.valor(self.n, i) for i in range(*c.indices(self.tabla.ancho)))
+        if c < 0:
+            c += self.tabla.ancho
+        return self.tabla.valor(self.n, c)
+
+    def __len__(self):
+        return self.tabla.ancho
+
+    def __iter__(self):
+        return iter(self.tabla.tupla(self.n))
+
+    def __eq__(self, otra):
+        return tuple(self) == tuple(otra)
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return repr(self.tabla.tupla(self.n))
+
+
+class VistaFilas:
+    """Secuencia de filas de una tabla en un orden dado (resultado de ordenar y filtrar)"""
+    __slots__ = ("tabla", "posiciones")
+
+    def __init__(self, tabla, posiciones):
+        self.tabla = tabla
+        self.posiciones = posiciones
+
+    def __len__(self):
+        return len(self.posiciones)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [FilaColumnar(self.tabla, n) for n in self.posiciones[i]]
+        return FilaColumnar(self.tabla, self.posiciones[i])
+
+    def __iter__(self):
+        for n in self.posiciones:
+            yield FilaColumnar(self.tabla, n)
@@ -0,0 +1,100 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+# Cada cuántos milisegundos el hilo de Tk revisa los resultados pendientes
+INTERVALO_SONDEO = 30
+
+
+# EJECUCIÓN EN SEGUNDO PLANO
+class EjecutorTareas:
+    """Ejecuta trabajo en hilos de fondo y entrega los resultados en el hilo de Tk"""
+
+    def __init__(self, root, max_hilos=4, al_cambiar_ocupado=None):
+        self.root = root
+        self.executor = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="biblioteca")
+        self.al_cambiar_ocupado = al_cambiar_ocupado
+        self.pendientes = 0
+        self._resultados = queue.Queue()
+        self._generaciones = {}
+        self._futuros = {}
+        self._cerrado = False
+        self.root.after(INTERVALO_SONDEO, self._sondear)
+
+    def ejecutar(self, funcion, *args, al_terminar=None, al_fallar=None, clave=None):
+        """Ejecuta funcion(*args) en un hilo; al_terminar(resultado) corre en el hilo de Tk
+
+        Si se indica una clave, una nueva tarea con la misma clave deja obsoleta
+        a la anterior: se cancela si no empezó y su resultado se descarta.
+        """
+        if self._cerrado:
+            return
+        generacion = None
+        if clave is not None:
+            self.cancelar(clave)
+            generacion = self._generaciones[clave]
+
+        futuro = self.executor.submit(funcion, *args)
+        if clave is not None:
+            self._futuros[clave] = futuro
+        self._cambiar_pendientes(1)
+        futuro.add_done_callback(
+            lambda f: self._resultados.put((f, clave, generacion, al_terminar, al_fallar))
+        )
+
+    def cancelar(self, clave):
+        """Marca como obsoleta la tarea en curso con esa clave"""
+        self._generaciones[clave] = self._generaciones.get(clave, 0) + 1
+        futuro = self._futuros.pop(clave, None)
+        if futuro is not None:
+            futuro.cancel()
+
+    def en_hilo_ui(self, funcion, *args):
+        """Programa funcion(*args) en el hilo de Tk; se puede llamar desde cualquier hilo"""
+        self._resultados.put((None, None, None, lambda _: funcion(*args), None))
+
+    def cerrar(self):
+        self._cerrado = True
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _cambiar_pendientes(self, delta):
+        antes = self.pendientes > 0
+        self.pendientes += delta
+        ahora = self.pendientes > 0
+        if antes != ahora and self.al_cambiar_ocupado:
+            self.al_cambiar_ocupado(ahora)
+
+    def _sondear(self):
+        if self._cerrado:
+            return
+        self.root.after(INTERVALO_SONDEO, self._sondear)
+        while True:
+            try:
+                futuro, clave, generacion, al_terminar, al_fallar = self._resultados.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if futuro is None:
+                    al_terminar(None)
+                    continue
+                self._cambiar_pendientes(-1)
+                self._entregar(futuro, clave, generacion, al_terminar, al_fallar)
+            except Exception as error:
+                # Mismo tratamiento que un error en cualquier callback de Tk
+                self.root.report_callback_exception(type(error), error, error.__traceback__)
+
+    def _entregar(self, futuro, clave, generacion, al_terminar, al_fallar):
+        if futuro.cancelled():
+            return
+        if clave is not None:
+            if self._generaciones.get(clave) != generacion:
+                return
+            if self._futuros.get(clave) is futuro:
+                del self._futuros[clave]
+        error = futuro.exception()
+        if error is not None:
+            if al_fallar:
+                al_fallar(error)
+            else:
+                raise error
+        elif al_terminar:
+            al_terminar(futuro.result())
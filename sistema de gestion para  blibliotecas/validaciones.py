@@ -0,0 +1,60 @@
+import os
+import re
+
+PATRON_EMAIL = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+
+# VALIDACIONES
+class Validaciones:
+    @staticmethod
+    def solo_numeros(texto):
+        """Solo permite números"""
+        return texto.isdigit() or texto == ""
+
+    @staticmethod
+    def validar_email(email):
+        """Valida formato de email"""
+        return PATRON_EMAIL.match(email) is not None
+
+    @staticmethod
+    def validar_imagen(ruta):
+        """Valida imagen"""
+        if not ruta:
+            return False, "No hay imagen"
+
+        extensiones = ['.jpg', '.jpeg', '.png', '.gif']
+        ext = os.path.splitext(ruta)[1].lower()
+
+        if ext not in extensiones:
+            return False, f"Solo: {', '.join(extensiones)}"
+
+        # Verificar tamaño (máximo 2MB)
+        tamano = os.path.getsize(ruta) / (1024 * 1024)
+        if tamano > 2:
+            return False, "Máximo 2MB"
+
+        return True, "OK"
+
+    @staticmethod
+    def error_libro(titulo, autor, año):
+        """Primer error de los datos de un libro, o None si son válidos"""
+        if not titulo:
+            return "El título es obligatorio"
+        if not autor:
+            return "El autor es obligatorio"
+        if año and not año.isdigit():
+            return "El año debe ser numérico"
+        return None
+
+    @staticmethod
+    def error_usuario(nombre, email, telefono):
+        """Primer error de los datos de un usuario, o None si son válidos"""
+        if not nombre:
+            return "El nombre es obligatorio"
+        if not email:
+            return "El email es obligatorio"
+        if not Validaciones.validar_email(email):
+            return "Formato de email inválido"
+        if telefono and not telefono.isdigit():
+            return "El teléfono debe contener solo números"
+        return None